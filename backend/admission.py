@@ -0,0 +1,152 @@
+import asyncio
+import math
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Callable, Dict
+
+
+class Rejected(Exception):
+    """An analysis turned away: 429 (client over its rate) or 503 (worker overloaded), retry after retry_after seconds"""
+
+    def __init__(self, status_code: int, reason: str, retry_after: float):
+        super().__init__(status_code, reason, retry_after)
+        self.status_code = status_code
+        self.reason = reason
+        self.retry_after = retry_after
+
+    def retry_after_header(self) -> str:
+        """Retry-After value in whole seconds, at least 1"""
+        return str(max(1, math.ceil(self.retry_after)))
+
+
+class TokenBucket:
+    """rate tokens per second, up to burst"""
+
+    def __init__(self, rate: float, burst: float, now: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = now
+
+    def take(self, now: float) -> float:
+        """Take one token; returns 0, or the seconds until one is available (nothing taken)"""
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+
+class AdmissionController:
+    """Decides whether an analysis may run on this worker, wait for a slot, or be turned away
+
+    At most max_in_flight analyses run at once; up to max_queue more wait for a
+    slot, each for at most queue_timeout seconds. Each client (API key or
+    address) has a token bucket of rate analyses per second up to burst
+    (rate 0 disables it). Rejections are immediate, with a Retry-After estimate.
+    """
+
+    def __init__(self, max_in_flight: int = 16, max_queue: int = 64, queue_timeout: float = 10,
+                 rate: float = 0, burst: float = 20, max_clients: int = 10000,
+                 clock: Callable[[], float] = time.monotonic):
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.rate = rate
+        self.burst = burst
+        self.max_clients = max_clients
+        self.clock = clock
+        self._loop = None
+        self._semaphore = None
+        self._buckets: "OrderedDict[str, TokenBucket]" = OrderedDict()
+        # Moving average of how long an analysis holds its slot, for Retry-After
+        self.average_seconds = 1.0
+        self.in_flight = 0
+        self.waiting = 0
+        self.admitted = 0
+        self.rejected: Dict[str, int] = {"rate_limited": 0, "queue_full": 0, "queue_timeout": 0}
+
+    def _bind(self):
+        # The semaphore belongs to one event loop; start over if the loop changed
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            self._loop = loop
+            self._semaphore = asyncio.Semaphore(self.max_in_flight)
+
+    def _reject(self, status_code: int, reason: str, retry_after: float) -> Rejected:
+        self.rejected[reason] += 1
+        return Rejected(status_code, reason, retry_after)
+
+    def _check_rate(self, client: str):
+        if self.rate <= 0:
+            return
+        now = self.clock()
+        bucket = self._buckets.get(client)
+        if bucket is None:
+            bucket = self._buckets[client] = TokenBucket(self.rate, self.burst, now)
+            while len(self._buckets) > self.max_clients:
+                self._buckets.popitem(last=False)
+        self._buckets.move_to_end(client)
+        wait = bucket.take(now)
+        if wait:
+            raise self._reject(429, "rate_limited", wait)
+
+    def _queue_wait_estimate(self) -> float:
+        """Seconds until the queue ahead of a new request should have drained"""
+        return self.average_seconds * (self.waiting + 1) / self.max_in_flight
+
+    async def acquire(self, client: str) -> Callable[[], None]:
+        """Admit one analysis for client or raise Rejected; call the returned function when it is done"""
+        self._bind()
+        self._check_rate(client)
+        semaphore = self._semaphore
+        if semaphore.locked():
+            if self.waiting >= self.max_queue:
+                raise self._reject(503, "queue_full", self._queue_wait_estimate())
+            self.waiting += 1
+            try:
+                await asyncio.wait_for(semaphore.acquire(), self.queue_timeout)
+            except asyncio.TimeoutError:
+                raise self._reject(503, "queue_timeout", self._queue_wait_estimate())
+            finally:
+                self.waiting -= 1
+        else:
+            await semaphore.acquire()
+        self.in_flight += 1
+        self.admitted += 1
+        started = time.monotonic()
+        released = False
+
+        def release():
+            nonlocal released
+            if released:
+                return
+            released = True
+            self.in_flight -= 1
+            self.average_seconds += 0.1 * ((time.monotonic() - started) - self.average_seconds)
+            semaphore.release()
+
+        return release
+
+    @asynccontextmanager
+    async def admit(self, client: str) -> AsyncIterator[None]:
+        """acquire() for the duration of the block"""
+        release = await self.acquire(client)
+        try:
+            yield
+        finally:
+            release()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "max_in_flight": self.max_in_flight,
+            "max_queue": self.max_queue,
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "admitted": self.admitted,
+            "rejected": dict(self.rejected),
+            "rate_limit": {"rate": self.rate, "burst": self.burst, "clients": len(self._buckets)} if self.rate > 0 else None,
+            "average_seconds": round(self.average_seconds, 3),
+        }
@@ -0,0 +1,134 @@
+import asyncio
+import hashlib
+import json
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import TYPE_CHECKING, Any, Dict, Optional
+
+if TYPE_CHECKING:
+    import httpx
+    import openai
+
+# openai and httpx take most of the server's import time and memory: they are
+# only imported once a newsletter is analysed with an API key (or by warm_up)
+
+
+def ai_cache_key(text: str, subject: str, preheader: str, model: str) -> str:
+    """Hash of everything that determines the AI analysis of a newsletter"""
+    digest = hashlib.sha256()
+    for part in (model, subject, preheader, text):
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+def api_key_digest(api_key: str) -> str:
+    """Short hash identifying an API key without keeping it"""
+    return hashlib.sha256(api_key.encode("utf-8")).hexdigest()[:16]
+
+
+def classify_ai_error(error: BaseException) -> str:
+    """Failure class of an AI call, for the metrics"""
+    import openai
+
+    if isinstance(error, (asyncio.TimeoutError, openai.APITimeoutError)):
+        return "timeout"
+    if isinstance(error, (openai.AuthenticationError, openai.PermissionDeniedError)):
+        return "auth"
+    if isinstance(error, openai.RateLimitError):
+        return "rate_limit"
+    if isinstance(error, openai.APIConnectionError):
+        return "connect"
+    if isinstance(error, openai.APIError):
+        return "api_error"
+    if isinstance(error, json.JSONDecodeError):
+        return "invalid_json"
+    return "other"
+
+
+class AIClientPool:
+    """Reused AsyncOpenAI clients, one per API key over a shared connection pool, and a cap on outstanding LLM calls"""
+
+    def __init__(self, base_url: Optional[str] = None, timeout: float = 60, max_concurrency: int = 8,
+                 max_clients: int = 32):
+        self.base_url = base_url
+        self.timeout = timeout
+        self.max_concurrency = max_concurrency
+        self.max_clients = max_clients
+        self._loop = None
+        self._semaphore = None
+        self._http: Optional["httpx.AsyncClient"] = None
+        self._clients: "OrderedDict[str, openai.AsyncOpenAI]" = OrderedDict()
+        self.in_flight = 0
+        self.waiting = 0
+        self.calls = 0
+
+    def _bind(self):
+        # Clients and semaphore belong to one event loop; start over if the loop changed
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            self._loop = loop
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+            # One connection pool for every key: building an SSL context per client is slow
+            import httpx
+
+            self._http = httpx.AsyncClient(timeout=self.timeout)
+            self._clients = OrderedDict()
+
+    def client(self, api_key: str) -> "openai.AsyncOpenAI":
+        self._bind()
+        client = self._clients.get(api_key)
+        if client is None:
+            import openai
+
+            client = openai.AsyncOpenAI(
+                api_key=api_key,
+                base_url=self.base_url,
+                timeout=self.timeout,
+                http_client=self._http,
+            )
+            self._clients[api_key] = client
+            # Evicted clients share the pool, so they are dropped rather than closed
+            while len(self._clients) > self.max_clients:
+                self._clients.popitem(last=False)
+        self._clients.move_to_end(api_key)
+        return client
+
+    @asynccontextmanager
+    async def slot(self):
+        """Wait until fewer than max_concurrency LLM calls are outstanding"""
+        self._bind()
+        self.waiting += 1
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self.waiting -= 1
+        self.in_flight += 1
+        self.calls += 1
+        try:
+            yield
+        finally:
+            self.in_flight -= 1
+            self._semaphore.release()
+
+    @staticmethod
+    def warm_up():
+        """Import the OpenAI client ahead of the first analysis with an API key"""
+        import httpx  # noqa: F401
+        import openai  # noqa: F401
+
+    async def close(self):
+        http, self._http = self._http, None
+        self._clients = OrderedDict()
+        self._loop = None
+        if http is not None:
+            await http.aclose()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "max_concurrency": self.max_concurrency,
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "calls": self.calls,
+            "clients": len(self._clients),
+        }
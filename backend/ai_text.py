@@ -0,0 +1,153 @@
+import json
+import math
+import re
+import unicodedata
+from collections import Counter
+from typing import Any, Dict, Iterator, List, Tuple
+
+# Zero-width and filler characters: email tools pad hidden preheaders with them
+# (&zwnj;, &#847;...) so that clients don't fill the inbox preview with body text
+INVISIBLE_CHARACTERS = re.compile(
+    "[\u00ad\u034f\u061c\u115f\u1160\u17b4\u17b5\u180e\u200b-\u200f"
+    "\u2060-\u2064\u206a-\u206f\u3164\ufeff\uffa0]"
+)
+
+# Footer and header chrome found in most newsletters, in the languages we see most;
+# only short lines are dropped, so a paragraph mentioning one of these stays.
+# Matched against lowercased lines: much faster than re.IGNORECASE
+BOILERPLATE = re.compile("|".join([
+    r"unsubscribe|d[ée]sabonne|d[ée]sinscri|abmelden|darse de baja|cancelar (?:la |tu )?suscripci[óo]n|disiscriviti|annulla l'iscrizione",
+    r"not displaying (?:correctly|properly)|ne s'affiche pas correctement|view (?:this (?:e-?mail|message) |it )?(?:in|on) (?:your |a )?(?:browser|web)|(?:voir|afficher|consulter) (?:la version|cet e-?mail|ce message|l'e-?mail) (?:en ligne|dans (?:votre|le|un) navigateur)",
+    r"im browser (?:ansehen|anzeigen|öffnen)|ver (?:en (?:el|tu) )?navegador|visualizza nel browser",
+    r"all rights reserved|tous droits r[ée]serv[ée]s|alle rechte vorbehalten|todos los derechos reservados|tutti i diritti riservati",
+    r"you (?:are )?receiv(?:ed|ing) this|vous recevez (?:cet|ce|cette)|sie erhalten diese|recibes este|ricevi questa",
+    r"(?:manage|update) (?:your )?(?:e-?mail |subscription )?preferences|g[ée]rer (?:vos|mes) (?:pr[ée]f[ée]rences|abonnements)",
+    r"^(?:©|\(c\)|copyright)\s",
+]))
+BOILERPLATE_MAX_LENGTH = 160
+
+# Scripts written without spaces, about one token per character
+WIDE_CHARACTERS = re.compile("[\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af\uf900-\ufaff]")
+
+SENTENCE_BREAK = re.compile(r"(?<=[.!?…])\s+|(?<=[。！？])")
+WORD_BREAK = re.compile(r"\s+")
+
+ChunkResult = Dict[str, Any]
+
+
+def clean_visible_text(raw: str) -> str:
+    """Visible text as the AI should read it: one line per block, whitespace collapsed, boilerplate dropped"""
+    text = INVISIBLE_CHARACTERS.sub("", unicodedata.normalize("NFKC", raw))
+    lines = []
+    for line in text.split("\n"):
+        line = " ".join(line.split())
+        if not line or (len(line) <= BOILERPLATE_MAX_LENGTH and BOILERPLATE.search(line.lower())):
+            continue
+        lines.append(line)
+    return "\n".join(lines)
+
+
+def estimate_tokens(text: str) -> int:
+    """Token count without a tokenizer: 4 ASCII characters, 2 other letters or 1 CJK character per token"""
+    ascii_characters = len(text.encode("ascii", "ignore"))
+    wide_characters = len(WIDE_CHARACTERS.findall(text))
+    other_characters = len(text) - ascii_characters - wide_characters
+    return math.ceil(ascii_characters / 4 + other_characters / 2) + wide_characters
+
+
+def _pieces(text: str, max_tokens: int, splitters=(SENTENCE_BREAK, WORD_BREAK)) -> Iterator[Tuple[str, int]]:
+    """Split text into pieces of at most max_tokens: whole, else by sentence, else by word, else by slice"""
+    tokens = estimate_tokens(text)
+    if tokens <= max_tokens:
+        yield text, tokens
+        return
+    if not splitters:
+        # No character counts for more than one token
+        for start in range(0, len(text), max_tokens):
+            part = text[start:start + max_tokens]
+            yield part, estimate_tokens(part)
+        return
+    for part in splitters[0].split(text):
+        if part:
+            yield from _pieces(part, max_tokens, splitters[1:])
+
+
+def chunk_text(text: str, max_tokens: int) -> List[str]:
+    """Pack the lines of text into chunks of about max_tokens, splitting only lines that don't fit"""
+    max_tokens = max(1, max_tokens)
+    chunks = []
+    current = []
+    current_tokens = 0
+    for line in text.split("\n"):
+        if not line:
+            continue
+        for piece, tokens in _pieces(line, max_tokens):
+            # One more token for the line break joining it, so a chunk never exceeds max_tokens
+            if current and current_tokens + 1 + tokens > max_tokens:
+                chunks.append("\n".join(current))
+                current = []
+                current_tokens = 0
+            current_tokens += tokens + 1 if current else tokens
+            current.append(piece)
+    if current:
+        chunks.append("\n".join(current))
+    return chunks
+
+
+def split_for_analysis(text: str, chunk_tokens: int, max_chunks: int) -> List[str]:
+    """chunk_text, with chunks grown past chunk_tokens when needed so the whole text fits in max_chunks"""
+    budget = max(chunk_tokens, math.ceil(estimate_tokens(text) / max(1, max_chunks)))
+    while True:
+        chunks = chunk_text(text, budget)
+        if len(chunks) <= max_chunks:
+            return chunks
+        budget += max(1, budget // 4)
+
+
+def _dedupe(items: List[Any]) -> List[Any]:
+    seen = set()
+    unique = []
+    for item in items:
+        key = " ".join(item.split()).casefold() if isinstance(item, str) else json.dumps(item, sort_keys=True, default=str)
+        if key not in seen:
+            seen.add(key)
+            unique.append(item)
+    return unique
+
+
+def _merge_values(values: List[Tuple[Any, int]]) -> Any:
+    if all(isinstance(value, dict) for value, _ in values):
+        return _merge_objects(values)
+    if all(isinstance(value, (int, float)) and not isinstance(value, bool) for value, _ in values):
+        mean = round(sum(value * weight for value, weight in values) / sum(weight for _, weight in values), 1)
+        return int(mean) if mean.is_integer() and all(isinstance(value, int) for value, _ in values) else mean
+    if all(isinstance(value, list) for value, _ in values):
+        return _dedupe([item for value, _ in values for item in value])
+    if all(isinstance(value, str) for value, _ in values):
+        votes = Counter()
+        for value, weight in values:
+            votes[value] += weight
+        # Counter keeps insertion order, so a tie goes to the earliest chunk
+        return votes.most_common(1)[0][0]
+    return values[0][0]
+
+
+def _merge_objects(values: List[Tuple[Dict[str, Any], int]]) -> Dict[str, Any]:
+    keys = list(dict.fromkeys(key for value, _ in values for key in value))
+    return {key: _merge_values([(value[key], weight) for value, weight in values if key in value]) for key in keys}
+
+
+def merge_chunk_analyses(results: List[ChunkResult], weights: List[int]) -> ChunkResult:
+    """One analysis from the analyses of each chunk
+
+    Scores are averaged, weighted by chunk size; lists (errors, CTAs, suggestions) are
+    merged without duplicates; labels such as lisibilite.niveau take the weighted majority.
+    Failed chunks are left out; if every chunk failed, the first error is returned.
+    weights must be positive.
+    """
+    succeeded = [(result, weight) for result, weight in zip(results, weights) if "error" not in result]
+    if not succeeded:
+        return results[0]
+    merged = _merge_objects(succeeded)
+    merged["couverture"] = {"parties": len(results), "parties_analysees": len(succeeded)}
+    return merged
@@ -0,0 +1,104 @@
+from typing import Any, Dict, List, Optional, Tuple
+
+# Bytes of an image needed to read its dimensions; JPEG headers with EXIF can be long
+SNIFF_BYTES = 64 * 1024
+
+JPEG_SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+
+AssetResult = Dict[str, Any]
+
+
+def image_dimensions(prefix: bytes) -> Optional[Tuple[int, int]]:
+    """Width and height from the first bytes of a PNG, GIF, JPEG or WebP image"""
+    if prefix.startswith(b"\x89PNG\r\n\x1a\n") and len(prefix) >= 24:
+        return int.from_bytes(prefix[16:20], "big"), int.from_bytes(prefix[20:24], "big")
+    if prefix[:6] in (b"GIF87a", b"GIF89a") and len(prefix) >= 10:
+        return int.from_bytes(prefix[6:8], "little"), int.from_bytes(prefix[8:10], "little")
+    if prefix.startswith(b"RIFF") and prefix[8:12] == b"WEBP" and len(prefix) >= 30:
+        chunk = prefix[12:16]
+        if chunk == b"VP8 ":
+            return int.from_bytes(prefix[26:28], "little") & 0x3FFF, int.from_bytes(prefix[28:30], "little") & 0x3FFF
+        if chunk == b"VP8L":
+            b0, b1, b2, b3 = prefix[21:25]
+            return 1 + (((b1 & 0x3F) << 8) | b0), 1 + (((b3 & 0x0F) << 10) | (b2 << 2) | ((b1 & 0xC0) >> 6))
+        if chunk == b"VP8X":
+            return 1 + int.from_bytes(prefix[24:27], "little"), 1 + int.from_bytes(prefix[27:30], "little")
+        return None
+    if prefix.startswith(b"\xff\xd8"):
+        index = 2
+        while index + 9 < len(prefix):
+            if prefix[index] != 0xFF:
+                index += 1
+                continue
+            marker = prefix[index + 1]
+            if marker == 0xFF:
+                index += 1  # fill byte
+                continue
+            if marker in (0xD8, 0x01) or 0xD0 <= marker <= 0xD7:
+                index += 2  # markers without a length
+                continue
+            if marker in JPEG_SOF_MARKERS:
+                height = int.from_bytes(prefix[index + 5:index + 7], "big")
+                width = int.from_bytes(prefix[index + 7:index + 9], "big")
+                return width, height
+            index += 2 + int.from_bytes(prefix[index + 2:index + 4], "big")
+    return None
+
+
+def content_range_total(header: Optional[str]) -> Optional[int]:
+    """Full size from a Content-Range header such as "bytes 0-65535/482113" """
+    if not header or "/" not in header:
+        return None
+    total = header.rsplit("/", 1)[1].strip()
+    return int(total) if total.isdigit() else None
+
+
+def kilobytes(size: int) -> str:
+    return f"{size / 1024:.0f}"
+
+
+def asset_report(html_bytes: int, assets: List[AssetResult], clip_budget: int, total_budget: int,
+                 image_budget: int) -> Tuple[Dict[str, Any], List[str], List[str]]:
+    """Weight of the newsletter against its budgets: report section, critical issues and warnings"""
+    critical_issues = []
+    warnings = []
+    if html_bytes > clip_budget:
+        warnings.append(
+            f"HTML de {kilobytes(html_bytes)} Ko : Gmail tronque les messages au-delà de {kilobytes(clip_budget)} Ko"
+        )
+
+    asset_bytes = 0
+    unknown = 0
+    for asset in assets:
+        size = asset.get("bytes")
+        if asset.get("status") == "error":
+            label = "Image" if asset["kind"] == "image" else "Feuille de style"
+            code = asset.get("status_code") or asset.get("error") or "erreur"
+            critical_issues.append(f"{label} inaccessible ({code}) : {asset['url']}")
+            continue
+        if size is None:
+            unknown += 1
+            continue
+        asset_bytes += size
+        if asset["kind"] == "image" and size > image_budget:
+            warnings.append(f"Image lourde ({kilobytes(size)} Ko) : {asset['url']}")
+
+    total_bytes = html_bytes + asset_bytes
+    if total_bytes > total_budget:
+        warnings.append(
+            f"Poids total de {kilobytes(total_bytes)} Ko (HTML et {len(assets)} ressources) "
+            f"au-delà du budget de {kilobytes(total_budget)} Ko"
+        )
+    section = {
+        "html_bytes": html_bytes,
+        "clip_budget": clip_budget,
+        "clipped": html_bytes > clip_budget,
+        "asset_count": len(assets),
+        "asset_bytes": asset_bytes,
+        "unknown_sizes": unknown,
+        "total_bytes": total_bytes,
+        "total_budget": total_budget,
+        "over_budget": total_bytes > total_budget,
+        "assets": assets,
+    }
+    return section, critical_issues, warnings
@@ -0,0 +1,54 @@
+"""Bulk analysis: serial calls to run_analysis versus one batch job
+
+Run from the backend directory: python benchmarks/bench_batch.py
+"""
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.corpus import generate_newsletter  # noqa: E402
+from benchmarks.stub_farm import farm_process  # noqa: E402
+import server  # noqa: E402
+
+NEWSLETTERS = 100
+
+
+def corpus(farm):
+    newsletters = []
+    for seed in range(NEWSLETTERS):
+        html = generate_newsletter(20_000, duplicate_ratio=0.3, seed=seed)
+        # Half of the articles are specific to this newsletter, the rest recur across the corpus
+        html = html.replace("/article/1", f"/article/{seed}-1")
+        # Point the synthetic links at the stub farm
+        for site in range(40):
+            html = html.replace(f"https://site{site}.example.com", farm.base_urls[site % farm.hosts])
+        newsletters.append(server.NewsletterAnalysisRequest(html_content=html))
+    return newsletters
+
+
+async def main():
+    with farm_process(hosts=20, latency=0.05) as farm:
+        newsletters = corpus(farm)
+
+        server.link_cache.clear()
+        start = time.perf_counter()
+        for newsletter in newsletters:
+            await server.run_analysis(newsletter)
+        serial = time.perf_counter() - start
+        print(f"serial: {NEWSLETTERS / serial:7.1f} newsletters/s")
+
+        server.link_cache.clear()
+        job = server.job_queue.submit(newsletters, context={
+            "link_cache": server.LinkCache(ttl=float("inf"), error_ttl=float("inf"), max_entries=10 ** 9)
+        })
+        while not job.done:
+            await asyncio.sleep(0.05)
+        status = server.batch_job_status(job)
+        print(f"batch ({server.job_queue.workers} workers): {status.items_per_second:7.1f} newsletters/s  links {status.links}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
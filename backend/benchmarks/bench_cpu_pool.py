@@ -0,0 +1,71 @@
+"""Throughput of /api/analyze-newsletter under many concurrent large newsletters,
+with parsing in threads versus worker processes
+
+Run from the backend directory: python benchmarks/bench_cpu_pool.py
+Process mode only pays off with several cores; compare the rows against os.cpu_count().
+"""
+import asyncio
+import os
+import sys
+import time
+
+import httpx
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# All requests come from one client: no per-client rate limit (read when server is imported)
+os.environ["ADMISSION_RATE"] = "0"
+
+from benchmarks.corpus import generate_newsletter  # noqa: E402
+from benchmarks.stub_farm import farm_process  # noqa: E402
+from cpu_pool import CPUPool  # noqa: E402
+import server  # noqa: E402
+
+REQUESTS = 48
+CONCURRENCY = 16
+
+
+def corpus(farm):
+    newsletters = []
+    for seed in range(8):
+        html = generate_newsletter(500_000, seed=seed)
+        for site in range(40):
+            html = html.replace(f"https://site{site}.example.com", farm.base_urls[site % farm.hosts])
+        newsletters.append(html)
+    return newsletters
+
+
+async def load(client, newsletters):
+    semaphore = asyncio.Semaphore(CONCURRENCY)
+
+    async def submit(index):
+        async with semaphore:
+            response = await client.post("/api/analyze-newsletter", json={"html_content": newsletters[index % len(newsletters)]})
+            response.raise_for_status()
+
+    start = time.perf_counter()
+    await asyncio.gather(*[submit(index) for index in range(REQUESTS)])
+    return REQUESTS / (time.perf_counter() - start)
+
+
+async def main():
+    cores = os.cpu_count() or 1
+    print(f"{cores} CPU(s), {REQUESTS} requests of ~500 KB, {CONCURRENCY} concurrent")
+    with farm_process(hosts=20, latency=0) as farm:
+        newsletters = corpus(farm)
+        transport = httpx.ASGITransport(app=server.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=600) as client:
+            # Verify every link once so the runs below measure the CPU-bound stages
+            await load(client, newsletters)
+            for mode in ("thread", "process"):
+                for workers in sorted({1, 2, 4, cores}):
+                    server.cpu_pool = CPUPool(mode=mode, workers=workers)
+                    await server.cpu_pool.start()
+                    try:
+                        rate = await load(client, newsletters)
+                    finally:
+                        server.cpu_pool.shutdown()
+                    print(f"{mode:>8} x{workers:<3} {rate:7.2f} requests/s")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,66 @@
+"""Link cache hit rate before and after a deploy, with and without the on-disk link store
+
+Run from the backend directory: python benchmarks/bench_link_store.py
+A "deploy" empties the in-memory cache and opens the store again, as a fresh worker would.
+"""
+import asyncio
+import os
+import random
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.stub_farm import StubFarm  # noqa: E402
+from link_store import LinkStore  # noqa: E402
+import server  # noqa: E402
+
+NEWSLETTERS = 60
+LINKS_PER_NEWSLETTER = 40
+POPULAR_URLS = 300
+
+
+def newsletter_links(farm, seed):
+    # Mostly recurring URLs (logos, landing pages), a few specific to the newsletter
+    rng = random.Random(seed)
+    popular = farm.urls(POPULAR_URLS)
+    urls = [rng.choice(popular) for _ in range(LINKS_PER_NEWSLETTER - 5)]
+    urls += [f"{farm.base_urls[0]}/article/{seed}-{index}" for index in range(5)]
+    return [server.LinkInfo(url=url, text="") for url in urls]
+
+
+async def run(farm, first_seed):
+    """Analyze NEWSLETTERS newsletters; returns the share of distinct-URL lookups answered without probing"""
+    probes_before = sum(farm.requests.values())
+    lookups = 0
+    for seed in range(first_seed, first_seed + NEWSLETTERS):
+        links = newsletter_links(farm, seed)
+        lookups += len(server.group_links_by_url(links))
+        await server.verify_all_links(links)
+    probes = sum(farm.requests.values()) - probes_before
+    return 1 - probes / lookups
+
+
+async def main():
+    async with StubFarm(hosts=20, latency=0.01) as farm:
+        with tempfile.TemporaryDirectory() as directory:
+            for label, path in (("memory only", None), ("with store", os.path.join(directory, "links.sqlite3"))):
+                server.link_cache.clear()
+                server.link_store = LinkStore(path) if path else None
+                await run(farm, 0)
+                steady = await run(farm, NEWSLETTERS)
+
+                # Deploy: new process, empty memory, same store file
+                server.link_cache.clear()
+                if path:
+                    server.link_store.close()
+                    server.link_store = LinkStore(path)
+                after_deploy = await run(farm, 2 * NEWSLETTERS)
+                print(f"{label:>12}: hit rate before deploy {steady:6.1%}  right after deploy {after_deploy:6.1%}")
+                if server.link_store is not None:
+                    server.link_store.close()
+                    server.link_store = None
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,42 @@
+"""Link verification throughput against a local stub farm
+
+Run from the backend directory: python benchmarks/bench_links.py
+"""
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.stub_farm import StubFarm  # noqa: E402
+import server  # noqa: E402
+from host_limiter import HostLimiter  # noqa: E402
+
+LINKS = 400
+HOSTS = 20
+
+
+async def run(per_host, max_concurrency, rate_limit):
+    server.link_cache.clear()
+    server.host_limiter = HostLimiter(max_concurrency=max_concurrency, per_host=per_host)
+    async with StubFarm(hosts=HOSTS, latency=0.05, rate_limit=rate_limit, retry_after="0") as farm:
+        links = [server.LinkInfo(url=url, text="") for url in farm.urls(LINKS)]
+        start = time.perf_counter()
+        await server.verify_all_links(links)
+        elapsed = time.perf_counter() - start
+        statuses = {status: sum(1 for link in links if link.status == status) for status in ("success", "warning", "error")}
+        print(
+            f"per_host={per_host:<4} global={max_concurrency:<5} rate_limit={rate_limit:<3} "
+            f"{LINKS / elapsed:7.1f} links/s  429s={farm.throttled:<5} "
+            f"max/host={max(farm.max_concurrent.values())}  {statuses}"
+        )
+
+
+async def main():
+    for per_host, max_concurrency in ((2, 50), (6, 50), (6, 200), (1000, 1000)):
+        await run(per_host, max_concurrency, rate_limit=8)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
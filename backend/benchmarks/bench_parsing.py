@@ -0,0 +1,57 @@
+"""Time the HTML stages of /api/analyze-newsletter on large synthetic newsletters
+
+Run from the backend directory: python benchmarks/bench_parsing.py
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.corpus import generate_newsletter  # noqa: E402
+import html_document  # noqa: E402
+from html_checks import analyze_html_issues  # noqa: E402
+import server  # noqa: E402
+
+
+def best_of(func, repeat=5):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def separate_stages(html):
+    # Each stage receives the raw string, as the endpoint used to do
+    server.extract_links_from_html(html)
+    analyze_html_issues(html)
+    if hasattr(server, "parse_newsletter"):
+        server.parse_newsletter(html).text
+    else:
+        server.BeautifulSoup(html, 'html.parser').get_text()
+
+
+def shared_document(html, backend=None):
+    document = server.parse_newsletter(html, backend)
+    server.extract_links_from_html(document)
+    analyze_html_issues(document)
+    document.text
+
+
+def main():
+    for size in (100_000, 300_000, 800_000):
+        html = generate_newsletter(size)
+        line = f"{len(html) / 1024:7.0f} KB  separate: {best_of(lambda: separate_stages(html)) * 1000:8.1f} ms"
+        if hasattr(server, "parse_newsletter"):
+            line += f"  shared: {best_of(lambda: shared_document(html)) * 1000:8.1f} ms"
+        print(line)
+        if hasattr(html_document, "available_parser_backends"):
+            for backend in html_document.available_parser_backends():
+                elapsed = best_of(lambda: shared_document(html, backend))
+                print(f"           {backend:>12}: {elapsed * 1000:8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
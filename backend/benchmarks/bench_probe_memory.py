@@ -0,0 +1,38 @@
+"""Bytes read and peak Python memory while probing links to very large landing pages
+
+Run from the backend directory: python benchmarks/bench_probe_memory.py
+"""
+import asyncio
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.stub_farm import farm_process  # noqa: E402
+import server  # noqa: E402
+
+LINKS = 40
+
+
+async def main():
+    for page_size in (100_000, 2_000_000, 8_000_000):
+        server.link_cache.clear()
+        with farm_process(hosts=10, latency=0.0, page_size=page_size) as farm:
+            links = [server.LinkInfo(url=url, text="") for url in farm.urls(LINKS)]
+            tracemalloc.start()
+            start = time.perf_counter()
+            await server.verify_all_links(links)
+            elapsed = time.perf_counter() - start
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            titled = sum(1 for link in links if link.title)
+            print(
+                f"page {page_size / 1e6:4.1f} MB  {LINKS} links  {elapsed * 1000:7.1f} ms  "
+                f"peak traced memory {peak / 1e6:6.1f} MB  titles {titled}/{LINKS}"
+            )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,70 @@
+"""Response size and serialization time of /api/analyze-newsletter on 500 KB newsletters
+
+Run from the backend directory: python benchmarks/bench_responses.py
+"""
+import json
+import os
+import sys
+import time
+
+from fastapi.encoders import jsonable_encoder
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.corpus import generate_newsletter  # noqa: E402
+import compression  # noqa: E402
+from html_checks import analyze_html_issues  # noqa: E402
+import json_response  # noqa: E402
+import server  # noqa: E402
+
+
+def best_of(func, repeat=10):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        value = func()
+        timings.append(time.perf_counter() - start)
+    return min(timings) * 1000, value
+
+
+def analysis_result(html, mode):
+    request = server.NewsletterAnalysisRequest(html_content=html, response_mode=mode)
+    document = server.parse_newsletter(html)
+    links = server.extract_links_from_html(document)
+    for link in links:
+        link.status, link.status_code, link.title = "success", 200, "Stub page"
+    return server.AnalysisResult(
+        links=links,
+        html_issues=analyze_html_issues(document),
+        responsive_preview=server.build_responsive_preview(request),
+        inbox_preview=server.build_inbox_preview(request),
+        report=server.build_report(links, [], None),
+    )
+
+
+def fastapi_default(result):
+    # What FastAPI does with response_model: validate, jsonable_encoder, json.dumps
+    validated = server.AnalysisResult.model_validate(result.model_dump())
+    return json.dumps(jsonable_encoder(validated), ensure_ascii=False, allow_nan=False).encode("utf-8")
+
+
+def main():
+    html = generate_newsletter(500_000)
+    print(f"newsletter: {len(html.encode('utf-8')) / 1024:.0f} KB, "
+          f"orjson {'on' if json_response.orjson else 'off'}, brotli {'on' if compression.brotli else 'off'}")
+    for mode in ("full", "lean"):
+        result = analysis_result(html, mode)
+        default_ms, body = best_of(lambda: fastapi_default(result))
+        fast_ms, fast_body = best_of(lambda: json_response.dump_model(result))
+        line = (f"{mode:>5}: {len(body) / 1024:7.0f} KB  response_model {default_ms:6.1f} ms  "
+                f"ModelResponse {fast_ms:6.1f} ms")
+        for encoding in ("gzip", "br"):
+            if encoding == "br" and compression.brotli is None:
+                continue
+            elapsed, compressed = best_of(lambda: compression.compress(fast_body, encoding), repeat=3)
+            line += f"  {encoding} {len(compressed) / 1024:6.1f} KB ({elapsed:5.1f} ms)"
+        print(line)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""Parse + rule evaluation time as the number of HTML rules grows
+
+Like a deliverability rule set, most synthetic rules look for keywords in the
+text and the others watch tags and attributes common in newsletters. Each rule
+only sees the elements it registered for, during the parser's single traversal.
+
+Run from the backend directory: python benchmarks/bench_rules.py
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.corpus import generate_newsletter  # noqa: E402
+from html_checks import HTML_RULES, run_html_rules  # noqa: E402
+from html_document import available_parser_backends, parse_newsletter  # noqa: E402
+from rules import WARNING, Rule, RuleEngine  # noqa: E402
+
+WATCHED = [("td", None), ("p", None), ("img", None), ("a", None), (None, "style"), (None, "class"), (None, "width")]
+
+
+def synthetic_rules(count):
+    rules = []
+    for index in range(count):
+        if index % 4:
+            keywords = tuple(f"mot{index} {word}" for word in ("gratuit", "offre", "promo")) + (f"terme{index}",)
+            rules.append(Rule(f"keywords_{index}", WARNING, lambda findings: [], keywords=keywords))
+            continue
+        tag, attribute = WATCHED[index % len(WATCHED)]
+        rules.append(Rule(
+            f"synthetic_{index}", WARNING, lambda findings: [],
+            tags=(tag,) if tag else (), attributes=(attribute,) if attribute else (),
+            visit=lambda tag, attributes: attributes.get("href") if tag == "a" and not attributes.get("title") else None,
+        ))
+    return rules
+
+
+def best_of(func, repeat=7):
+    timings = []
+    for _ in range(repeat):
+        start = time.process_time()
+        func()
+        timings.append(time.process_time() - start)
+    return min(timings)
+
+
+def main():
+    html = generate_newsletter(500_000)
+    print(f"newsletter {len(html) / 1024:.0f} KB")
+    for backend in available_parser_backends():
+        line = f"{backend:>12}:"
+        for extra in (None, 0, 50, 200):
+            engine = RuleEngine([] if extra is None else HTML_RULES + synthetic_rules(extra))
+            elapsed = best_of(lambda: run_html_rules(parse_newsletter(html, backend, engine)))
+            line += f"  {len(engine.rules):3d} rules {elapsed * 1000:7.1f} ms"
+        print(line)
+
+
+if __name__ == "__main__":
+    main()
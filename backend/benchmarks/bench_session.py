@@ -0,0 +1,46 @@
+"""Repeat-analysis latency with a per-call session versus the app's pooled session
+
+Run from the backend directory: python benchmarks/bench_session.py
+The link cache is cleared before every analysis so only connection reuse is measured.
+"""
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.stub_farm import StubFarm  # noqa: E402
+import server  # noqa: E402
+
+LINKS = 120
+HOSTS = 20
+ROUNDS = 10
+
+
+async def analyse_repeatedly(farm):
+    timings = []
+    for _ in range(ROUNDS):
+        server.link_cache.clear()
+        links = [server.LinkInfo(url=url, text="") for url in farm.urls(LINKS)]
+        start = time.perf_counter()
+        await server.verify_all_links(links)
+        timings.append(time.perf_counter() - start)
+    # The first round pays for the connections in both modes
+    return timings[0], statistics.median(timings[1:]), farm.connections
+
+
+async def main():
+    for label, pooled in (("session per call", False), ("pooled session  ", True)):
+        async with StubFarm(hosts=HOSTS, latency=0.01, handshake_latency=0.05) as farm:
+            if pooled:
+                async with server.lifespan(server.app):
+                    first, repeat, connections = await analyse_repeatedly(farm)
+            else:
+                first, repeat, connections = await analyse_repeatedly(farm)
+        print(f"{label}: first {first * 1000:6.1f} ms  repeat p50 {repeat * 1000:6.1f} ms  connections opened {connections}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
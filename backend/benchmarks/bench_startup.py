@@ -0,0 +1,131 @@
+"""Cold start of one worker: import time, time until ready, and idle memory
+
+Each run is a fresh process that imports the server, runs its lifespan until
+/api/ready would answer 200, then idles. With STARTUP_WARMUP=0 the heavy modules
+(OpenAI client, BeautifulSoup) are left for the first request that needs them.
+
+Run from the backend directory:
+    python benchmarks/bench_startup.py [--runs 5]
+    python benchmarks/bench_startup.py --save benchmarks/baselines/startup-<machine>.json
+    python benchmarks/bench_startup.py --compare benchmarks/baselines/startup-<machine>.json
+Comparing exits with status 1 when a metric is worse than the baseline by more
+than --tolerance.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+MODES = {"lazy": {"STARTUP_WARMUP": "0"}, "warm_up": {"STARTUP_WARMUP": "1"}}
+
+
+def rss_mb() -> float:
+    with open("/proc/self/status") as status:
+        for line in status:
+            if line.startswith("VmRSS:"):
+                return round(int(line.split()[1]) / 1024, 1)
+    return 0.0
+
+
+def child():
+    started = time.perf_counter()
+    import server
+
+    import_ms = (time.perf_counter() - started) * 1000
+    after_import = rss_mb()
+
+    async def start() -> float:
+        async with server.app.router.lifespan_context(server.app):
+            while not (server.readiness["started"] and server.readiness["warm"]):
+                await asyncio.sleep(0.005)
+            ready_ms = (time.perf_counter() - started) * 1000
+            # Idle a moment, as a worker waiting for its first request
+            await asyncio.sleep(0.5)
+            return ready_ms
+
+    ready_ms = asyncio.run(start())
+    print(json.dumps({
+        "import_ms": import_ms,
+        "ready_ms": ready_ms,
+        "rss_after_import_mb": after_import,
+        "idle_rss_mb": rss_mb(),
+        "loaded_modules": sorted(name for name in server.LAZY_MODULES if name in sys.modules),
+    }))
+
+
+def measure(env: dict, runs: int) -> dict:
+    samples = []
+    for _ in range(runs):
+        output = subprocess.run([sys.executable, __file__, "--child"], cwd=BACKEND_DIR, env={**os.environ, **env},
+                                capture_output=True, text=True, check=True).stdout
+        samples.append(json.loads(output))
+    # Medians: start-up times are noisy, and the median run is what autoscaling sees
+    result = {key: round(statistics.median(sample[key] for sample in samples), 1)
+              for key in ("import_ms", "ready_ms", "rss_after_import_mb", "idle_rss_mb")}
+    result["loaded_modules"] = samples[-1]["loaded_modules"]
+    return result
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list:
+    regressions = []
+    for mode, current in results["modes"].items():
+        previous = baseline.get("modes", {}).get(mode)
+        if previous is None:
+            continue
+        for metric in ("import_ms", "ready_ms", "idle_rss_mb"):
+            before, now = previous[metric], current[metric]
+            if before and (now - before) / before > tolerance:
+                regressions.append(f"{mode} {metric}: {before} -> {now} ({(now - before) / before:+.0%})")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5, help="fresh processes per mode")
+    parser.add_argument("--save", help="write the results to this JSON file")
+    parser.add_argument("--compare", help="baseline JSON file to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed relative change before a regression")
+    args = parser.parse_args()
+
+    results = {
+        "meta": {
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "runs": args.runs,
+        },
+        "modes": {mode: measure(env, args.runs) for mode, env in MODES.items()},
+    }
+    for mode, result in results["modes"].items():
+        print(f"{mode:>8}: import {result['import_ms']:7.1f} ms, ready {result['ready_ms']:7.1f} ms, "
+              f"RSS {result['rss_after_import_mb']:5.1f} MB after import, {result['idle_rss_mb']:5.1f} MB idle "
+              f"(loaded: {', '.join(result['loaded_modules']) or 'none'})")
+
+    if args.save:
+        os.makedirs(os.path.dirname(os.path.abspath(args.save)), exist_ok=True)
+        with open(args.save, "w") as output:
+            json.dump(results, output, indent=2)
+            output.write("\n")
+    if args.compare:
+        with open(args.compare) as baseline_file:
+            regressions = compare(results, json.load(baseline_file), args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            sys.exit(1)
+        print(f"no regression beyond {args.tolerance:.0%} against {args.compare}")
+
+
+if __name__ == "__main__":
+    if sys.argv[1:] == ["--child"]:
+        child()
+    else:
+        main()
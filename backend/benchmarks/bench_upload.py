@@ -0,0 +1,103 @@
+"""Peak memory per MB of input: JSON body vs streamed upload, on newsletters with inlined base64 images
+
+Each measurement runs in a fresh process and reports the growth of its peak RSS
+while reading and parsing one newsletter (the server modules are imported first).
+
+Run from the backend directory: python benchmarks/bench_upload.py
+"""
+import base64
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.corpus import generate_newsletter  # noqa: E402
+
+CHUNK_SIZE = 64 * 1024
+
+
+def newsletter_with_images(total_bytes: int) -> str:
+    """A 200 KB newsletter padded with inlined base64 images up to total_bytes"""
+    html = generate_newsletter(200_000, seed=1)
+    rng = random.Random(1)
+    images = []
+    size = len(html)
+    while size < total_bytes:
+        payload = base64.b64encode(rng.randbytes(300_000)).decode()
+        images.append(f'<img src="data:image/jpeg;base64,{payload}" alt="Photo">')
+        size += len(images[-1])
+    return html.replace("</body>", "".join(images) + "</body>")
+
+
+def peak_rss_kb() -> int:
+    with open("/proc/self/status") as status:
+        for line in status:
+            if line.startswith("VmHWM:"):
+                return int(line.split()[1])
+    return 0
+
+
+def reset_peak_rss():
+    try:
+        with open("/proc/self/clear_refs", "w") as clear_refs:
+            clear_refs.write("5")
+    except OSError:
+        pass  # older kernels: the peak then includes start-up
+
+
+def child(mode: str, path: str):
+    import server
+    from upload import UploadReader
+
+    reset_peak_rss()
+    before = peak_rss_kb()
+    start = time.perf_counter()
+    if mode == "json":
+        # What /api/analyze-newsletter holds: the whole body, the decoded string, the parse
+        with open(path, "rb") as body_file:
+            body = body_file.read()
+        request = server.NewsletterAnalysisRequest(**json.loads(body))
+        document = server.parse_newsletter(request.html_content)
+    else:
+        reader = UploadReader("text/html; charset=utf-8", 10 ** 10, server.UPLOAD_MAX_HTML_BYTES)
+        with open(path, "rb") as body_file:
+            for chunk in iter(lambda: body_file.read(CHUNK_SIZE), b""):
+                reader.feed(chunk)
+        document = server.parse_newsletter(reader.finish().html)
+    elapsed = time.perf_counter() - start
+    print(json.dumps({"peak_kb": peak_rss_kb() - before, "ms": elapsed * 1000, "links": len(document.links)}))
+
+
+def measure(mode: str, path: str) -> dict:
+    output = subprocess.run([sys.executable, __file__, "--child", mode, path],
+                            capture_output=True, text=True, check=True).stdout
+    return json.loads(output)
+
+
+def main():
+    with tempfile.TemporaryDirectory() as directory:
+        for total in (2_000_000, 8_000_000, 32_000_000):
+            html = newsletter_with_images(total)
+            paths = {"json": os.path.join(directory, "body.json"), "upload": os.path.join(directory, "body.html")}
+            with open(paths["json"], "w") as body_file:
+                json.dump({"html_content": html}, body_file)
+            with open(paths["upload"], "w") as body_file:
+                body_file.write(html)
+            megabytes = len(html.encode("utf-8")) / 1e6
+            for mode, path in paths.items():
+                result = measure(mode, path)
+                peak = result["peak_kb"] / 1024
+                print(f"{megabytes:5.1f} MB  {mode:>6}: peak RSS +{peak:6.1f} MB "
+                      f"({peak / megabytes:4.2f} MB per MB of input)  {result['ms']:7.1f} ms  links {result['links']}")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) == 4 and sys.argv[1] == "--child":
+        child(sys.argv[2], sys.argv[3])
+    else:
+        main()
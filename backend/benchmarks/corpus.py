@@ -0,0 +1,70 @@
+"""Synthetic newsletter generator used by the benchmarks"""
+import random
+from typing import Callable, Optional
+
+SECTION_TEMPLATE = """
+<tr>
+  <td style="padding: 20px;">
+    <table width="100%" cellpadding="0" cellspacing="0" border="0">
+      <tr>
+        <td class="content">
+          <h2 style="color: #333;">Section {index}</h2>
+          <p>{paragraph}</p>
+          <img src="https://cdn{host}.example.com/img/{index}.jpg"{alt}>
+          <a href="{url}" style="color: #e85d04;">Lire la suite <b>{index}</b></a>
+        </td>
+      </tr>
+    </table>
+  </td>
+</tr>
+"""
+
+WORDS = (
+    "newsletter offre exclusive découvrez nos nouveautés cette semaine profitez "
+    "livraison gratuite collection printemps conseils lecture inscription événement"
+).split()
+
+
+def default_link_url(index: int) -> str:
+    return f"https://site{index % 40}.example.com/article/{index}"
+
+
+def generate_newsletter(target_bytes: int = 500_000, duplicate_ratio: float = 0.5, seed: int = 0,
+                        link_count: Optional[int] = None,
+                        link_url: Callable[[int], str] = default_link_url) -> str:
+    """Build a table-heavy newsletter of roughly target_bytes
+
+    duplicate_ratio: share of links pointing at a URL already used in the newsletter
+    link_count: number of links (one per section); paragraphs are sized to still reach
+        target_bytes. By default sections have 80 words and the link count follows the size.
+    link_url: URL for a new (not duplicated) link in section n
+    """
+    rng = random.Random(seed)
+    words = 80
+    if link_count:
+        # A section is about 420 bytes of markup plus ~9 bytes per word
+        words = max(1, int((target_bytes / link_count - 420) / 9))
+    sections = []
+    size = 0
+    index = 0
+    seen_urls = []
+    while (index < link_count) if link_count else (size < target_bytes):
+        if seen_urls and rng.random() < duplicate_ratio:
+            url = rng.choice(seen_urls)
+        else:
+            url = link_url(index)
+            seen_urls.append(url)
+        paragraph = " ".join(rng.choice(WORDS) for _ in range(words))
+        alt = "" if index % 7 == 0 else f' alt="Illustration {index}"'
+        section = SECTION_TEMPLATE.format(index=index, paragraph=paragraph, host=index % 5, alt=alt, url=url)
+        sections.append(section)
+        size += len(section)
+        index += 1
+    return (
+        "<!DOCTYPE html><html><head><title>Benchmark</title>"
+        "<style>.content { padding: 20px; }</style></head><body>"
+        '<table width="100%" cellpadding="0" cellspacing="0" border="0">'
+        + "".join(sections)
+        + '<tr><td><p>Pour vous <a href="https://example.com/unsubscribe">désabonner</a>.</p></td></tr>'
+        "</table></body></html>"
+    )
@@ -0,0 +1,100 @@
+"""Local OpenAI-compatible chat completions endpoint for tests and benchmarks"""
+import asyncio
+import json
+import multiprocessing
+import time
+from contextlib import contextmanager
+
+from aiohttp import web
+
+DEFAULT_ANALYSIS = {
+    "orthographe_grammaire": {"score": 8, "erreurs": [], "suggestions": []},
+    "lisibilite": {"score": 7, "niveau": "facile", "suggestions": []},
+    "cta_evaluation": {"ctas_detectes": ["Découvrir"], "efficacite": 7, "suggestions": []},
+    "sujet_preheader": {"sujet_score": 7, "preheader_score": 6, "suggestions": []},
+    "structure": {"score": 8, "problemes": [], "suggestions": []},
+}
+
+
+class FakeLLM:
+    """Answers /v1/chat/completions after `latency` seconds with a fixed JSON analysis
+
+    Requests with the API key "invalid" get a 401, like the real API.
+    """
+
+    def __init__(self, latency: float = 0.0, analysis=None):
+        self.latency = latency
+        self.analysis = analysis or DEFAULT_ANALYSIS
+        self.calls = 0
+        self.concurrent = 0
+        self.max_concurrent = 0
+        self.prompts = []
+        self.base_url = None
+        self._runner = None
+
+    async def chat_completions(self, request):
+        if request.headers.get("Authorization") == "Bearer invalid":
+            return web.json_response({"error": {"message": "Incorrect API key provided", "type": "invalid_request_error"}}, status=401)
+        body = await request.json()
+        self.calls += 1
+        self.prompts.append(body["messages"][-1]["content"])
+        self.concurrent += 1
+        self.max_concurrent = max(self.max_concurrent, self.concurrent)
+        try:
+            await asyncio.sleep(self.latency)
+        finally:
+            self.concurrent -= 1
+        return web.json_response({
+            "id": f"chatcmpl-{self.calls}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "fake"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": json.dumps(self.analysis, ensure_ascii=False)},
+                "finish_reason": "stop",
+            }],
+            "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
+        })
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_post("/v1/chat/completions", self.chat_completions)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, "127.0.0.1", 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        self.base_url = f"http://127.0.0.1:{port}/v1"
+        return self
+
+    async def stop(self):
+        await self._runner.cleanup()
+
+    async def __aenter__(self):
+        return await self.start()
+
+    async def __aexit__(self, *exc_info):
+        await self.stop()
+
+
+def _serve(connection, latency):
+    async def serve():
+        llm = await FakeLLM(latency=latency).start()
+        connection.send(llm.base_url)
+        await asyncio.Event().wait()
+
+    asyncio.run(serve())
+
+
+@contextmanager
+def llm_process(latency: float = 0.0):
+    """Run a FakeLLM in a child process and yield its base URL"""
+    parent, child = multiprocessing.Pipe()
+    process = multiprocessing.Process(target=_serve, args=(child, latency), daemon=True)
+    process.start()
+    try:
+        yield parent.recv()
+    finally:
+        process.terminate()
+        process.join()
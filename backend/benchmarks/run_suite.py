@@ -0,0 +1,280 @@
+"""Reproducible end-to-end benchmark of /api/analyze-newsletter
+
+The stub web farm and the fake LLM run in child processes. For each scenario a
+fresh uvicorn server is started (cold caches, peak RSS measured per scenario)
+and replays a deterministic corpus. The report gives p50/p95/p99 latency,
+throughput and peak RSS, for the endpoint and for each stage (from
+report.timings).
+
+Run from the backend directory:
+    python benchmarks/run_suite.py [--quick] [--scenario NAME]
+    python benchmarks/run_suite.py --save benchmarks/baselines/<machine>.json
+    python benchmarks/run_suite.py --compare benchmarks/baselines/<machine>.json
+Comparing exits with status 1 when a metric is worse than the baseline by more
+than --tolerance.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import socket
+import subprocess
+import sys
+import time
+from dataclasses import asdict, dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+import httpx
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+from benchmarks.corpus import generate_newsletter  # noqa: E402
+from benchmarks.fake_llm import llm_process  # noqa: E402
+from benchmarks.stub_farm import farm_process  # noqa: E402
+
+PAGES_ONLY = [("page", 1.0)]
+HOSTILE_MIX = [
+    ("page", 0.6), ("redirect/3", 0.1), ("missing", 0.05), ("status/500", 0.05),
+    ("huge", 0.1), ("slowloris", 0.1),
+]
+
+
+@dataclass
+class Scenario:
+    name: str
+    newsletter_bytes: int
+    links: int
+    duplicate_ratio: float
+    requests: int
+    concurrency: int
+    ai: bool = True
+    mix: List[Tuple[str, float]] = field(default_factory=lambda: PAGES_ONLY)
+
+
+SCENARIOS = [
+    Scenario("small", newsletter_bytes=20_000, links=20, duplicate_ratio=0.3, requests=60, concurrency=8),
+    Scenario("large", newsletter_bytes=500_000, links=300, duplicate_ratio=0.5, requests=16, concurrency=4),
+    Scenario("hostile_links", newsletter_bytes=40_000, links=60, duplicate_ratio=0.1, requests=24, concurrency=4,
+             ai=False, mix=HOSTILE_MIX),
+]
+
+
+def percentiles(values: List[float]) -> Dict[str, Optional[float]]:
+    """Nearest-rank p50/p95/p99 of a list of milliseconds"""
+    if not values:
+        return {"p50": None, "p95": None, "p99": None}
+    ordered = sorted(values)
+    pick = lambda q: round(ordered[min(len(ordered) - 1, max(0, int(q * len(ordered) + 0.5) - 1))], 1)  # noqa: E731
+    return {"p50": pick(0.50), "p95": pick(0.95), "p99": pick(0.99)}
+
+
+def build_corpus(scenario: Scenario, farm, count: int, first_seed: int = 0) -> List[str]:
+    newsletters = []
+    behaviours = [behaviour for behaviour, _ in scenario.mix]
+    weights = [weight for _, weight in scenario.mix]
+    for seed in range(first_seed, first_seed + count):
+        rng = random.Random(seed)
+        newsletters.append(generate_newsletter(
+            scenario.newsletter_bytes, duplicate_ratio=scenario.duplicate_ratio, seed=seed,
+            link_count=scenario.links,
+            # Half the URLs recur across the corpus, like logos and landing pages
+            link_url=lambda index: farm.url(
+                index if rng.random() < 0.5 else seed * 10_000 + index, rng.choices(behaviours, weights)[0]
+            ),
+        ))
+    return newsletters
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def peak_rss_mb(pid: int) -> Optional[float]:
+    try:
+        with open(f"/proc/{pid}/status") as status:
+            for line in status:
+                if line.startswith("VmHWM:"):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    return None  # not Linux
+
+
+async def wait_until_up(client: httpx.AsyncClient, process: subprocess.Popen):
+    for _ in range(300):
+        if process.poll() is not None:
+            raise RuntimeError("uvicorn exited during startup")
+        try:
+            # Ready means warmed up: the first request should not pay for lazy imports
+            if (await client.get("/api/ready")).status_code == 200:
+                return
+        except httpx.TransportError:
+            pass
+        await asyncio.sleep(0.1)
+    raise RuntimeError("uvicorn did not start")
+
+
+# The replayed traffic comes from a single client: a per-client rate limit would turn it into 429s
+SERVER_ENV = {"ADMISSION_RATE": "0"}
+
+
+async def run_scenario(scenario: Scenario, farm, llm_url: str, env: Dict[str, str]) -> Dict[str, Any]:
+    newsletters = build_corpus(scenario, farm, scenario.requests)
+    warm_up = build_corpus(scenario, farm, 1, first_seed=10 ** 6)[0]
+    port = free_port()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "server:app", "--port", str(port), "--log-level", "warning"],
+        cwd=BACKEND_DIR, env={**os.environ, **SERVER_ENV, "OPENAI_BASE_URL": llm_url, **env},
+    )
+    try:
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", timeout=300) as client:
+            await wait_until_up(client, process)
+
+            async def analyze(html: str) -> Tuple[float, Dict[str, Any]]:
+                payload = {"html_content": html, "response_mode": "lean"}
+                if scenario.ai:
+                    payload["openai_api_key"] = "sk-bench"
+                start = time.perf_counter()
+                response = await client.post("/api/analyze-newsletter", json=payload)
+                elapsed = (time.perf_counter() - start) * 1000
+                response.raise_for_status()
+                return elapsed, response.json()["report"]["timings"]
+
+            await analyze(warm_up)
+            semaphore = asyncio.Semaphore(scenario.concurrency)
+
+            async def bounded(html: str):
+                async with semaphore:
+                    return await analyze(html)
+
+            start = time.perf_counter()
+            outcomes = await asyncio.gather(*[bounded(html) for html in newsletters])
+            wall = time.perf_counter() - start
+    finally:
+        rss = peak_rss_mb(process.pid)
+        process.terminate()
+        process.wait()
+
+    stages: Dict[str, List[float]] = {}
+    for _, timings in outcomes:
+        for name, entry in timings["stages"].items():
+            if entry["status"] not in ("skipped", "reused"):
+                stages.setdefault(name, []).append(entry["duration_ms"])
+    return {
+        "config": asdict(scenario),
+        "throughput_rps": round(len(outcomes) / wall, 2),
+        "latency_ms": percentiles([elapsed for elapsed, _ in outcomes]),
+        "stages_ms": {name: percentiles(values) for name, values in sorted(stages.items())},
+        "peak_rss_mb": rss,
+    }
+
+
+def compare(results: Dict[str, Any], baseline: Dict[str, Any], tolerance: float, min_delta_ms: float) -> List[str]:
+    """Human-readable regressions of results against a baseline
+
+    Latencies must also be worse by min_delta_ms: a few milliseconds on a short
+    stage are noise, not a regression.
+    """
+    regressions = []
+    for name, current in results["scenarios"].items():
+        previous = baseline.get("scenarios", {}).get(name)
+        if previous is None:
+            continue
+        if previous["config"] != json.loads(json.dumps(current["config"])):
+            regressions.append(f"{name}: scenario differs from the baseline (--quick or edited), not comparable")
+            continue
+        checks = [("throughput_rps", current["throughput_rps"], previous["throughput_rps"], False),
+                  ("peak_rss_mb", current["peak_rss_mb"], previous["peak_rss_mb"], True)]
+        checks += [(f"latency_ms.{q}", current["latency_ms"][q], previous["latency_ms"][q], True)
+                   for q in ("p50", "p95", "p99")]
+        for stage, values in current["stages_ms"].items():
+            for q in ("p50", "p95"):
+                checks.append((f"stages_ms.{stage}.{q}", values[q], previous["stages_ms"].get(stage, {}).get(q), True))
+        for metric, now, before, lower_is_better in checks:
+            if now is None or not before:
+                continue
+            change = (now - before) / before
+            if "_ms." in metric and now - before < min_delta_ms:
+                continue
+            if (change > tolerance) if lower_is_better else (change < -tolerance):
+                regressions.append(f"{name} {metric}: {before} -> {now} ({change:+.0%})")
+    return regressions
+
+
+def print_results(results: Dict[str, Any]):
+    for name, scenario in results["scenarios"].items():
+        latency = scenario["latency_ms"]
+        print(f"{name}: {scenario['throughput_rps']} req/s, p50 {latency['p50']} ms, p95 {latency['p95']} ms, "
+              f"p99 {latency['p99']} ms, peak RSS {scenario['peak_rss_mb']} MB")
+        for stage, values in scenario["stages_ms"].items():
+            print(f"    {stage:>12}: p50 {values['p50']} ms, p95 {values['p95']} ms, p99 {values['p99']} ms")
+
+
+def git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenario", action="append", help="run only these scenarios")
+    parser.add_argument("--quick", action="store_true", help="a quarter of the requests, for a smoke run")
+    parser.add_argument("--llm-latency", type=float, default=0.3, help="seconds the fake LLM takes to answer")
+    parser.add_argument("--farm-latency", type=float, default=0.05, help="seconds every stub page takes")
+    parser.add_argument("--env", action="append", default=[], metavar="NAME=VALUE",
+                        help="environment variable for the server, e.g. ANALYSIS_EXECUTOR=process")
+    parser.add_argument("--save", help="write the results to this JSON file")
+    parser.add_argument("--compare", help="baseline JSON file to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed relative change before a regression")
+    parser.add_argument("--min-delta-ms", type=float, default=20, help="latency changes smaller than this are ignored")
+    args = parser.parse_args()
+
+    scenarios = [scenario for scenario in SCENARIOS if not args.scenario or scenario.name in args.scenario]
+    if args.quick:
+        for scenario in scenarios:
+            scenario.requests = max(scenario.concurrency, scenario.requests // 4)
+    env = dict(item.split("=", 1) for item in args.env)
+
+    results = {
+        "meta": {
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "git_revision": git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "llm_latency": args.llm_latency,
+            "farm_latency": args.farm_latency,
+            "env": env,
+        },
+        "scenarios": {},
+    }
+    with farm_process(hosts=20, latency=args.farm_latency) as farm, llm_process(args.llm_latency) as llm_url:
+        for scenario in scenarios:
+            results["scenarios"][scenario.name] = await run_scenario(scenario, farm, llm_url, env)
+    print_results(results)
+
+    if args.save:
+        os.makedirs(os.path.dirname(os.path.abspath(args.save)), exist_ok=True)
+        with open(args.save, "w") as output:
+            json.dump(results, output, indent=2)
+            output.write("\n")
+    if args.compare:
+        with open(args.compare) as baseline_file:
+            regressions = compare(results, json.load(baseline_file), args.tolerance, args.min_delta_ms)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            sys.exit(1)
+        print(f"no regression beyond {args.tolerance:.0%} against {args.compare}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
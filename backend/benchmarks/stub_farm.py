@@ -0,0 +1,189 @@
+"""Local web farm for link-verification benchmarks: many hosts, artificial latency"""
+import asyncio
+import multiprocessing
+import weakref
+from collections import Counter
+from contextlib import contextmanager
+
+from aiohttp import web
+
+PAGE = "<html><head><title>Stub {host}</title><meta name=\"description\" content=\"Stub page\"></head><body></body></html>"
+
+
+class StubFarm:
+    """One aiohttp app served on `hosts` ports, each port standing in for a distinct host
+
+    latency: seconds added to every response
+    handshake_latency: extra seconds on the first request of each connection (stands in for TCP/TLS setup)
+    page_size: pad every page body to this many bytes after </head>
+    rate_limit: concurrent requests a host accepts before answering 429 (0 = unlimited)
+    huge_size: bytes of the /huge pages, whose <head> never ends
+    slowloris_seconds: how long /slowloris pages trickle their body, one byte at a time
+
+    Besides ordinary pages, paths select a behaviour:
+    /missing... (404), /status/<code>/..., /redirect/<hops>/... (chain of 302s
+    ending on a page), /huge/... and /slowloris/...
+    """
+
+    def __init__(self, hosts: int = 20, latency: float = 0.05, rate_limit: int = 0, retry_after: str = "1",
+                 handshake_latency: float = 0.0, page_size: int = 0, huge_size: int = 5_000_000,
+                 slowloris_seconds: float = 3.0):
+        self.hosts = hosts
+        self.huge_size = huge_size
+        self.slowloris_seconds = slowloris_seconds
+        self.latency = latency
+        self.handshake_latency = handshake_latency
+        self.page_size = page_size
+        self.connections = 0
+        self._seen_transports = weakref.WeakSet()
+        self.rate_limit = rate_limit
+        self.retry_after = retry_after
+        self.base_urls = []
+        self.requests = Counter()
+        self.throttled = 0
+        self.max_concurrent = Counter()
+        self._concurrent = Counter()
+        self._runner = None
+
+    async def handle(self, request):
+        host = request.host
+        self.requests[request.method] += 1
+        if request.transport not in self._seen_transports:
+            self._seen_transports.add(request.transport)
+            self.connections += 1
+            await asyncio.sleep(self.handshake_latency)
+        self._concurrent[host] += 1
+        self.max_concurrent[host] = max(self.max_concurrent[host], self._concurrent[host])
+        try:
+            if self.rate_limit and self._concurrent[host] > self.rate_limit:
+                self.throttled += 1
+                return web.Response(status=429, headers={"Retry-After": self.retry_after})
+            await asyncio.sleep(self.latency)
+            path = request.path
+            if path.startswith("/missing"):
+                return web.Response(status=404)
+            if path.startswith("/status/"):
+                return web.Response(status=int(path.split("/")[2]), text="Stub status")
+            if path.startswith("/redirect/"):
+                _, _, hops, rest = path.split("/", 3)
+                target = f"/redirect/{int(hops) - 1}/{rest}" if int(hops) > 1 else f"/{rest}"
+                return web.Response(status=302, headers={"Location": target})
+            if path.startswith("/huge"):
+                return await self.stream_huge(request)
+            if path.startswith("/slowloris"):
+                return await self.stream_slowly(request)
+            page = PAGE.format(host=host).encode()
+            if request.method == "HEAD" or len(page) >= self.page_size:
+                return web.Response(body=page, content_type="text/html")
+            return await self.stream_padded(request, page)
+        finally:
+            self._concurrent[host] -= 1
+
+    async def stream_padded(self, request, page):
+        response = web.StreamResponse(headers={"Content-Type": "text/html; charset=utf-8"})
+        response.content_length = self.page_size
+        await response.prepare(request)
+        await response.write(page)
+        padding = b"<p>" + b"x" * 65530 + b"</p>"
+        remaining = self.page_size - len(page)
+        try:
+            while remaining > 0:
+                await response.write(padding[:remaining])
+                remaining -= len(padding)
+        except (ConnectionResetError, RuntimeError):
+            pass  # the client stopped reading
+        return response
+
+    async def stream_huge(self, request):
+        response = web.StreamResponse(headers={"Content-Type": "text/html; charset=utf-8"})
+        response.content_length = self.huge_size
+        await response.prepare(request)
+        head = b"<html><head><title>Huge</title><style>"
+        await response.write(head)
+        padding = b"x" * 65536
+        remaining = self.huge_size - len(head)
+        try:
+            while remaining > 0:
+                await response.write(padding[:remaining])
+                remaining -= len(padding)
+        except (ConnectionResetError, RuntimeError):
+            pass
+        return response
+
+    async def stream_slowly(self, request):
+        response = web.StreamResponse(headers={"Content-Type": "text/html; charset=utf-8"})
+        await response.prepare(request)
+        try:
+            body = b"<html><head><title>Slow loris</title>" + b" " * 1_000_000
+            deadline = asyncio.get_running_loop().time() + self.slowloris_seconds
+            for byte in range(len(body)):
+                if asyncio.get_running_loop().time() > deadline:
+                    break
+                await response.write(body[byte:byte + 1])
+                await asyncio.sleep(0.05)
+            await response.write(b"</head></html>")
+        except (ConnectionResetError, RuntimeError):
+            pass
+        return response
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_route("*", "/{tail:.*}", self.handle)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        for _ in range(self.hosts):
+            site = web.TCPSite(self._runner, "127.0.0.1", 0)
+            await site.start()
+            port = site._server.sockets[0].getsockname()[1]
+            self.base_urls.append(f"http://127.0.0.1:{port}")
+        return self
+
+    async def stop(self):
+        await self._runner.cleanup()
+
+    async def __aenter__(self):
+        return await self.start()
+
+    async def __aexit__(self, *exc_info):
+        await self.stop()
+
+    def urls(self, count: int):
+        """`count` distinct page URLs spread round-robin over the hosts"""
+        return [f"{self.base_urls[i % self.hosts]}/page/{i}" for i in range(count)]
+
+    def url(self, index: int, behaviour: str = "page") -> str:
+        """URL number `index` with a given behaviour: page, missing, status/<code>, redirect/<hops>, huge or slowloris"""
+        return f"{self.base_urls[index % self.hosts]}/{behaviour}/{index}"
+
+
+class RemoteFarm:
+    """Handle on a StubFarm running in another process"""
+
+    def __init__(self, base_urls):
+        self.base_urls = base_urls
+        self.hosts = len(base_urls)
+
+    urls = StubFarm.urls
+    url = StubFarm.url
+
+
+def _serve(connection, options):
+    async def serve():
+        farm = await StubFarm(**options).start()
+        connection.send(farm.base_urls)
+        await asyncio.Event().wait()
+
+    asyncio.run(serve())
+
+
+@contextmanager
+def farm_process(**options):
+    """Run a StubFarm in a child process, so its memory and CPU don't skew measurements"""
+    parent, child = multiprocessing.Pipe()
+    process = multiprocessing.Process(target=_serve, args=(child, options), daemon=True)
+    process.start()
+    try:
+        yield RemoteFarm(parent.recv())
+    finally:
+        process.terminate()
+        process.join()
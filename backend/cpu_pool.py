@@ -0,0 +1,81 @@
+import asyncio
+import multiprocessing
+import os
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Dict, Optional
+
+EXECUTOR_MODES = ("thread", "process")
+
+
+def _boot_worker() -> int:
+    # Pay for the parser imports before the first real task
+    import html_checks  # noqa: F401
+    import html_document  # noqa: F401
+    return os.getpid()
+
+
+class CPUPool:
+    """Runs CPU-bound analysis stages off the event loop, in threads or processes
+
+    Threads keep every stage in one process and share the GIL; processes use every
+    core. In process mode, functions must live in a module the workers can import
+    (not server.py) and their arguments and results travel pickled, so keep them
+    compact.
+    """
+
+    def __init__(self, mode: str = "thread", workers: Optional[int] = None):
+        if mode not in EXECUTOR_MODES:
+            raise ValueError(f"Unknown analysis executor: {mode}")
+        self.mode = mode
+        self.workers = workers or min(4, os.cpu_count() or 1)
+        self._executor: Optional[Executor] = None
+        self.in_flight = 0
+        self.tasks = 0
+        self.restarts = 0
+
+    def _get_executor(self) -> Executor:
+        if self._executor is None:
+            if self.mode == "process":
+                # spawn, not fork: the parent has an event loop and threads running
+                self._executor = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"))
+            else:
+                self._executor = ThreadPoolExecutor(self.workers, thread_name_prefix="analysis")
+        return self._executor
+
+    async def start(self):
+        """Create the pool; worker processes are booted now rather than on the first request"""
+        executor = self._get_executor()
+        if self.mode == "process":
+            loop = asyncio.get_running_loop()
+            await asyncio.gather(*[loop.run_in_executor(executor, _boot_worker) for _ in range(self.workers)])
+
+    async def run(self, func: Callable[..., Any], *args: Any) -> Any:
+        executor = self._get_executor()
+        self.in_flight += 1
+        self.tasks += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(executor, func, *args)
+        except BrokenProcessPool:
+            # A worker died (out of memory, killed): the next call gets a fresh pool
+            if self._executor is executor:
+                self._executor = None
+                executor.shutdown(wait=False)
+                self.restarts += 1
+            raise
+        finally:
+            self.in_flight -= 1
+
+    def shutdown(self):
+        executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "mode": self.mode,
+            "workers": self.workers,
+            "in_flight": self.in_flight,
+            "tasks": self.tasks,
+            "restarts": self.restarts,
+        }
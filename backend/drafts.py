@@ -0,0 +1,47 @@
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, Optional
+
+from html_checks import RuleIssues
+from html_document import ParsedNewsletter
+from link_cache import ResultCache
+
+
+@dataclass
+class DraftSnapshot:
+    """What a resubmission of the same draft can reuse from its previous analysis"""
+    html_sha256: str
+    document: ParsedNewsletter  # compact, without the source HTML
+    rule_issues: RuleIssues = field(default_factory=dict)
+    link_results: Dict[str, Dict[str, Any]] = field(default_factory=dict)  # normalized URL -> verified fields
+    ai_key: Optional[str] = None
+    ai_analysis: Optional[Dict[str, Any]] = None
+    analyzed_at: float = field(default_factory=time.time)
+
+
+class DraftStore:
+    """Last analysis of each draft, keyed by the client's draft id or else by content hash"""
+
+    def __init__(self, ttl: float = 3600, max_entries: int = 200):
+        self._cache = ResultCache(ttl=ttl, error_ttl=ttl, max_entries=max_entries, is_success=lambda _: True)
+
+    @staticmethod
+    def key(draft_id: Optional[str], html_sha256: str) -> str:
+        return f"draft:{draft_id}" if draft_id else f"sha256:{html_sha256}"
+
+    def get(self, key: str) -> Optional[DraftSnapshot]:
+        entry = self._cache.get(key)
+        if entry is None:
+            self._cache.misses += 1
+            return None
+        self._cache.hits += 1
+        return entry["snapshot"]
+
+    def put(self, key: str, snapshot: DraftSnapshot):
+        self._cache.put(key, {"snapshot": snapshot})
+
+    def clear(self):
+        self._cache.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        return self._cache.stats()
@@ -0,0 +1,111 @@
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from email.utils import parsedate_to_datetime
+from typing import Any, Dict, Optional
+from urllib.parse import urlsplit
+
+
+def host_key(url: str) -> str:
+    """Host and port a request goes to, the unit of politeness"""
+    try:
+        return urlsplit(url).netloc.lower()
+    except ValueError:
+        return ""
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Seconds to wait from a Retry-After header (delta-seconds or HTTP date)"""
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, retry_at.timestamp() - time.time())
+
+
+class HostLimiter:
+    """Global and per-host concurrency caps for outbound link checks
+
+    A host that answers 429/503 can be put on hold with back_off(); new
+    requests to it wait until the hold expires.
+    """
+
+    def __init__(self, max_concurrency: int = 50, per_host: int = 6):
+        self.max_concurrency = max_concurrency
+        self.per_host = per_host
+        self._loop = None
+        self._global = None
+        self._hosts: Dict[str, list] = {}  # host -> [semaphore, users]
+        self._blocked_until: Dict[str, float] = {}
+        self.in_flight = 0
+        self.waiting = 0
+        self.backoffs = 0
+
+    def _bind(self):
+        # Semaphores belong to one event loop; rebuild them if the loop changed
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            self._loop = loop
+            self._global = asyncio.Semaphore(self.max_concurrency)
+            self._hosts = {}
+
+    def back_off(self, url: str, delay: float):
+        """Hold every new request to this URL's host for delay seconds"""
+        key = host_key(url)
+        now = time.monotonic()
+        if len(self._blocked_until) > 1024:
+            self._blocked_until = {host: until for host, until in self._blocked_until.items() if until > now}
+        until = now + delay
+        if until > self._blocked_until.get(key, 0):
+            self._blocked_until[key] = until
+        self.backoffs += 1
+
+    @asynccontextmanager
+    async def slot(self, url: str):
+        """Wait for a free per-host and global slot, then hold both"""
+        self._bind()
+        key = host_key(url)
+        entry = self._hosts.get(key)
+        if entry is None:
+            entry = self._hosts[key] = [asyncio.Semaphore(self.per_host), 0]
+        entry[1] += 1
+        self.waiting += 1
+        acquired = False
+        try:
+            while True:
+                delay = self._blocked_until.get(key, 0) - time.monotonic()
+                if delay <= 0:
+                    break
+                await asyncio.sleep(delay)
+            self._blocked_until.pop(key, None)
+            async with entry[0], self._global:
+                self.waiting -= 1
+                acquired = True
+                self.in_flight += 1
+                try:
+                    yield
+                finally:
+                    self.in_flight -= 1
+        finally:
+            if not acquired:
+                self.waiting -= 1
+            entry[1] -= 1
+            if entry[1] == 0 and self._hosts.get(key) is entry:
+                del self._hosts[key]
+
+    def stats(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        return {
+            "max_concurrency": self.max_concurrency,
+            "per_host": self.per_host,
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "active_hosts": len(self._hosts),
+            "hosts_backing_off": sum(1 for until in self._blocked_until.values() if until > now),
+            "backoffs": self.backoffs,
+        }
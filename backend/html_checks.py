@@ -0,0 +1,78 @@
+from typing import Dict, List, Optional, Tuple, Union
+
+from html_document import ParsedNewsletter, ensure_parsed
+from rules import CRITICAL, Attributes, Rule, RuleEngine
+
+RuleIssues = Dict[str, List[str]]
+
+
+def check_images_alt(document: ParsedNewsletter) -> List[str]:
+    """Check for missing alt attributes"""
+    return [f"Image manque l'attribut alt: {src}" for src in document.images_missing_alt]
+
+
+def check_unsubscribe(document: ParsedNewsletter) -> List[str]:
+    """Check for missing unsubscribe link"""
+    if not document.has_unsubscribe:
+        return ["Lien de désabonnement manquant"]
+    return []
+
+
+def check_tables(document: ParsedNewsletter) -> List[str]:
+    """Check for table-based layout (common in emails)"""
+    if not document.table_count:
+        return ["Aucune table détectée - vérifiez la compatibilité email"]
+    return []
+
+
+def check_inline_styles(findings: List[str]) -> List[str]:
+    """Check for inline styles (not responsive)"""
+    if findings:
+        return ["Styles inline détectés - peuvent causer des problèmes de responsivité"]
+    return []
+
+
+def visit_tag(tag: str, attributes: Attributes) -> str:
+    return tag
+
+
+# Evaluated by rules.RuleEngine during the parser's single traversal. A rule on
+# ParsedNewsletter fields (or on its findings) whose inputs did not change since
+# the previous analysis of a draft keeps its previous issues.
+HTML_RULES: List[Rule] = [
+    Rule("images_alt", CRITICAL, check_images_alt, fields=("images_missing_alt",)),
+    Rule("inline_styles", CRITICAL, check_inline_styles, attributes=("style",), visit=visit_tag, max_findings=1),
+    Rule("unsubscribe", CRITICAL, check_unsubscribe, fields=("has_unsubscribe",)),
+    Rule("tables", CRITICAL, check_tables, fields=("table_count",)),
+]
+
+RULE_ENGINE = RuleEngine(HTML_RULES)
+
+
+def run_html_rules(document: ParsedNewsletter, previous: Optional[ParsedNewsletter] = None,
+                   previous_issues: Optional[RuleIssues] = None) -> Tuple[RuleIssues, List[str]]:
+    """Issues per rule, rerunning only the rules whose inputs changed; also returns the rules rerun"""
+    issues: RuleIssues = {}
+    rerun = []
+    for rule in HTML_RULES:
+        if (previous is not None and previous_issues is not None and rule.name in previous_issues
+                and rule.inputs(document) == rule.inputs(previous)):
+            issues[rule.name] = previous_issues[rule.name]
+        else:
+            issues[rule.name] = rule.run(document)
+            rerun.append(rule.name)
+    return issues, rerun
+
+
+def flatten_issues(issues: RuleIssues, severity: Optional[str] = None) -> List[str]:
+    """Issues in rule order, optionally only those of one severity"""
+    return [
+        issue for rule in HTML_RULES if severity is None or rule.severity == severity
+        for issue in issues.get(rule.name, [])
+    ]
+
+
+def analyze_html_issues(html_content: Union[str, ParsedNewsletter]) -> List[str]:
+    """Analyze HTML for common issues"""
+    issues, _ = run_html_rules(ensure_parsed(html_content))
+    return flatten_issues(issues)
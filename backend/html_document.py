@@ -0,0 +1,352 @@
+import importlib.util
+import os
+import re
+from abc import ABC, abstractmethod
+from dataclasses import dataclass, field, replace
+from typing import Dict, List, Optional, Tuple, Union
+
+from ai_text import clean_visible_text
+from rules import RuleEngine
+
+try:
+    from selectolax.lexbor import LexborHTMLParser
+except ImportError:  # optional C-accelerated parser
+    LexborHTMLParser = None
+
+# Optional tree builder for BeautifulSoup: looked up without importing it,
+# so lxml only loads (here and in every CPU pool worker) once the lxml backend is used
+LXML_AVAILABLE = importlib.util.find_spec('lxml') is not None
+
+UNSUBSCRIBE_KEYWORDS = ['unsubscribe', 'désabonnement', 'se désabonner']
+
+# Strings under these tags are not visible text (same rule as BeautifulSoup's get_text)
+NON_TEXT_CONTAINERS = {'rt', 'rp', 'style', 'script', 'template'}
+
+# Elements that start a new line of visible text
+BLOCK_TAGS = {
+    'address', 'article', 'aside', 'blockquote', 'br', 'center', 'dd', 'div', 'dl', 'dt', 'figcaption',
+    'figure', 'footer', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'header', 'hr', 'li', 'main', 'nav', 'ol',
+    'p', 'pre', 'section', 'table', 'tbody', 'td', 'tfoot', 'th', 'thead', 'tr', 'ul',
+}
+# Inline styles that hide an element from the reader, like the preheader and its padding
+HIDDEN_STYLE = re.compile(r'display\s*:\s*none|visibility\s*:\s*hidden|mso-hide\s*:\s*all', re.IGNORECASE)
+
+
+def is_hidden(tag: str, attributes: Dict[str, Optional[str]]) -> bool:
+    """Whether the element and its content are invisible in the email"""
+    if tag == 'head' or 'hidden' in attributes:
+        return True
+    style = attributes.get('style')
+    return bool(style) and HIDDEN_STYLE.search(style) is not None
+
+
+@dataclass
+class ParsedNewsletter:
+    """Everything the analysis stages need from a newsletter, collected in one traversal"""
+    html_content: str
+    links: List[Tuple[str, str]] = field(default_factory=list)  # (href, stripped text)
+    images_missing_alt: List[str] = field(default_factory=list)
+    # ("image" or "stylesheet", URL as written) for the assets the email loads
+    assets: List[Tuple[str, str]] = field(default_factory=list)
+    table_count: int = 0
+    has_unsubscribe: bool = False
+    text: str = ""
+    # What a reader sees: no hidden elements, one line per block, boilerplate dropped (see ai_text)
+    visible_text: str = ""
+    # Rule name -> what the rule noticed during the traversal (see rules.RuleEngine)
+    rule_findings: Dict[str, List[str]] = field(default_factory=dict)
+    parser: str = ""
+
+    def compact(self) -> "ParsedNewsletter":
+        """Copy without the source HTML, cheap to send to or from a worker process"""
+        return replace(self, html_content="")
+
+
+class _Collector:
+    """Accumulates a ParsedNewsletter while a backend walks its tree in document order"""
+
+    def __init__(self, document: ParsedNewsletter, engine: RuleEngine):
+        self.document = document
+        self.engine = engine
+        self.text_parts = []
+        self.visible_parts = []
+        self.hidden_depth = 0
+        # Each open <a href> keeps the raw strings found under it until it closes
+        self.open_links = []
+
+    def text(self, value: str):
+        self.text_parts.append(value)
+        if not self.hidden_depth:
+            self.visible_parts.append(value)
+        for _, _, parts in self.open_links:
+            parts.append(value)
+
+    def open_link(self, href: str):
+        # Reserve the slot now so links keep document order even when nested
+        self.open_links.append((len(self.document.links), href, []))
+        self.document.links.append(None)
+
+    def close_link(self):
+        index, href, parts = self.open_links.pop()
+        self.document.links[index] = (href, "".join(part.strip() for part in parts))
+        if not self.document.has_unsubscribe:
+            lowered = "".join(parts).lower()
+            self.document.has_unsubscribe = any(keyword in lowered for keyword in UNSUBSCRIBE_KEYWORDS)
+
+    def block(self):
+        self.visible_parts.append("\n")
+
+    def open_hidden(self):
+        self.hidden_depth += 1
+
+    def close_hidden(self):
+        self.hidden_depth -= 1
+
+    def image(self, src: Optional[str], alt: Optional[str]):
+        if not alt:
+            self.document.images_missing_alt.append('source inconnue' if src is None else src)
+        if src:
+            self.document.assets.append(('image', src))
+
+    def stylesheet(self, href: Optional[str]):
+        if href:
+            self.document.assets.append(('stylesheet', href))
+
+    def table(self):
+        self.document.table_count += 1
+
+    def element(self, tag: str, attributes: Dict[str, str]):
+        self.engine.element(self.document.rule_findings, tag, attributes)
+
+    def finish(self) -> ParsedNewsletter:
+        self.document.text = "".join(self.text_parts)
+        self.document.visible_text = clean_visible_text("".join(self.visible_parts))
+        self.engine.text(self.document.rule_findings, self.document.visible_text)
+        return self.document
+
+
+class ParserBackend(ABC):
+    """Turns newsletter HTML into a ParsedNewsletter"""
+    name = ""
+
+    def available(self) -> bool:
+        return True
+
+    @abstractmethod
+    def parse(self, html_content: str, engine: RuleEngine) -> ParsedNewsletter:
+        """Parse the HTML once, running the engine's rules on the way"""
+
+
+class SoupBackend(ParserBackend):
+    """BeautifulSoup with a given tree builder (html.parser or lxml)"""
+
+    def __init__(self, features: str):
+        self.name = features
+        self.features = features
+
+    def available(self) -> bool:
+        return self.features != 'lxml' or LXML_AVAILABLE
+
+    def parse(self, html_content: str, engine: RuleEngine) -> ParsedNewsletter:
+        # Imported on first use: with selectolax, parsing newsletters never needs BeautifulSoup
+        from bs4 import BeautifulSoup, Tag
+
+        collector = _Collector(ParsedNewsletter(html_content=html_content, parser=self.name), engine)
+        soup = BeautifulSoup(html_content, self.features)
+        text_types = soup.interesting_string_types
+
+        # Explicit stack instead of recursion: deeply nested tables are common in emails
+        stack = [(soup, None)]
+        while stack:
+            node, closing = stack.pop()
+            if closing is not None:
+                if closing == 'a':
+                    collector.close_link()
+                else:
+                    collector.close_hidden()
+                continue
+
+            if not isinstance(node, Tag):
+                if type(node) in text_types:
+                    collector.text(node)
+                continue
+
+            name = node.name
+            if name in BLOCK_TAGS:
+                collector.block()
+            if is_hidden(name, node.attrs):
+                collector.open_hidden()
+                stack.append((node, 'hidden'))
+            if name == 'a' and node.get('href') is not None:
+                collector.open_link(node['href'])
+                stack.append((node, 'a'))
+            elif name == 'img':
+                collector.image(node.get('src'), node.get('alt'))
+            elif name == 'table':
+                collector.table()
+            elif name == 'link' and 'stylesheet' in ' '.join(node.get_attribute_list('rel', [])).lower().split():
+                collector.stylesheet(node.get('href'))
+            if engine.wants(name):
+                # Multi-valued attributes (class, rel...) come as lists from BeautifulSoup
+                collector.element(name, {
+                    key: ' '.join(value) if isinstance(value, list) else value for key, value in node.attrs.items()
+                })
+
+            stack.extend((child, None) for child in reversed(node.contents))
+
+        return collector.finish()
+
+
+class SelectolaxBackend(ParserBackend):
+    """Lexbor HTML5 parser through selectolax"""
+    name = 'selectolax'
+
+    def available(self) -> bool:
+        return LexborHTMLParser is not None
+
+    def parse(self, html_content: str, engine: RuleEngine) -> ParsedNewsletter:
+        collector = _Collector(ParsedNewsletter(html_content=html_content, parser=self.name), engine)
+        tree = LexborHTMLParser(html_content)
+        hidden_depth = 0
+
+        # Same explicit stack as SoupBackend; closing markers carry the tag that closes
+        stack = [(tree.root, None)]
+        while stack:
+            node, closing = stack.pop()
+            if closing is not None:
+                if closing == 'a':
+                    collector.close_link()
+                elif closing == 'hidden':
+                    collector.close_hidden()
+                else:
+                    hidden_depth -= 1
+                continue
+            if node is None:
+                continue
+
+            # Siblings are pushed lazily so the stack stays as shallow as the tree
+            stack.append((node.next, None))
+            tag = node.tag
+            if tag == '-text':
+                if not hidden_depth:
+                    collector.text(node.text_content)
+                continue
+            if tag.startswith('-') or tag.startswith('!'):
+                continue
+
+            attributes = node.attributes
+            if tag in BLOCK_TAGS:
+                collector.block()
+            if is_hidden(tag, attributes):
+                collector.open_hidden()
+                stack.append((None, 'hidden'))
+            if tag == 'a':
+                href = attributes.get('href', False)
+                if href is not False:
+                    collector.open_link(href or '')
+                    stack.append((None, 'a'))
+            elif tag == 'img':
+                src = attributes.get('src', False)
+                collector.image(None if src is False else (src or ''), attributes.get('alt'))
+            elif tag == 'table':
+                collector.table()
+            elif tag == 'link':
+                if 'stylesheet' in (attributes.get('rel') or '').lower().split():
+                    collector.stylesheet(attributes.get('href'))
+            elif tag in NON_TEXT_CONTAINERS:
+                hidden_depth += 1
+                stack.append((None, tag))
+            if engine.wants(tag):
+                # Valueless attributes are None here and '' with BeautifulSoup
+                collector.element(tag, {key: value or '' for key, value in attributes.items()})
+
+            stack.append((node.child, None))
+
+        return collector.finish()
+
+
+# Preference order for HTML_PARSER_BACKEND=auto: fastest first, html.parser always works
+PARSER_BACKENDS: Dict[str, ParserBackend] = {
+    'selectolax': SelectolaxBackend(),
+    'lxml': SoupBackend('lxml'),
+    'html.parser': SoupBackend('html.parser'),
+}
+
+_default_backend: Optional[ParserBackend] = None
+
+
+def get_parser_backend(name: Optional[str] = None) -> ParserBackend:
+    """Resolve a backend by name, or the configured default (HTML_PARSER_BACKEND)"""
+    global _default_backend
+    if name is None:
+        if _default_backend is None:
+            _default_backend = get_parser_backend(os.environ.get('HTML_PARSER_BACKEND', 'auto'))
+        return _default_backend
+
+    if name == 'auto':
+        return next(backend for backend in PARSER_BACKENDS.values() if backend.available())
+
+    backend = PARSER_BACKENDS.get(name)
+    if backend is None:
+        raise ValueError(f"Unknown HTML parser backend: {name}")
+    if not backend.available():
+        raise ValueError(f"HTML parser backend not installed: {name}")
+    return backend
+
+
+def available_parser_backends() -> List[str]:
+    """Names of the backends usable in this environment"""
+    return [name for name, backend in PARSER_BACKENDS.items() if backend.available()]
+
+
+def parse_newsletter(html_content: str, backend: Optional[str] = None,
+                     engine: Optional[RuleEngine] = None) -> ParsedNewsletter:
+    """Parse the HTML once and collect links, images, tables, visible text and rule findings
+
+    engine defaults to the rules of html_checks.
+    """
+    if engine is None:
+        # html_checks imports this module: resolve the default rules at call time
+        from html_checks import RULE_ENGINE as engine
+    return get_parser_backend(backend).parse(html_content, engine)
+
+
+def parse_compact(html_content: str, backend: Optional[str] = None) -> ParsedNewsletter:
+    """parse_newsletter for a worker process: the caller already has the HTML"""
+    return parse_newsletter(html_content, backend).compact()
+
+
+def ensure_parsed(html: Union[str, ParsedNewsletter, None]) -> ParsedNewsletter:
+    """Accept either raw HTML or an already parsed newsletter"""
+    if isinstance(html, ParsedNewsletter):
+        return html
+    return parse_newsletter(html or "")
+
+
+def extract_page_metadata(html_content: str) -> Dict[str, Optional[str]]:
+    """Title, preview image and description of a landing page (usually just its <head>)"""
+    from bs4 import BeautifulSoup, SoupStrainer
+
+    features = 'lxml' if LXML_AVAILABLE else 'html.parser'
+    page_soup = BeautifulSoup(html_content, features, parse_only=SoupStrainer(['title', 'meta']))
+    metadata = {"title": None, "preview_image": None, "description": None}
+
+    title_tag = page_soup.find('title')
+    if title_tag:
+        metadata["title"] = title_tag.get_text(strip=True)[:100]
+    # Try Open Graph preview image
+    og_img = page_soup.find('meta', property='og:image')
+    if og_img and og_img.get('content'):
+        metadata["preview_image"] = og_img['content']
+    else:
+        twitter_img = page_soup.find('meta', attrs={'name': 'twitter:image'})
+        if twitter_img and twitter_img.get('content'):
+            metadata["preview_image"] = twitter_img['content']
+
+    # Try meta description / og:description
+    description_tag = page_soup.find('meta', property='og:description')
+    if not description_tag:
+        description_tag = page_soup.find('meta', attrs={'name': 'description'})
+    if description_tag and description_tag.get('content'):
+        metadata["description"] = description_tag['content'][:200]
+    return metadata
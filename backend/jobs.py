@@ -0,0 +1,158 @@
+import asyncio
+import time
+import uuid
+from collections import OrderedDict, deque
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+
+class BatchJob:
+    """A batch of items processed by the JobQueue workers, with its progress and results"""
+
+    def __init__(self, items: List[Any]):
+        self.id = uuid.uuid4().hex
+        self.items: Optional[List[Any]] = items
+        self.total = len(items)
+        self.status = "queued"
+        self.completed = 0
+        self.failed = 0
+        # Index of the next item to hand to a worker
+        self.next_index = 0
+        self.results: List[Any] = [None] * len(items)
+        self.errors: Dict[int, str] = {}
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        # Free for the handler to keep per-job state (e.g. a shared link cache)
+        self.context: Dict[str, Any] = {}
+
+    @property
+    def done(self) -> bool:
+        return self.status in ("completed", "failed")
+
+    def progress(self) -> Dict[str, Any]:
+        processed = self.completed + self.failed
+        elapsed = ((self.finished_at or time.time()) - self.started_at) if self.started_at else 0.0
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "total": self.total,
+            "completed": self.completed,
+            "failed": self.failed,
+            "progress": round(processed / self.total, 4) if self.total else 1.0,
+            "elapsed_seconds": round(elapsed, 3),
+            "items_per_second": round(processed / elapsed, 3) if elapsed > 0 else 0.0,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+
+
+class JobQueue:
+    """In-process queue of batch jobs drained by a fixed pool of asyncio workers
+
+    Each job is its own queue of items, and the workers take one item from each
+    job with items left in turn: a small batch submitted after a large one makes
+    progress side by side with it instead of waiting for it to drain.
+    """
+
+    def __init__(self, handler: Callable[[BatchJob, int, Any], Awaitable[Any]], workers: int = 4,
+                 max_jobs: int = 100, on_finish: Optional[Callable[[BatchJob], None]] = None):
+        self.handler = handler
+        self.on_finish = on_finish
+        self.workers = workers
+        self.max_jobs = max_jobs
+        self.jobs: "OrderedDict[str, BatchJob]" = OrderedDict()
+        # Jobs with items not yet handed to a worker, in round-robin order
+        self._ready: "deque[BatchJob]" = deque()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._tasks: List[asyncio.Task] = []
+        self._loop = None
+
+    def start(self):
+        """Start the workers on the running event loop (idempotent)"""
+        loop = asyncio.get_running_loop()
+        if self._tasks and self._loop is loop:
+            return
+        self._loop = loop
+        self._ready = deque()
+        self._wakeup = asyncio.Event()
+        self._tasks = [asyncio.ensure_future(self._worker()) for _ in range(self.workers)]
+        # Jobs left over from a previous loop can't be resumed
+        for job in self.jobs.values():
+            if not job.done:
+                job.status = "failed"
+                job.finished_at = time.time()
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def submit(self, items: List[Any], context: Optional[Dict[str, Any]] = None) -> BatchJob:
+        self.start()
+        job = BatchJob(items)
+        job.context.update(context or {})
+        self.jobs[job.id] = job
+        self._evict()
+        if job.total:
+            self._ready.append(job)
+            self._wakeup.set()
+        else:
+            self._finish(job)
+        return job
+
+    def get(self, job_id: str) -> Optional[BatchJob]:
+        return self.jobs.get(job_id)
+
+    def _evict(self):
+        # Drop the oldest finished jobs beyond max_jobs; running jobs are never dropped
+        for job_id in list(self.jobs):
+            if len(self.jobs) <= self.max_jobs:
+                break
+            if self.jobs[job_id].done:
+                del self.jobs[job_id]
+
+    def _finish(self, job: BatchJob):
+        job.status = "failed" if job.total and job.failed == job.total else "completed"
+        job.finished_at = time.time()
+        job.items = None
+        if self.on_finish is not None:
+            self.on_finish(job)
+
+    async def _next_item(self):
+        """Next item of the job whose turn it is; the job goes to the back of the rotation"""
+        while not self._ready:
+            self._wakeup.clear()
+            await self._wakeup.wait()
+        job = self._ready.popleft()
+        index = job.next_index
+        job.next_index += 1
+        if job.next_index < job.total:
+            self._ready.append(job)
+        return job, index
+
+    async def _worker(self):
+        while True:
+            job, index = await self._next_item()
+            if job.started_at is None:
+                job.started_at = time.time()
+                job.status = "running"
+            try:
+                job.results[index] = await self.handler(job, index, job.items[index])
+                job.completed += 1
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                job.errors[index] = str(e)
+                job.failed += 1
+            if job.completed + job.failed == job.total:
+                self._finish(job)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "workers": self.workers,
+            "queued_items": sum(job.total - job.next_index for job in self._ready),
+            "jobs": len(self.jobs),
+            "running_jobs": sum(1 for job in self.jobs.values() if job.status == "running"),
+        }
@@ -0,0 +1,40 @@
+import json
+from typing import Any
+
+from pydantic import BaseModel
+from starlette.responses import Response
+
+try:
+    import orjson
+except ImportError:  # optional, pydantic's own serializer is the fallback
+    orjson = None
+
+ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS if orjson is not None else 0
+
+
+def dumps(data: Any) -> bytes:
+    """UTF-8 JSON of plain data (dicts, lists, model dumps)"""
+    if orjson is not None:
+        return orjson.dumps(data, option=ORJSON_OPTIONS)
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def dump_model(model: BaseModel) -> bytes:
+    """UTF-8 JSON of a pydantic model, without FastAPI's jsonable_encoder pass"""
+    if orjson is not None:
+        return orjson.dumps(model.model_dump(), option=ORJSON_OPTIONS)
+    return model.model_dump_json().encode("utf-8")
+
+
+class ModelResponse(Response):
+    """JSON response for a pydantic model, serialized with orjson when installed
+
+    Returning it from an endpoint skips FastAPI's response_model round trip, which
+    dominates the cost of large analysis results.
+    """
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        if isinstance(content, BaseModel):
+            return dump_model(content)
+        return dumps(content)
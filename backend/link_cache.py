@@ -0,0 +1,112 @@
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+CachedResult = Dict[str, Any]
+
+
+def link_succeeded(fields: CachedResult) -> bool:
+    return fields.get("status") == "success"
+
+
+class ResultCache:
+    """Keyed LRU cache of async results, with TTLs and in-flight coalescing
+
+    Successful results live for `ttl` seconds, anything else for `error_ttl`
+    (0 means failures are not cached). Concurrent lookups of the same key
+    share a single in-flight fetch, unless their flight_key differs.
+    """
+
+    def __init__(self, ttl: float = 3600, error_ttl: float = 300, max_entries: int = 10000,
+                 clock: Callable[[], float] = time.monotonic,
+                 is_success: Callable[[CachedResult], bool] = link_succeeded):
+        self.ttl = ttl
+        self.error_ttl = error_ttl
+        self.max_entries = max_entries
+        self.clock = clock
+        self.is_success = is_success
+        self._entries: "OrderedDict[str, Tuple[float, CachedResult]]" = OrderedDict()
+        self._in_flight: Dict[str, asyncio.Task] = {}
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+
+    def get(self, key: str) -> Optional[CachedResult]:
+        """Return a fresh cached result or None, without counting a lookup"""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, fields = entry
+        if expires_at <= self.clock():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return dict(fields)
+
+    def put(self, key: str, fields: CachedResult, ttl: Optional[float] = None):
+        """Cache a result; ttl overrides the success/error TTLs (e.g. what remains of a stored entry)"""
+        if ttl is None:
+            ttl = self.ttl if self.is_success(fields) else self.error_ttl
+        if ttl <= 0 or self.max_entries <= 0:
+            return
+        self._entries[key] = (self.clock() + ttl, dict(fields))
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    async def get_or_fetch(self, key: str, fetch: Callable[[], Awaitable[CachedResult]],
+                           flight_key: Optional[str] = None) -> CachedResult:
+        """Return the cached result for key, fetching it at most once at a time
+
+        Only lookups with the same flight_key (default: key) share a fetch in flight,
+        for fetches whose failure depends on the caller, such as its credentials.
+        """
+        cached = self.get(key)
+        if cached is not None:
+            self.hits += 1
+            return cached
+
+        flight_key = key if flight_key is None else flight_key
+        task = self._in_flight.get(flight_key)
+        if task is not None:
+            self.coalesced += 1
+        else:
+            self.misses += 1
+            task = asyncio.ensure_future(self._fetch_and_store(key, flight_key, fetch))
+            self._in_flight[flight_key] = task
+        # Shield so one cancelled caller doesn't cancel the fetch for everyone else
+        return dict(await asyncio.shield(task))
+
+    async def _fetch_and_store(self, key: str, flight_key: str,
+                               fetch: Callable[[], Awaitable[CachedResult]]) -> CachedResult:
+        try:
+            fields = await fetch()
+            self.put(key, fields)
+            return fields
+        finally:
+            self._in_flight.pop(flight_key, None)
+
+    def clear(self):
+        self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses + self.coalesced
+        return {
+            "size": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl": self.ttl,
+            "error_ttl": self.error_ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "evictions": self.evictions,
+            "in_flight": len(self._in_flight),
+            "hit_rate": round((self.hits + self.coalesced) / lookups, 4) if lookups else 0.0,
+        }
+
+
+# URL-keyed cache of link verification results (status, title, description, ...)
+LinkCache = ResultCache
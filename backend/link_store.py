@@ -0,0 +1,175 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, Optional, Tuple
+
+from link_cache import CachedResult, link_succeeded
+
+# SQLite's default limit on bound parameters is 999
+LOOKUP_CHUNK = 500
+
+# PRAGMA user_version of the current schema: 2 keeps each result as a JSON object,
+# so every field the server verifies (error class, redirect chain...) round-trips
+SCHEMA_VERSION = 2
+SCHEMA = (
+    """CREATE TABLE IF NOT EXISTS links (
+        url TEXT PRIMARY KEY,
+        result TEXT NOT NULL,
+        checked_at REAL NOT NULL,
+        expires_at REAL NOT NULL
+    ) WITHOUT ROWID""",
+    "CREATE INDEX IF NOT EXISTS links_expires_at ON links (expires_at)",
+)
+# Version 1 had one column per field, for these fields only
+V1_FIELDS = ("status", "status_code", "favicon", "title", "preview_image", "description")
+
+
+def migrate(connection: sqlite3.Connection):
+    """Create the schema, or upgrade a store written by an older version, keeping its rows"""
+    if connection.execute("PRAGMA user_version").fetchone()[0] >= SCHEMA_VERSION:
+        return
+    connection.execute("BEGIN IMMEDIATE")
+    try:
+        # Another worker may have migrated while this one waited for the lock
+        if connection.execute("PRAGMA user_version").fetchone()[0] < SCHEMA_VERSION:
+            columns = {row[1] for row in connection.execute("PRAGMA table_info(links)")}
+            old_rows = []
+            if columns and "result" not in columns:
+                old_rows = connection.execute(
+                    f"SELECT url, {', '.join(V1_FIELDS)}, checked_at, expires_at FROM links"
+                ).fetchall()
+                connection.execute("DROP TABLE links")
+            for statement in SCHEMA:
+                connection.execute(statement)
+            connection.executemany(
+                "INSERT OR REPLACE INTO links (url, result, checked_at, expires_at) VALUES (?, ?, ?, ?)",
+                [
+                    (url, json.dumps(dict(zip(V1_FIELDS, values))), checked_at, expires_at)
+                    for url, *values, checked_at, expires_at in old_rows
+                ],
+            )
+            connection.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        connection.execute("COMMIT")
+    except BaseException:
+        connection.execute("ROLLBACK")
+        raise
+
+
+class LinkStore:
+    """Link verification results in an SQLite file shared by every uvicorn worker
+
+    WAL mode lets any number of processes read while one writes; each process
+    keeps its own connection. Each result is stored whole, as JSON. Rows carry wall-clock timestamps so workers agree on
+    expiry, and expired rows are deleted by expire(). Calls block: run them in a
+    thread from async code.
+    """
+
+    def __init__(self, path: str, ttl: float = 3600, error_ttl: float = 300,
+                 clock: Callable[[], float] = time.time,
+                 is_success: Callable[[CachedResult], bool] = link_succeeded):
+        self.path = path
+        self.ttl = ttl
+        self.error_ttl = error_ttl
+        self.clock = clock
+        self.is_success = is_success
+        self._lock = threading.Lock()
+        self._connection: Optional[sqlite3.Connection] = None
+        self._pid: Optional[int] = None
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.expired = 0
+
+    def _connect(self) -> sqlite3.Connection:
+        # A connection must not cross a fork: reopen in a new process
+        if self._connection is None or self._pid != os.getpid():
+            directory = os.path.dirname(os.path.abspath(self.path))
+            os.makedirs(directory, exist_ok=True)
+            connection = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            migrate(connection)
+            self._connection = connection
+            self._pid = os.getpid()
+        return self._connection
+
+    def get_many(self, urls: Iterable[str]) -> Dict[str, Tuple[float, CachedResult]]:
+        """Fresh results for the given URLs, as {url: (expires_at, fields)}; missing URLs are left out"""
+        urls = list(dict.fromkeys(urls))
+        found: Dict[str, Tuple[float, CachedResult]] = {}
+        now = self.clock()
+        with self._lock:
+            connection = self._connect()
+            for start in range(0, len(urls), LOOKUP_CHUNK):
+                chunk = urls[start:start + LOOKUP_CHUNK]
+                rows = connection.execute(
+                    f"SELECT url, expires_at, result FROM links "
+                    f"WHERE expires_at > ? AND url IN ({', '.join('?' * len(chunk))})",
+                    [now, *chunk],
+                )
+                for url, expires_at, result in rows:
+                    found[url] = (expires_at, json.loads(result))
+        self.hits += len(found)
+        self.misses += len(urls) - len(found)
+        return found
+
+    def put_many(self, results: Dict[str, CachedResult]):
+        """Store verification results, successful ones for ttl seconds and others for error_ttl"""
+        now = self.clock()
+        rows = []
+        for url, fields in results.items():
+            ttl = self.ttl if self.is_success(fields) else self.error_ttl
+            if ttl > 0:
+                rows.append((url, json.dumps(fields), now, now + ttl))
+        if not rows:
+            return
+        with self._lock:
+            connection = self._connect()
+            connection.execute("BEGIN IMMEDIATE")
+            try:
+                connection.executemany(
+                    "INSERT OR REPLACE INTO links (url, result, checked_at, expires_at) VALUES (?, ?, ?, ?)",
+                    rows,
+                )
+                connection.execute("COMMIT")
+            except BaseException:
+                connection.execute("ROLLBACK")
+                raise
+        self.writes += len(rows)
+
+    def expire(self) -> int:
+        """Delete expired rows and fold the WAL back into the database file"""
+        with self._lock:
+            connection = self._connect()
+            deleted = connection.execute("DELETE FROM links WHERE expires_at <= ?", (self.clock(),)).rowcount
+            connection.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        self.expired += deleted
+        return deleted
+
+    def clear(self):
+        with self._lock:
+            self._connect().execute("DELETE FROM links")
+
+    def close(self):
+        with self._lock:
+            if self._connection is not None and self._pid == os.getpid():
+                self._connection.close()
+            self._connection = None
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            rows = self._connect().execute("SELECT COUNT(*) FROM links").fetchone()[0]
+        lookups = self.hits + self.misses
+        return {
+            "path": self.path,
+            "rows": rows,
+            "ttl": self.ttl,
+            "error_ttl": self.error_ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "writes": self.writes,
+            "expired": self.expired,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
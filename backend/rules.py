@@ -0,0 +1,138 @@
+import re
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+CRITICAL = "critical"
+WARNING = "warning"
+
+Attributes = Dict[str, str]
+Findings = Dict[str, List[str]]
+
+# Keyword matching splits lowercased text on whitespace once punctuation is blanked out
+_PUNCTUATION = re.compile(r"[^\w\s]+")
+
+
+def keyword_tokens(text: str) -> List[str]:
+    return _PUNCTUATION.sub(" ", text.lower()).split()
+
+
+@dataclass(frozen=True)
+class Rule:
+    """One HTML check and what it looks at while the document is walked
+
+    A rule reads either ParsedNewsletter fields (fields: check gets the
+    document) or findings collected during the parser's single traversal (check
+    gets the list of findings): visit is called for the elements named in tags
+    or carrying one of attributes and returns a finding or None. In the visible
+    text (ParsedNewsletter.visible_text: no hidden elements, no footer boilerplate,
+    one line per block), each occurrence of one of keywords (whole words, any
+    case, punctuation ignored, never across lines) and each match of pattern
+    (case-insensitive) is a finding too.
+    Prefer keywords: they are looked up word by word whatever their number,
+    while every pattern adds to a regex scan of the text.
+    """
+    name: str
+    severity: str
+    check: Callable[[Any], List[str]]
+    fields: Tuple[str, ...] = ()
+    tags: Tuple[str, ...] = ()
+    attributes: Tuple[str, ...] = ()
+    visit: Optional[Callable[[str, Attributes], Optional[str]]] = None
+    keywords: Tuple[str, ...] = ()
+    pattern: Optional[str] = None
+    # Findings kept per document; the rest are dropped, not counted
+    max_findings: int = 50
+
+    def inputs(self, document) -> Any:
+        """What the rule's outcome depends on, to tell whether it must run again"""
+        if self.fields:
+            return tuple(getattr(document, field) for field in self.fields)
+        return document.rule_findings.get(self.name, [])
+
+    def run(self, document) -> List[str]:
+        return self.check(document) if self.fields else self.check(self.inputs(document))
+
+
+class RuleEngine:
+    """Dispatch tables compiled once from a list of rules
+
+    The parser calls element() for each element and text() with the visible
+    text. Rules are looked up by tag and by attribute name, keywords by the
+    first word of each phrase, and the text patterns are joined into one regex,
+    so the cost of a traversal grows with the document rather than with the
+    number of rules.
+    """
+
+    def __init__(self, rules: Iterable[Rule]):
+        self.rules = list(rules)
+        self.by_tag: Dict[str, List[Rule]] = {}
+        self.by_attribute: Dict[str, List[Rule]] = {}
+        # First word -> (phrase words, keyword as written, rule)
+        self.by_first_word: Dict[str, List[Tuple[List[str], str, Rule]]] = {}
+        text_rules = []
+        for rule in self.rules:
+            if rule.severity not in (CRITICAL, WARNING):
+                raise ValueError(f"Unknown severity for rule {rule.name}: {rule.severity}")
+            for tag in rule.tags:
+                self.by_tag.setdefault(tag, []).append(rule)
+            for attribute in rule.attributes:
+                self.by_attribute.setdefault(attribute, []).append(rule)
+            for keyword in rule.keywords:
+                words = keyword_tokens(keyword)
+                self.by_first_word.setdefault(words[0], []).append((words, keyword, rule))
+            if rule.pattern:
+                text_rules.append(rule)
+        self.text_rules = {f"r{index}": rule for index, rule in enumerate(text_rules)}
+        self.text_pattern = re.compile(
+            "|".join(f"(?P<{group}>{rule.pattern})" for group, rule in self.text_rules.items()), re.IGNORECASE
+        ) if text_rules else None
+
+    def wants(self, tag: str) -> bool:
+        """Whether element() needs this element's attributes"""
+        return bool(self.by_attribute) or tag in self.by_tag
+
+    def element(self, findings: Findings, tag: str, attributes: Attributes):
+        rules = self.by_tag.get(tag)
+        if rules:
+            for rule in rules:
+                self._visit(findings, rule, tag, attributes)
+        if self.by_attribute:
+            visited = None
+            for attribute in attributes:
+                for rule in self.by_attribute.get(attribute, ()):
+                    # Visit each rule once per element, whatever it registered for
+                    if tag in rule.tags or (visited is not None and rule.name in visited):
+                        continue
+                    if len(rule.attributes) > 1:
+                        visited = visited or set()
+                        visited.add(rule.name)
+                    self._visit(findings, rule, tag, attributes)
+
+    @staticmethod
+    def _visit(findings: Findings, rule: Rule, tag: str, attributes: Attributes):
+        finding = rule.visit(tag, attributes)
+        if finding is not None:
+            RuleEngine._add(findings, rule, finding)
+
+    def text(self, findings: Findings, text: str):
+        if self.by_first_word:
+            by_first_word = self.by_first_word
+            # Lines are blocks of the document: a phrase doesn't run from one into the next
+            for line in text.split("\n"):
+                words = keyword_tokens(line)
+                for index, word in enumerate(words):
+                    candidates = by_first_word.get(word)
+                    if candidates is None:
+                        continue
+                    for phrase, keyword, rule in candidates:
+                        if len(phrase) == 1 or words[index:index + len(phrase)] == phrase:
+                            self._add(findings, rule, keyword)
+        if self.text_pattern is not None:
+            for match in self.text_pattern.finditer(text):
+                self._add(findings, self.text_rules[match.lastgroup], match.group())
+
+    @staticmethod
+    def _add(findings: Findings, rule: Rule, finding: str):
+        kept = findings.setdefault(rule.name, [])
+        if len(kept) < rule.max_findings:
+            kept.append(finding)
@@ -1,19 +1,260 @@
-from fastapi import FastAPI, HTTPException, Depends
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from starlette.background import BackgroundTask
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
-from typing import List, Optional, Dict, Any
-import re
-import requests
+from typing import List, Literal, Optional, Dict, Any, Tuple, Union, AsyncIterator, Callable
+from contextlib import asynccontextmanager
 import json
-from urllib.parse import urlparse
+from urllib.parse import urljoin, urlparse, urlsplit, urlunsplit
 import asyncio
 import aiohttp
-from bs4 import BeautifulSoup
-import openai
 import os
+import hashlib
+import socket
+import sqlite3
+import ssl
+import sys
+import time
 from datetime import datetime
 
-app = FastAPI()
+from compression import CompressionMiddleware
+from cpu_pool import CPUPool
+from drafts import DraftSnapshot, DraftStore
+from html_checks import HTML_RULES, flatten_issues, run_html_rules
+from rules import CRITICAL, WARNING
+from html_document import ParsedNewsletter, ensure_parsed, extract_page_metadata, parse_compact, parse_newsletter
+from host_limiter import HostLimiter, parse_retry_after
+from admission import AdmissionController, Rejected
+from ai_client import AIClientPool, ai_cache_key, api_key_digest, classify_ai_error
+from ai_text import estimate_tokens, merge_chunk_analyses, split_for_analysis
+from assets import SNIFF_BYTES, asset_report, content_range_total, image_dimensions
+from jobs import BatchJob, JobQueue
+from json_response import ModelResponse, dumps
+from link_cache import LinkCache, ResultCache
+from link_store import LinkStore
+from metrics import MetricsRegistry
+from stages import StageTimeline
+from upload import UploadError, UploadReader, UploadTooLarge
+
+# Link verification results shared by every analysis on this worker
+link_cache = LinkCache(
+    ttl=float(os.environ.get("LINK_CACHE_TTL", "3600")),
+    error_ttl=float(os.environ.get("LINK_CACHE_ERROR_TTL", "300")),
+    max_entries=int(os.environ.get("LINK_CACHE_MAX_ENTRIES", "10000")),
+)
+
+# Optional on-disk copy of the link results, shared by every uvicorn worker and kept across restarts
+LINK_STORE_PATH = os.environ.get("LINK_STORE_PATH", "")
+LINK_STORE_EXPIRE_INTERVAL = float(os.environ.get("LINK_STORE_EXPIRE_INTERVAL", "600"))
+link_store: Optional[LinkStore] = (
+    LinkStore(LINK_STORE_PATH, ttl=link_cache.ttl, error_ttl=link_cache.error_ttl) if LINK_STORE_PATH else None
+)
+
+# Outbound politeness: concurrency caps and backoff for link checks
+LINK_CHECK_CONCURRENCY = int(os.environ.get("LINK_CHECK_CONCURRENCY", "50"))
+LINK_CHECK_PER_HOST = int(os.environ.get("LINK_CHECK_PER_HOST", "6"))
+LINK_CHECK_DNS_TTL = int(os.environ.get("LINK_CHECK_DNS_TTL", "300"))
+LINK_CHECK_KEEPALIVE = float(os.environ.get("LINK_CHECK_KEEPALIVE", "30"))
+LINK_CHECK_MAX_RETRIES = int(os.environ.get("LINK_CHECK_MAX_RETRIES", "2"))
+LINK_CHECK_BACKOFF = float(os.environ.get("LINK_CHECK_BACKOFF", "1"))
+LINK_CHECK_MAX_RETRY_AFTER = float(os.environ.get("LINK_CHECK_MAX_RETRY_AFTER", "10"))
+LINK_CHECK_TIMEOUT = float(os.environ.get("LINK_CHECK_TIMEOUT", "10"))
+LINK_CHECK_PAGE_TIMEOUT = float(os.environ.get("LINK_CHECK_PAGE_TIMEOUT", "5"))
+LINK_CHECK_CONNECT_TIMEOUT = float(os.environ.get("LINK_CHECK_CONNECT_TIMEOUT", "5"))
+LINK_CHECK_MAX_HEAD_BYTES = int(os.environ.get("LINK_CHECK_MAX_HEAD_BYTES", "131072"))
+LINK_CHECK_CHUNK_SIZE = 16384
+RETRY_STATUSES = {429, 503}
+# Distinct URLs verified per newsletter; links to the others are reported as "skipped"
+LINK_CHECK_MAX_PER_NEWSLETTER = int(os.environ.get("LINK_CHECK_MAX_PER_NEWSLETTER", "500"))
+# Redirects are followed hop by hop, each hop cached like a link so chains share their common tail
+LINK_CHECK_MAX_REDIRECTS = int(os.environ.get("LINK_CHECK_MAX_REDIRECTS", "10"))
+REDIRECT_STATUSES = {301, 302, 303, 307, 308}
+hop_cache = ResultCache(
+    ttl=link_cache.ttl,
+    error_ttl=link_cache.error_ttl,
+    max_entries=link_cache.max_entries,
+    is_success=lambda hop: hop["error"] is None and hop["status_code"] is not None and hop["status_code"] < 400,
+)
+
+host_limiter = HostLimiter(max_concurrency=LINK_CHECK_CONCURRENCY, per_host=LINK_CHECK_PER_HOST)
+
+# Images and stylesheets are probed through the same limiter and session as links, cached alike
+ASSET_CHECKS = os.environ.get("ASSET_CHECKS", "1").lower() not in ("0", "false", "no")
+ASSET_MAX_PER_NEWSLETTER = int(os.environ.get("ASSET_MAX_PER_NEWSLETTER", "100"))
+# Bodies without Content-Length or Content-Range are counted up to this size
+ASSET_MAX_BYTES = int(os.environ.get("ASSET_MAX_BYTES", str(10 * 1024 * 1024)))
+# Gmail clips messages whose HTML exceeds about 102 KB
+EMAIL_CLIP_BUDGET = int(os.environ.get("EMAIL_CLIP_BUDGET", str(102 * 1024)))
+ASSET_TOTAL_BUDGET = int(os.environ.get("ASSET_TOTAL_BUDGET", str(1024 * 1024)))
+ASSET_IMAGE_BUDGET = int(os.environ.get("ASSET_IMAGE_BUDGET", str(200 * 1024)))
+asset_cache = ResultCache(ttl=link_cache.ttl, error_ttl=link_cache.error_ttl, max_entries=link_cache.max_entries)
+
+# AI analysis: reused async clients, bounded concurrency and a content-hash cache
+AI_MODEL = os.environ.get("AI_MODEL", "gpt-4o-mini")
+OPENAI_BASE_URL = os.environ.get("OPENAI_BASE_URL") or None
+
+ai_clients = AIClientPool(
+    base_url=OPENAI_BASE_URL,
+    timeout=float(os.environ.get("AI_TIMEOUT", "60")),
+    max_concurrency=int(os.environ.get("AI_MAX_CONCURRENCY", "8")),
+)
+# Errors (bad key, timeout) are never cached
+ai_cache = ResultCache(
+    ttl=float(os.environ.get("AI_CACHE_TTL", "86400")),
+    error_ttl=0,
+    max_entries=int(os.environ.get("AI_CACHE_MAX_ENTRIES", "1000")),
+    is_success=lambda result: "error" not in result,
+)
+# Long newsletters are analysed in chunks of about AI_CHUNK_TOKENS tokens, AI_CHUNK_CONCURRENCY at a time,
+# then merged; past AI_MAX_CHUNKS the chunks grow instead, so the whole text is always covered
+AI_CHUNK_TOKENS = int(os.environ.get("AI_CHUNK_TOKENS", "1500"))
+AI_MAX_CHUNKS = int(os.environ.get("AI_MAX_CHUNKS", "8"))
+AI_CHUNK_CONCURRENCY = int(os.environ.get("AI_CHUNK_CONCURRENCY", "4"))
+
+# Stages of one analysis run concurrently, each within its own time budget
+ANALYSIS_LINKS_TIMEOUT = float(os.environ.get("ANALYSIS_LINKS_TIMEOUT", "30"))
+ANALYSIS_HTML_TIMEOUT = float(os.environ.get("ANALYSIS_HTML_TIMEOUT", "10"))
+ANALYSIS_AI_TIMEOUT = float(os.environ.get("ANALYSIS_AI_TIMEOUT", "90"))
+ANALYSIS_ASSETS_TIMEOUT = float(os.environ.get("ANALYSIS_ASSETS_TIMEOUT", "30"))
+
+# Parsing and HTML checks run here so they never block the event loop;
+# ANALYSIS_EXECUTOR=process spreads them over several cores
+cpu_pool = CPUPool(
+    mode=os.environ.get("ANALYSIS_EXECUTOR", "thread"),
+    workers=int(os.environ.get("ANALYSIS_CPU_WORKERS", "0")) or None,
+)
+
+# Previous analysis of each draft, so an edited resubmission only redoes what changed
+drafts = DraftStore(
+    ttl=float(os.environ.get("DRAFT_TTL", "3600")),
+    max_entries=int(os.environ.get("DRAFT_MAX_ENTRIES", "200")),
+)
+
+# Uploads are read as they arrive; base64 images and attachments don't count towards the HTML limit
+UPLOAD_MAX_BYTES = int(os.environ.get("UPLOAD_MAX_BYTES", str(50 * 1024 * 1024)))
+UPLOAD_MAX_HTML_BYTES = int(os.environ.get("UPLOAD_MAX_HTML_BYTES", str(5 * 1024 * 1024)))
+
+# Admission control for the interactive endpoints (batches go through their own queue):
+# overloaded or over-eager clients get a fast 429/503 with Retry-After instead of piling up
+admission = AdmissionController(
+    max_in_flight=int(os.environ.get("ADMISSION_MAX_IN_FLIGHT", "16")),
+    max_queue=int(os.environ.get("ADMISSION_MAX_QUEUE", "64")),
+    queue_timeout=float(os.environ.get("ADMISSION_QUEUE_TIMEOUT", "10")),
+    rate=float(os.environ.get("ADMISSION_RATE", "0")),
+    burst=float(os.environ.get("ADMISSION_BURST", "20")),
+)
+REJECTION_MESSAGES = {
+    "rate_limited": "Trop d'analyses demandées, réessayez dans quelques secondes",
+    "queue_full": "Serveur surchargé, réessayez dans quelques secondes",
+    "queue_timeout": "Serveur surchargé (attente trop longue), réessayez dans quelques secondes",
+}
+
+# Instrumentation exposed at /api/metrics; recording is a no-op when disabled
+metrics = MetricsRegistry(enabled=os.environ.get("METRICS_ENABLED", "1").lower() not in ("0", "false", "no"))
+analysis_seconds = metrics.histogram(
+    "newsletter_analysis_seconds", "Duration of a whole newsletter analysis", ["endpoint"])
+stage_seconds = metrics.histogram(
+    "newsletter_stage_seconds", "Duration of each analysis stage (parse, links, assets, html_issues, ai_analysis, serialization)", ["stage"])
+stage_outcomes = metrics.counter(
+    "newsletter_stage_outcomes_total", "Analysis stages by outcome (ok, timeout, error, reused, skipped)", ["stage", "status"])
+link_probe_seconds = metrics.histogram(
+    "link_probe_seconds", "Duration of one outbound link check request")
+link_probes = metrics.counter(
+    "link_probes_total", "Outbound link checks by outcome (http_2xx..http_5xx, throttled, timeout, dns, tls, connect, ...)", ["outcome"])
+asset_probes = metrics.counter(
+    "asset_probes_total", "Outbound image and stylesheet probes by outcome (http_2xx..http_5xx, timeout, dns, ...)", ["outcome"])
+link_metadata_failures = metrics.counter(
+    "link_metadata_failures_total", "Linked pages whose <head> could not be read, by failure class", ["reason"])
+ai_request_seconds = metrics.histogram(
+    "ai_request_seconds", "Duration of one call to the AI model")
+ai_requests = metrics.counter(
+    "ai_requests_total", "Calls to the AI model by outcome (ok, timeout, auth, rate_limit, api_error, connect, invalid_json, ...)", ["outcome"])
+admission_rejections = metrics.counter(
+    "admission_rejections_total", "Analyses turned away by admission control (rate_limited, queue_full, queue_timeout)", ["reason"])
+analyses_in_flight = 0
+
+# Batch analyses: one in-process queue drained by BATCH_WORKERS workers
+BATCH_WORKERS = int(os.environ.get("BATCH_WORKERS", "4"))
+BATCH_MAX_JOBS = int(os.environ.get("BATCH_MAX_JOBS", "100"))
+BATCH_MAX_NEWSLETTERS = int(os.environ.get("BATCH_MAX_NEWSLETTERS", "5000"))
+
+async def analyze_batch_item(job: BatchJob, index: int, request: "NewsletterAnalysisRequest") -> "AnalysisResult":
+    """Analyze one newsletter of a batch; link results are shared across the whole batch"""
+    # The caller has the HTML already, don't keep thousands of copies in memory
+    lean_request = request.model_copy(update={"response_mode": "lean"})
+    async with track_analysis("batch"):
+        return await run_analysis(lean_request, job.context["link_cache"])
+
+def finish_batch_job(job: BatchJob):
+    """Release the batch link cache, keeping only its counters"""
+    job.context["link_stats"] = job.context.pop("link_cache").stats()
+
+job_queue = JobQueue(analyze_batch_item, workers=BATCH_WORKERS, max_jobs=BATCH_MAX_JOBS, on_finish=finish_batch_job)
+
+# Pooled HTTP session shared by every analysis, opened and closed with the app
+link_session: Optional[aiohttp.ClientSession] = None
+
+# Heavy modules (OpenAI client, BeautifulSoup) are imported on first use. With
+# STARTUP_WARMUP, a background task loads them once the app is up, and
+# /api/ready answers 503 until it is done; without, the worker is ready sooner
+# and stays smaller until a request needs them.
+STARTUP_WARMUP = os.environ.get("STARTUP_WARMUP", "1").lower() not in ("0", "false", "no")
+PROCESS_STARTED = time.perf_counter()
+readiness: Dict[str, Any] = {"started": False, "warm": False, "startup_ms": None, "warm_up_ms": None}
+LAZY_MODULES = ("openai", "bs4")
+
+def warm_up():
+    """Load what the first analysis would otherwise wait for: parser backend, rules, BeautifulSoup, OpenAI client"""
+    parse_newsletter("<p>warm-up</p>")
+    extract_page_metadata("<title>warm-up</title>")
+    ai_clients.warm_up()
+
+async def run_warm_up():
+    started = time.perf_counter()
+    try:
+        await asyncio.to_thread(warm_up)
+    finally:
+        # A failed warm-up only means the first requests load the modules themselves
+        readiness["warm"] = True
+        readiness["warm_up_ms"] = round((time.perf_counter() - started) * 1000, 1)
+
+async def expire_link_store():
+    """Periodically drop expired rows from the link store"""
+    while True:
+        await asyncio.sleep(LINK_STORE_EXPIRE_INTERVAL)
+        try:
+            await asyncio.to_thread(link_store.expire)
+        except sqlite3.Error:
+            pass  # another worker holds the lock; try again next round
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global link_session
+    link_session = create_link_session()
+    job_queue.start()
+    await cpu_pool.start()
+    expiry_task = asyncio.ensure_future(expire_link_store()) if link_store is not None else None
+    warm_up_task = asyncio.ensure_future(run_warm_up()) if STARTUP_WARMUP else None
+    readiness["warm"] = not STARTUP_WARMUP
+    readiness["started"] = True
+    readiness["startup_ms"] = round((time.perf_counter() - PROCESS_STARTED) * 1000, 1)
+    try:
+        yield
+    finally:
+        readiness["started"] = False
+        if warm_up_task is not None:
+            warm_up_task.cancel()
+        if expiry_task is not None:
+            expiry_task.cancel()
+            link_store.close()
+        await job_queue.stop()
+        cpu_pool.shutdown()
+        await ai_clients.close()
+        session, link_session = link_session, None
+        await session.close()
+
+app = FastAPI(lifespan=lifespan)
 
 # Configure CORS
 app.add_middleware(
@@ -23,6 +264,8 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+# Complete responses only: the streaming endpoint is sent as is
+app.add_middleware(CompressionMiddleware, minimum_size=int(os.environ.get("RESPONSE_COMPRESSION_MIN_SIZE", "1024")))
 
 # Pydantic models
 class NewsletterAnalysisRequest(BaseModel):
@@ -31,12 +274,23 @@ class NewsletterAnalysisRequest(BaseModel):
     subject: Optional[str] = None
     preheader: Optional[str] = None
     sender: Optional[str] = None
+    # "lean" leaves the HTML out of responsive_preview; the client already has it
+    response_mode: Literal["full", "lean"] = "full"
+    # Resubmissions with the same draft_id reuse what did not change since the last analysis
+    draft_id: Optional[str] = None
+    # Adds the time spent on each distinct URL to report.timings
+    timing_details: bool = False
 
 class LinkInfo(BaseModel):
     url: str
     text: str
     status_code: Optional[int] = None
     status: str = "pending"
+    # Why the check failed: timeout, dns, tls, connect, connection, redirects, redirect_loop, invalid_url or other
+    error: Optional[str] = None
+    # Where the link lands after redirects, and each hop with its status and duration
+    final_url: Optional[str] = None
+    redirect_chain: List[Dict[str, Any]] = []
     favicon: Optional[str] = None
     title: Optional[str] = None
     preview_image: Optional[str] = None
@@ -50,121 +304,471 @@ class AnalysisResult(BaseModel):
     inbox_preview: Dict[str, Any] = {}
     report: Dict[str, Any] = {}
 
+class BatchAnalysisRequest(BaseModel):
+    newsletters: List[NewsletterAnalysisRequest]
+
+class BatchJobStatus(BaseModel):
+    job_id: str
+    status: str
+    total: int
+    completed: int = 0
+    failed: int = 0
+    progress: float = 0.0
+    elapsed_seconds: float = 0.0
+    items_per_second: float = 0.0
+    created_at: float
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    links: Dict[str, Any] = {}
+
+class BatchJobResults(BaseModel):
+    job_id: str
+    status: str
+    results: List[Optional[AnalysisResult]] = []
+    errors: Dict[int, str] = {}
+
 # Utility functions
-def extract_links_from_html(html_content: str) -> List[LinkInfo]:
+def extract_links_from_html(html_content: Union[str, ParsedNewsletter]) -> List[LinkInfo]:
     """Extract all links from HTML content"""
-    soup = BeautifulSoup(html_content, 'html.parser')
-    links = []
-    
-    for link in soup.find_all('a', href=True):
-        href = link['href']
-        text = link.get_text(strip=True)
-        links.append(LinkInfo(url=href, text=text))
-    
-    return links
+    document = ensure_parsed(html_content)
+    return [LinkInfo(url=href, text=text) for href, text in document.links]
+
+class LinkThrottled(Exception):
+    """The server answered 429/503; retry_after is its Retry-After in seconds, if any"""
+    def __init__(self, status_code: int, retry_after: Optional[float]):
+        super().__init__(status_code, retry_after)
+        self.status_code = status_code
+        self.retry_after = retry_after
 
-async def verify_link_status(session: aiohttp.ClientSession, link: LinkInfo) -> LinkInfo:
-    """Verify the status of a single link"""
+async def read_head_prefix(response: aiohttp.ClientResponse, max_bytes: int) -> bytes:
+    """Read the body until </head> shows up or max_bytes have been read"""
+    prefix = bytearray()
+    while len(prefix) < max_bytes:
+        chunk = await response.content.read(min(LINK_CHECK_CHUNK_SIZE, max_bytes - len(prefix)))
+        if not chunk:
+            break
+        # Look back a few bytes in case the tag straddles two chunks
+        search_from = max(0, len(prefix) - len(b"</head>"))
+        prefix += chunk
+        if b"</head" in prefix[search_from:].lower():
+            break
+    return bytes(prefix)
+
+def classify_link_error(error: BaseException) -> str:
+    """Failure class of a link check, for LinkInfo.error and the metrics"""
+    if isinstance(error, asyncio.TimeoutError):
+        return "timeout"
+    if isinstance(error, (aiohttp.ClientSSLError, ssl.SSLError)):
+        return "tls"
+    if isinstance(error, aiohttp.ClientConnectorError):
+        return "dns" if isinstance(error.os_error, socket.gaierror) else "connect"
+    if isinstance(error, aiohttp.TooManyRedirects):
+        return "redirects"
+    if isinstance(error, (aiohttp.ServerDisconnectedError, aiohttp.ClientPayloadError, aiohttp.ClientOSError)):
+        return "connection"
+    if isinstance(error, (aiohttp.InvalidURL, ValueError)):
+        return "invalid_url"
+    return "other"
+
+async def fetch_hop(session: aiohttp.ClientSession, url: str, raise_on_throttle: bool = False) -> Dict[str, Any]:
+    """One streamed GET of url, without following redirects: its status, where it redirects and its page metadata"""
+    hop: Dict[str, Any] = {
+        "status_code": None, "error": None, "location": None, "duration_ms": None,
+        "title": None, "preview_image": None, "description": None,
+    }
+    started = time.perf_counter()
     try:
-        async with session.head(link.url, timeout=aiohttp.ClientTimeout(total=10)) as response:
-            link.status_code = response.status
-            if response.status == 200:
-                link.status = "success"
-            elif response.status == 404:
-                link.status = "error"
-            else:
-                link.status = "warning"
+        async with session.get(url, allow_redirects=False, timeout=aiohttp.ClientTimeout(total=LINK_CHECK_TIMEOUT)) as response:
+            if raise_on_throttle and response.status in RETRY_STATUSES:
+                link_probes.inc("throttled")
+                raise LinkThrottled(response.status, parse_retry_after(response.headers.get("Retry-After")))
+            link_probes.inc(f"http_{response.status // 100}xx")
+            hop["status_code"] = response.status
+            location = response.headers.get("Location")
+            if response.status in REDIRECT_STATUSES and location:
+                hop["location"] = urljoin(url, location)
+                return hop
             
-            # Try to get favicon and title
+            # Only the <head> is needed; the rest of the page is never downloaded
             try:
-                domain = urlparse(link.url).netloc
-                link.favicon = f"https://www.google.com/s2/favicons?domain={domain}"
-                
-                # Get page title
-                async with session.get(link.url, timeout=aiohttp.ClientTimeout(total=5)) as page_response:
-                    if page_response.status == 200:
-                        content = await page_response.text()
-                        page_soup = BeautifulSoup(content, 'html.parser')
-                        title_tag = page_soup.find('title')
-                        if title_tag:
-                            link.title = title_tag.get_text(strip=True)[:100]
-                        # Try Open Graph preview image
-                        og_img = page_soup.find('meta', property='og:image')
-                        if og_img and og_img.get('content'):
-                            link.preview_image = og_img['content']
-                        else:
-                            twitter_img = page_soup.find('meta', attrs={'name': 'twitter:image'})
-                            if twitter_img and twitter_img.get('content'):
-                                link.preview_image = twitter_img['content']
-
-                        # Try meta description / og:description
-                        description_tag = page_soup.find('meta', property='og:description')
-                        if not description_tag:
-                            description_tag = page_soup.find('meta', attrs={'name': 'description'})
-                        if description_tag and description_tag.get('content'):
-                            link.description = description_tag['content'][:200]
-            except:
-                pass
+                content_type = response.headers.get("Content-Type", "text/html")
+                if response.status == 200 and "html" in content_type.lower():
+                    prefix = await asyncio.wait_for(
+                        read_head_prefix(response, LINK_CHECK_MAX_HEAD_BYTES), LINK_CHECK_PAGE_TIMEOUT
+                    )
+                    content = prefix.decode(response.charset or "utf-8", errors="replace")
+                    hop.update(extract_page_metadata(content))
+            except Exception as e:
+                # The status stands; only the page preview is missing
+                link_metadata_failures.inc(classify_link_error(e))
                 
+    except LinkThrottled:
+        raise
     except Exception as e:
-        link.status = "error"
-        link.status_code = None
+        hop["error"] = classify_link_error(e)
+        link_probes.inc(hop["error"])
+    finally:
+        elapsed = time.perf_counter() - started
+        link_probe_seconds.observe(elapsed)
+        hop["duration_ms"] = round(elapsed * 1000, 1)
     
-    return link
-
-async def verify_all_links(links: List[LinkInfo]) -> List[LinkInfo]:
-    """Verify all links concurrently"""
-    async with aiohttp.ClientSession() as session:
-        tasks = [verify_link_status(session, link) for link in links]
-        return await asyncio.gather(*tasks)
-
-def analyze_html_issues(html_content: str) -> List[str]:
-    """Analyze HTML for common issues"""
-    issues = []
-    soup = BeautifulSoup(html_content, 'html.parser')
+    return hop
+
+async def probe_hop(session: aiohttp.ClientSession, url: str) -> Dict[str, Any]:
+    """fetch_hop within the concurrency limits, backing off politely on 429/503"""
+    for attempt in range(LINK_CHECK_MAX_RETRIES + 1):
+        try:
+            async with host_limiter.slot(url):
+                return await fetch_hop(session, url, raise_on_throttle=attempt < LINK_CHECK_MAX_RETRIES)
+        except LinkThrottled as throttled:
+            delay = throttled.retry_after
+            if delay is None:
+                delay = LINK_CHECK_BACKOFF * 2 ** attempt
+            if delay > LINK_CHECK_MAX_RETRY_AFTER:
+                # Not worth holding the analysis that long, report the throttling as is
+                return {
+                    "status_code": throttled.status_code, "error": None, "location": None, "duration_ms": None,
+                    "title": None, "preview_image": None, "description": None,
+                }
+            host_limiter.back_off(url, delay)
+
+async def resolve_link(session: aiohttp.ClientSession, url: str) -> Dict[str, Any]:
+    """Follow a URL's redirects hop by hop and verify the page it lands on
     
-    # Check for missing alt attributes
-    images = soup.find_all('img')
-    for img in images:
-        if not img.get('alt'):
-            issues.append(f"Image manque l'attribut alt: {img.get('src', 'source inconnue')}")
+    Each hop goes through hop_cache, so the landing page that many tracking links
+    redirect to is fetched (and its metadata read) once. redirect_chain lists the
+    hops with the time this link waited for each; shared hops were fetched by
+    another link or an earlier analysis.
+    """
+    chain: List[Dict[str, Any]] = []
+    seen = set()
+    current = url
+    error = None
+    while True:
+        key = normalize_url(current)
+        if key in seen:
+            error = "redirect_loop"
+            break
+        if len(chain) > LINK_CHECK_MAX_REDIRECTS:
+            error = "redirects"
+            break
+        seen.add(key)
+        fetched = False
+        
+        async def fetch() -> Dict[str, Any]:
+            nonlocal fetched
+            fetched = True
+            return await probe_hop(session, current)
+        
+        started = time.perf_counter()
+        hop = await hop_cache.get_or_fetch(key, fetch)
+        chain.append({
+            "url": current,
+            "status_code": hop["status_code"],
+            "duration_ms": round((time.perf_counter() - started) * 1000, 1),
+            "shared": not fetched,
+        })
+        if hop["location"] is None:
+            break
+        current = hop["location"]
     
-    # Check for inline styles (not responsive)
-    if 'style=' in html_content:
-        issues.append("Styles inline détectés - peuvent causer des problèmes de responsivité")
+    fields = {
+        "status_code": hop["status_code"], "status": "warning", "error": error or hop["error"],
+        "final_url": current if len(chain) > 1 else None,
+        "redirect_chain": chain if len(chain) > 1 else [],
+        "favicon": None, "title": None, "preview_image": None, "description": None,
+    }
+    if fields["error"] is not None:
+        fields["status"] = "error"
+        fields["status_code"] = None
+        return fields
+    if hop["status_code"] == 200:
+        fields["status"] = "success"
+    elif hop["status_code"] == 404:
+        fields["status"] = "error"
+    fields["favicon"] = f"https://www.google.com/s2/favicons?domain={urlparse(current).netloc}"
+    for field in ("title", "preview_image", "description"):
+        fields[field] = hop[field]
+    return fields
+
+# LinkInfo fields that depend only on the URL and can be cached
+LINK_RESULT_FIELDS = (
+    "status_code", "status", "error", "final_url", "redirect_chain", "favicon", "title", "preview_image", "description",
+)
+
+DEFAULT_PORTS = {"http": ":80", "https": ":443"}
+
+def normalize_url(url: str) -> str:
+    """Canonical form of a URL, so each distinct target is verified only once"""
+    url = url.strip()
+    try:
+        parts = urlsplit(url)
+    except ValueError:
+        return url
+    scheme = parts.scheme.lower()
+    if scheme not in DEFAULT_PORTS:
+        return url
     
-    # Check for missing unsubscribe link
-    unsubscribe_found = False
-    for link in soup.find_all('a', href=True):
-        if any(keyword in link.get_text().lower() for keyword in ['unsubscribe', 'désabonnement', 'se désabonner']):
-            unsubscribe_found = True
-            break
+    netloc = parts.netloc
+    if "@" not in netloc:
+        netloc = netloc.lower()
+        if netloc.endswith(DEFAULT_PORTS[scheme]):
+            netloc = netloc[:-len(DEFAULT_PORTS[scheme])]
+    # The fragment is never sent to the server
+    return urlunsplit((scheme, netloc, parts.path or "/", parts.query, ""))
+
+def create_link_session() -> aiohttp.ClientSession:
+    """HTTP session tuned for link checks: pooled keep-alive connections and cached DNS"""
+    connector = aiohttp.TCPConnector(
+        limit=host_limiter.max_concurrency,
+        limit_per_host=host_limiter.per_host,
+        ttl_dns_cache=LINK_CHECK_DNS_TTL,
+        keepalive_timeout=LINK_CHECK_KEEPALIVE,
+    )
+    timeout = aiohttp.ClientTimeout(total=LINK_CHECK_TIMEOUT, sock_connect=LINK_CHECK_CONNECT_TIMEOUT)
+    return aiohttp.ClientSession(connector=connector, timeout=timeout)
+
+async def verify_url_cached(session: aiohttp.ClientSession, url: str, batch_cache: Optional[LinkCache] = None) -> Dict[str, Any]:
+    """Verify a URL through the shared cache, probing it only when needed
     
-    if not unsubscribe_found:
-        issues.append("Lien de désabonnement manquant")
+    batch_cache, when given, pins results for the lifetime of a batch job so a URL
+    shared by many newsletters of the batch is verified once, whatever the TTLs.
+    """
+    if batch_cache is not None:
+        return await batch_cache.get_or_fetch(url, lambda: verify_url_cached(session, url))
     
-    # Check for table-based layout (common in emails)
-    tables = soup.find_all('table')
-    if not tables:
-        issues.append("Aucune table détectée - vérifiez la compatibilité email")
+    async def fetch() -> Dict[str, Any]:
+        fields = await resolve_link(session, url)
+        if link_store is not None:
+            try:
+                await asyncio.to_thread(link_store.put_many, {url: fields})
+            except sqlite3.Error:
+                pass  # the store only saves work; never fail a verification because of it
+        return fields
     
-    return issues
+    return await link_cache.get_or_fetch(url, fetch)
 
-async def analyze_with_ai(html_content: str, api_key: str, subject: str = "", preheader: str = "") -> Dict[str, Any]:
-    """Analyze newsletter content with OpenAI"""
-    if not api_key:
-        return {"error": "Clé API OpenAI manquante"}
+async def load_stored_links(urls: List[str]):
+    """Prime the in-memory cache, in one query, with URLs verified by other workers or before a restart"""
+    if link_store is None:
+        return
+    missing = [url for url in urls if link_cache.get(url) is None]
+    if not missing:
+        return
+    try:
+        stored = await asyncio.to_thread(link_store.get_many, missing)
+    except sqlite3.Error:
+        return
+    now = time.time()
+    for url, (expires_at, fields) in stored.items():
+        link_cache.put(url, fields, ttl=expires_at - now)
+
+async def verify_url_group(session: aiohttp.ClientSession, url: str, links: List[LinkInfo],
+                           batch_cache: Optional[LinkCache] = None,
+                           trace: Optional[List[Dict[str, Any]]] = None) -> List[LinkInfo]:
+    """Verify one URL and copy the result to every link pointing at it
     
-    # Extract text content for analysis
-    soup = BeautifulSoup(html_content, 'html.parser')
-    text_content = soup.get_text()
+    trace, when given, receives the time this URL took (near zero for cache hits).
+    """
+    started = time.perf_counter()
+    fields = await verify_url_cached(session, url, batch_cache)
+    if trace is not None:
+        trace.append({
+            "url": url,
+            "duration_ms": round((time.perf_counter() - started) * 1000, 1),
+            "status": fields.get("status"),
+            "error": fields.get("error"),
+            "redirects": max(len(fields.get("redirect_chain") or []) - 1, 0),
+        })
+    for link in links:
+        for field, value in fields.items():
+            setattr(link, field, value)
+    return links
+
+def cap_links(links: List[LinkInfo]) -> List[LinkInfo]:
+    """Links to the first LINK_CHECK_MAX_PER_NEWSLETTER distinct URLs; links to the others are marked skipped"""
+    groups = group_links_by_url(links)
+    if len(groups) <= LINK_CHECK_MAX_PER_NEWSLETTER:
+        return links
+    kept = []
+    for index, group in enumerate(groups.values()):
+        if index < LINK_CHECK_MAX_PER_NEWSLETTER:
+            kept.extend(group)
+            continue
+        for link in group:
+            link.status = "skipped"
+    return kept
+
+def group_links_by_url(links: List[LinkInfo]) -> Dict[str, List[LinkInfo]]:
+    """Group links by normalized URL, keeping first-seen order"""
+    groups: Dict[str, List[LinkInfo]] = {}
+    for link in links:
+        groups.setdefault(normalize_url(link.url), []).append(link)
+    return groups
+
+@asynccontextmanager
+async def open_link_session() -> AsyncIterator[aiohttp.ClientSession]:
+    """The app's pooled session, or a session for this call outside the app lifespan (scripts, tests)"""
+    if link_session is not None and not link_session.closed:
+        yield link_session
+    else:
+        async with create_link_session() as session:
+            yield session
+
+async def iter_verified_links(links: List[LinkInfo], batch_cache: Optional[LinkCache] = None,
+                              trace: Optional[List[Dict[str, Any]]] = None) -> AsyncIterator[List[LinkInfo]]:
+    """Verify links concurrently, yielding each group of same-URL links as soon as it is done"""
+    groups = group_links_by_url(links)
+    await load_stored_links(list(groups))
+    async with open_link_session() as session:
+        tasks = [
+            asyncio.ensure_future(verify_url_group(session, url, group, batch_cache, trace))
+            for url, group in groups.items()
+        ]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                yield await next_done
+        finally:
+            # The consumer may stop early (client disconnected): don't leave probes running
+            for task in tasks:
+                task.cancel()
+
+async def verify_all_links(links: List[LinkInfo], batch_cache: Optional[LinkCache] = None,
+                           trace: Optional[List[Dict[str, Any]]] = None) -> List[LinkInfo]:
+    """Verify all links concurrently, probing each distinct URL once"""
+    async for _ in iter_verified_links(links, batch_cache, trace):
+        pass
+    return links
+
+async def read_prefix(response: aiohttp.ClientResponse, max_bytes: int) -> bytes:
+    """Read the first max_bytes of the body (fewer if it ends sooner)"""
+    prefix = bytearray()
+    while len(prefix) < max_bytes:
+        chunk = await response.content.read(min(LINK_CHECK_CHUNK_SIZE, max_bytes - len(prefix)))
+        if not chunk:
+            break
+        prefix += chunk
+    return bytes(prefix)
+
+async def probe_asset(session: aiohttp.ClientSession, url: str, kind: str) -> Dict[str, Any]:
+    """Size, content type and, for images, dimensions of an asset, downloading as little of it as possible
     
-    prompt = f"""
+    A ranged GET asks for the first bytes only; the full size comes from
+    Content-Range, from Content-Length when the server ignores the range, or by
+    counting the rest of the body up to ASSET_MAX_BYTES.
+    """
+    fields: Dict[str, Any] = {
+        "status_code": None, "status": "error", "error": None, "content_type": None,
+        "bytes": None, "width": None, "height": None,
+    }
+    started = time.perf_counter()
+    # Sizes as stored on the server, not as compressed for the transfer
+    headers = {"Range": f"bytes=0-{SNIFF_BYTES - 1}", "Accept-Encoding": "identity"}
+    try:
+        async with host_limiter.slot(url):
+            async with session.get(url, headers=headers) as response:
+                asset_probes.inc(f"http_{response.status // 100}xx")
+                fields["status_code"] = response.status
+                if response.status in RETRY_STATUSES:
+                    # Don't retry for an asset, but keep the link checks to the same host polite
+                    delay = parse_retry_after(response.headers.get("Retry-After"))
+                    delay = LINK_CHECK_BACKOFF if delay is None else delay
+                    host_limiter.back_off(url, min(delay, LINK_CHECK_MAX_RETRY_AFTER))
+                    fields["status"] = "warning"
+                    return fields
+                if response.status not in (200, 206):
+                    fields["status"] = "error" if response.status >= 400 else "warning"
+                    return fields
+                fields["status"] = "success"
+                fields["content_type"] = response.content_type
+                prefix = await read_prefix(response, SNIFF_BYTES)
+                if response.status == 206:
+                    fields["bytes"] = content_range_total(response.headers.get("Content-Range"))
+                elif response.content_length is not None:
+                    fields["bytes"] = response.content_length
+                else:
+                    size = len(prefix)
+                    while size < ASSET_MAX_BYTES:
+                        chunk = await response.content.read(LINK_CHECK_CHUNK_SIZE)
+                        if not chunk:
+                            break
+                        size += len(chunk)
+                    fields["bytes"] = min(size, ASSET_MAX_BYTES)
+                if kind == "image":
+                    dimensions = image_dimensions(prefix)
+                    if dimensions is not None:
+                        fields["width"], fields["height"] = dimensions
+    except Exception as e:
+        fields["error"] = classify_link_error(e)
+        asset_probes.inc(fields["error"])
+    finally:
+        link_probe_seconds.observe(time.perf_counter() - started)
+    return fields
+
+def asset_targets(document: ParsedNewsletter) -> Dict[str, str]:
+    """Distinct http(s) images and stylesheets of a newsletter (normalized URL -> kind), up to ASSET_MAX_PER_NEWSLETTER"""
+    targets: Dict[str, str] = {}
+    for kind, url in document.assets:
+        if len(targets) >= ASSET_MAX_PER_NEWSLETTER:
+            break
+        url = url.strip()
+        if url.lower().startswith(("http://", "https://")):
+            targets.setdefault(normalize_url(url), kind)
+    return targets
+
+async def verify_assets(targets: Dict[str, str], results: Dict[str, Dict[str, Any]]):
+    """Probe assets concurrently through the asset cache, filling results (URL -> fields) as they complete"""
+    if not targets:
+        return
+    async with open_link_session() as session:
+        async def probe(url: str, kind: str):
+            fields = await asset_cache.get_or_fetch(url, lambda: probe_asset(session, url, kind))
+            results[url] = {"url": url, "kind": kind, **fields}
+        await asyncio.gather(*(probe(url, kind) for url, kind in targets.items()))
+
+async def run_asset_stage(document: ParsedNewsletter, timeline: StageTimeline) -> List[Dict[str, Any]]:
+    """Weight of each image and stylesheet; those not probed in time (or at all) have no size"""
+    targets = asset_targets(document)
+    results: Dict[str, Dict[str, Any]] = {}
+    if ASSET_CHECKS:
+        await timeline.run("assets", verify_assets(targets, results), ANALYSIS_ASSETS_TIMEOUT)
+    else:
+        timeline.skip("assets")
+    return [
+        results.get(url) or {"url": url, "kind": kind, "status": "pending", "bytes": None}
+        for url, kind in targets.items()
+    ]
+
+def add_asset_report(report: Dict[str, Any], request: NewsletterAnalysisRequest, assets: List[Dict[str, Any]],
+                     html_bytes: Optional[int] = None):
+    """report.assets: HTML and asset weight against the budgets, with the resulting issues
+
+    html_bytes is the size of the HTML as sent when html_content is not (uploads,
+    whose data URI payloads were dropped on the way).
+    """
+    if html_bytes is None:
+        html_bytes = len(request.html_content.encode("utf-8"))
+    section, critical_issues, warnings = asset_report(
+        html_bytes, assets,
+        EMAIL_CLIP_BUDGET, ASSET_TOTAL_BUDGET, ASSET_IMAGE_BUDGET,
+    )
+    report["critical_issues"].extend(critical_issues)
+    report["warnings"].extend(warnings)
+    report["assets"] = section
+
+def ai_prompt(content: str, subject: str, preheader: str, excerpt: bool) -> str:
+    """Prompt for the analysis of the whole text, or of one excerpt of a long newsletter"""
+    scope = (
+        "Ce contenu est un extrait d'une newsletter plus longue : évaluez uniquement cet extrait "
+        "(orthographe, lisibilité, CTA et structure qu'il contient)."
+        if excerpt else ""
+    )
+    return f"""
     Analysez cette newsletter et fournissez une évaluation détaillée en français:
-    
+    {scope}
     Sujet: {subject}
     Préheader: {preheader}
-    Contenu: {text_content[:3000]}...
+    Contenu: {content}
     
     Veuillez analyser et retourner un JSON avec:
     {{
@@ -195,107 +799,583 @@ async def analyze_with_ai(html_content: str, api_key: str, subject: str = "", pr
         }}
     }}
     """
+
+async def analyze_with_ai(html_content: Union[str, ParsedNewsletter], api_key: str, subject: str = "", preheader: str = "") -> Dict[str, Any]:
+    """Analyze newsletter content with OpenAI, chunk by chunk for long newsletters"""
+    if not api_key:
+        return {"error": "Clé API OpenAI manquante"}
+    
+    # The visible text, whole: chunks are analysed concurrently and their results merged
+    text_content = ensure_parsed(html_content).visible_text
+    chunks = split_for_analysis(text_content, AI_CHUNK_TOKENS, AI_MAX_CHUNKS) or [""]
+    excerpt = len(chunks) > 1
+    chunk_slots = asyncio.Semaphore(AI_CHUNK_CONCURRENCY)
+    
+    async def analyze_chunk(chunk: str) -> Dict[str, Any]:
+        prompt = ai_prompt(chunk, subject, preheader, excerpt)
+        
+        async def fetch() -> Dict[str, Any]:
+            started = time.perf_counter()
+            try:
+                async with chunk_slots, ai_clients.slot():
+                    response = await ai_clients.client(api_key).chat.completions.create(
+                        model=AI_MODEL,
+                        messages=[
+                            {"role": "system", "content": "Tu es un expert en marketing par email. Analyse les newsletters et donne des conseils pratiques en français."},
+                            {"role": "user", "content": prompt}
+                        ],
+                        temperature=0.3
+                    )
+                
+                result = json.loads(response.choices[0].message.content)
+                ai_requests.inc("ok")
+                return result
+                
+            except Exception as e:
+                ai_requests.inc(classify_ai_error(e))
+                return {"error": f"Erreur lors de l'analyse IA: {str(e)}"}
+            finally:
+                ai_request_seconds.observe(time.perf_counter() - started)
+        
+        # Each chunk is cached on its own: editing one part of a long draft only re-analyses that part.
+        # Successes are shared by every key; a call in flight only with callers of the same key,
+        # so one key's auth or rate limit error never reaches another
+        model = f"{AI_MODEL}:extrait" if excerpt else AI_MODEL
+        key = ai_cache_key(chunk, subject, preheader, model)
+        return await ai_cache.get_or_fetch(key, fetch, flight_key=f"{key}:{api_key_digest(api_key)}")
+    
+    results = await asyncio.gather(*[analyze_chunk(chunk) for chunk in chunks])
+    if not excerpt:
+        return results[0]
+    return merge_chunk_analyses(results, [max(1, estimate_tokens(chunk)) for chunk in chunks])
+
+# Response sections shared by the analysis endpoints
+def html_sha256(request: NewsletterAnalysisRequest) -> str:
+    return hashlib.sha256(request.html_content.encode("utf-8")).hexdigest()
+
+def build_responsive_preview(request: NewsletterAnalysisRequest, digest: Optional[str] = None) -> Dict[str, Any]:
+    """Responsive preview data; in lean mode the HTML is identified by its hash instead of echoed
+
+    html_bytes is the size of html_content, the HTML html_sha256 hashes: for
+    uploads, after data URI payloads were dropped (report.assets has the size as sent).
+    """
+    preview = {
+        "desktop_width": 600,
+        "mobile_width": 375,
+        "html_sha256": digest or html_sha256(request),
+        "html_bytes": len(request.html_content.encode("utf-8")),
+    }
+    if request.response_mode == "full":
+        preview["html_content"] = request.html_content
+    return preview
+
+def build_inbox_preview(request: NewsletterAnalysisRequest) -> Dict[str, Any]:
+    """Inbox preview data"""
+    return {
+        "gmail": {
+            "subject": request.subject or "Sujet de la newsletter",
+            "preheader": request.preheader or "Texte de prévisualisation...",
+            "sender": request.sender or "sender@example.com"
+        },
+        "apple_mail": {
+            "subject": request.subject or "Sujet de la newsletter", 
+            "preheader": request.preheader or "Texte de prévisualisation...",
+            "sender": request.sender or "sender@example.com"
+        }
+    }
+
+def build_report(links: List[LinkInfo], html_issues: List[str], ai_analysis: Optional[Dict[str, Any]],
+                 timeline: Optional[StageTimeline] = None,
+                 link_trace: Optional[List[Dict[str, Any]]] = None,
+                 html_warnings: Optional[List[str]] = None) -> Dict[str, Any]:
+    """Report summary of links, HTML issues and AI analysis, with the time spent in each stage
+
+    html_issues are reported as critical, html_warnings (warning-level rules) as warnings.
+    """
+    critical_issues = []
+    warnings = []
     
+    # Count link issues
+    broken_links = [link for link in links if link.status == "error"]
+    if broken_links:
+        critical_issues.append(f"{len(broken_links)} lien(s) cassé(s)")
+    skipped_links = [link for link in links if link.status == "skipped"]
+    if skipped_links:
+        warnings.append(
+            f"{len(group_links_by_url(skipped_links))} URL non vérifiée(s) : "
+            f"limite de {LINK_CHECK_MAX_PER_NEWSLETTER} URL par newsletter"
+        )
+    
+    # Add HTML issues
+    critical_issues.extend(html_issues)
+    warnings.extend(html_warnings or [])
+    
+    # AI-based issues
+    if ai_analysis and "error" not in ai_analysis:
+        if ai_analysis.get("orthographe_grammaire", {}).get("score", 10) < 7:
+            warnings.append("Problèmes d'orthographe/grammaire détectés")
+        if ai_analysis.get("lisibilite", {}).get("score", 10) < 6:
+            warnings.append("Lisibilité à améliorer")
+    
+    report = {
+        "critical_issues": critical_issues,
+        "warnings": warnings,
+        "total_links": len(links),
+        "unique_links": len(group_links_by_url(links)),
+        "broken_links": len(broken_links),
+        "skipped_links": len(skipped_links),
+        "analysis_timestamp": datetime.now().isoformat()
+    }
+    if timeline is not None:
+        warnings.extend(timeline.warnings())
+        report["timings"] = timeline.summary()
+        if link_trace is not None:
+            # Slowest URLs first
+            report["timings"]["links_detail"] = sorted(link_trace, key=lambda entry: -entry["duration_ms"])
+    return report
+
+def observe_stages(timeline: StageTimeline):
+    """Feed the duration and outcome of each stage of one analysis to the metrics"""
+    for name, entry in timeline.stages.items():
+        stage_outcomes.inc(name, entry["status"])
+        if entry["status"] not in ("skipped", "reused"):
+            stage_seconds.observe(entry["duration_ms"] / 1000, name)
+
+@asynccontextmanager
+async def track_analysis(endpoint: str) -> AsyncIterator[None]:
+    """Count an analysis as in flight and time it"""
+    global analyses_in_flight
+    analyses_in_flight += 1
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        analyses_in_flight -= 1
+        analysis_seconds.observe(time.perf_counter() - started, endpoint)
+
+# API endpoints
+class DraftAnalysis:
+    """State of one analysis against the previous analysis of the same draft, if any"""
+    
+    def __init__(self, request: NewsletterAnalysisRequest, remember: bool = True):
+        self.request = request
+        self.digest = html_sha256(request)
+        self.key = DraftStore.key(request.draft_id, self.digest)
+        self.remember = remember
+        self.previous: Optional[DraftSnapshot] = drafts.get(self.key) if remember else None
+        self.parse_reused = False
+        self.links_reused = 0
+        self.links_verified = 0
+        self.rule_issues: Dict[str, List[str]] = {}
+        self.rules_rerun: List[str] = [rule.name for rule in HTML_RULES]
+        self.ai_key: Optional[str] = None
+        self.ai_reused = False
+    
+    def reuse_links(self, links: List[LinkInfo]) -> List[LinkInfo]:
+        """Fill in links verified successfully last time; return those still to verify"""
+        results = self.previous.link_results if self.previous else {}
+        to_verify = []
+        for link in links:
+            fields = results.get(normalize_url(link.url))
+            if fields is None:
+                to_verify.append(link)
+                continue
+            for field, value in fields.items():
+                setattr(link, field, value)
+        self.links_reused = len(links) - len(to_verify)
+        self.links_verified = len(group_links_by_url(to_verify))
+        return to_verify
+    
+    def save(self, document: ParsedNewsletter, links: List[LinkInfo], ai_analysis: Optional[Dict[str, Any]]):
+        if not self.remember:
+            return
+        if ai_analysis is None or "error" in ai_analysis:
+            # Keep an earlier good AI analysis of the same text (e.g. resubmitted without API key)
+            if self.previous is not None and self.previous.ai_key == self.ai_key:
+                ai_analysis = self.previous.ai_analysis
+            else:
+                ai_analysis = None
+        drafts.put(self.key, DraftSnapshot(
+            html_sha256=self.digest,
+            document=document.compact(),
+            rule_issues=self.rule_issues,
+            link_results={
+                normalize_url(link.url): link.model_dump(include=set(LINK_RESULT_FIELDS))
+                for link in links if link.status == "success"
+            },
+            ai_key=self.ai_key,
+            ai_analysis=ai_analysis,
+        ))
+    
+    def html_issues_by_severity(self) -> Tuple[List[str], List[str]]:
+        """HTML issues for report.critical_issues and for report.warnings"""
+        return flatten_issues(self.rule_issues, CRITICAL), flatten_issues(self.rule_issues, WARNING)
+    
+    def report(self) -> Dict[str, Any]:
+        """Which parts of the analysis were reused from the previous one"""
+        return {
+            "draft_id": self.request.draft_id,
+            "previous_analysis_at": (
+                datetime.fromtimestamp(self.previous.analyzed_at).isoformat() if self.previous else None
+            ),
+            "parse_reused": self.parse_reused,
+            "links_reused": self.links_reused,
+            "urls_verified": self.links_verified,
+            "html_rules_reused": [rule.name for rule in HTML_RULES if rule.name not in self.rules_rerun],
+            "html_rules_rerun": list(self.rules_rerun),
+            "ai_reused": self.ai_reused,
+        }
+
+async def parse_request(draft: DraftAnalysis, timeline: StageTimeline) -> ParsedNewsletter:
+    """Parse the newsletter in the worker pool; every other stage depends on it"""
+    previous = draft.previous
+    if previous is not None and previous.html_sha256 == draft.digest:
+        # Same HTML as last time: the extracted data can't have changed
+        timeline.reuse("parse")
+        draft.parse_reused = True
+        document = previous.document.compact()
+    else:
+        document = await timeline.run("parse", cpu_pool.run(parse_compact, draft.request.html_content), ANALYSIS_HTML_TIMEOUT)
+        if document is None:
+            entry = timeline.stages["parse"]
+            raise RuntimeError(entry.get("error") or "délai dépassé pour l'analyse du HTML")
+    # Only the extracted data comes back from the worker; reattach our copy of the HTML
+    document.html_content = draft.request.html_content
+    return document
+
+async def run_html_stage(draft: DraftAnalysis, document: ParsedNewsletter, timeline: StageTimeline) -> List[str]:
+    """HTML checks, rerunning only the rules whose inputs changed since the previous analysis"""
+    previous = draft.previous
+    rules = await timeline.run(
+        "html_issues",
+        cpu_pool.run(
+            run_html_rules, document.compact(),
+            previous.document if previous else None, previous.rule_issues if previous else None,
+        ),
+        ANALYSIS_HTML_TIMEOUT,
+    )
+    if rules is None:
+        return []
+    draft.rule_issues, draft.rules_rerun = rules
+    if not draft.rules_rerun:
+        timeline.reuse("html_issues")
+    return flatten_issues(draft.rule_issues)
+
+async def run_ai_stage(draft: DraftAnalysis, document: ParsedNewsletter, timeline: StageTimeline) -> Optional[Dict[str, Any]]:
+    """AI analysis stage, skipped without an API key or when the text did not change"""
+    request = draft.request
+    draft.ai_key = ai_cache_key(document.visible_text, request.subject or "", request.preheader or "", AI_MODEL)
+    if not request.openai_api_key:
+        timeline.skip("ai_analysis")
+        return None
+    previous = draft.previous
+    if previous is not None and previous.ai_analysis is not None and previous.ai_key == draft.ai_key:
+        timeline.reuse("ai_analysis")
+        draft.ai_reused = True
+        return previous.ai_analysis
+    return await timeline.run(
+        "ai_analysis",
+        analyze_with_ai(document, request.openai_api_key, request.subject or "", request.preheader or ""),
+        ANALYSIS_AI_TIMEOUT,
+        default={"error": "Délai dépassé pour l'analyse IA"},
+    )
+
+async def run_analysis(request: NewsletterAnalysisRequest, batch_cache: Optional[LinkCache] = None,
+                       html_bytes: Optional[int] = None) -> AnalysisResult:
+    """Full analysis of one newsletter, shared by the single and batch endpoints
+    
+    Link verification, asset probing, HTML checks and AI analysis run side by
+    side; a stage that fails or runs out of time leaves its default and is
+    reported as a warning.
+    Outside batches, whatever did not change since the previous analysis of the
+    same draft is reused.
+    html_bytes, when given, is the size of the HTML as sent (see add_asset_report).
+    """
+    timeline = StageTimeline()
+    draft = DraftAnalysis(request, remember=batch_cache is None)
+    result = AnalysisResult()
+    
+    # Parse once, every stage below reads from the same document
+    document = await parse_request(draft, timeline)
+    links = extract_links_from_html(document)
+    to_verify = cap_links(draft.reuse_links(links))
+    
+    link_trace = [] if request.timing_details else None
+    
+    # Links are verified in place: on timeout, the unverified ones stay "pending"
+    _, assets, html_issues, ai_analysis = await asyncio.gather(
+        timeline.run("links", verify_all_links(to_verify, batch_cache, link_trace), ANALYSIS_LINKS_TIMEOUT),
+        run_asset_stage(document, timeline),
+        run_html_stage(draft, document, timeline),
+        run_ai_stage(draft, document, timeline),
+    )
+    draft.save(document, links, ai_analysis)
+    result.links = links
+    result.html_issues = html_issues
+    result.ai_analysis = ai_analysis
+    
+    result.responsive_preview = build_responsive_preview(request, draft.digest)
+    result.inbox_preview = build_inbox_preview(request)
+    critical_html, html_warnings = draft.html_issues_by_severity()
+    result.report = build_report(links, critical_html, ai_analysis, timeline, link_trace, html_warnings)
+    add_asset_report(result.report, request, assets, html_bytes)
+    result.report["incremental"] = draft.report()
+    observe_stages(timeline)
+    
+    return result
+
+def admission_client(api_key: Optional[str], http_request: Request) -> str:
+    """Who an analysis is rate-limited as: its API key (hashed), or the client address without one"""
+    if api_key:
+        return "key:" + api_key_digest(api_key)
+    return "address:" + (http_request.client.host if http_request.client else "unknown")
+
+async def admit_analysis(client: str) -> Callable[[], None]:
+    """Admission for one analysis; refused as a 429/503 with Retry-After. Call the result once done"""
     try:
-        client = openai.OpenAI(api_key=api_key)
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
-                {"role": "system", "content": "Tu es un expert en marketing par email. Analyse les newsletters et donne des conseils pratiques en français."},
-                {"role": "user", "content": prompt}
-            ],
-            temperature=0.3
+        return await admission.acquire(client)
+    except Rejected as rejected:
+        admission_rejections.inc(rejected.reason)
+        raise HTTPException(
+            status_code=rejected.status_code,
+            detail=REJECTION_MESSAGES[rejected.reason],
+            headers={"Retry-After": rejected.retry_after_header()},
         )
-        
-        result = json.loads(response.choices[0].message.content)
-        return result
-        
-    except Exception as e:
-        return {"error": f"Erreur lors de l'analyse IA: {str(e)}"}
 
 # API endpoints
 @app.post("/api/analyze-newsletter", response_model=AnalysisResult)
-async def analyze_newsletter(request: NewsletterAnalysisRequest):
+async def analyze_newsletter(request: NewsletterAnalysisRequest, http_request: Request):
     """Main endpoint to analyze newsletter"""
+    release = await admit_analysis(admission_client(request.openai_api_key, http_request))
     try:
-        result = AnalysisResult()
-        
-        # Extract and verify links
-        links = extract_links_from_html(request.html_content)
-        verified_links = await verify_all_links(links)
-        result.links = verified_links
-        
-        # Analyze HTML issues
-        result.html_issues = analyze_html_issues(request.html_content)
-        
-        # AI Analysis (if API key provided)
-        if request.openai_api_key:
-            ai_result = await analyze_with_ai(
-                request.html_content, 
-                request.openai_api_key,
-                request.subject or "",
-                request.preheader or ""
-            )
-            result.ai_analysis = ai_result
-        
-        # Generate responsive preview data
-        result.responsive_preview = {
-            "desktop_width": 600,
-            "mobile_width": 375,
-            "html_content": request.html_content
-        }
-        
-        # Generate inbox preview data
-        result.inbox_preview = {
-            "gmail": {
-                "subject": request.subject or "Sujet de la newsletter",
-                "preheader": request.preheader or "Texte de prévisualisation...",
-                "sender": request.sender or "sender@example.com"
-            },
-            "apple_mail": {
-                "subject": request.subject or "Sujet de la newsletter", 
-                "preheader": request.preheader or "Texte de prévisualisation...",
-                "sender": request.sender or "sender@example.com"
-            }
-        }
-        
-        # Generate report summary
-        critical_issues = []
-        warnings = []
-        
-        # Count link issues
-        broken_links = [link for link in verified_links if link.status == "error"]
-        if broken_links:
-            critical_issues.append(f"{len(broken_links)} lien(s) cassé(s)")
-        
-        # Add HTML issues
-        critical_issues.extend(result.html_issues)
-        
-        # AI-based issues
-        if result.ai_analysis and "error" not in result.ai_analysis:
-            ai_data = result.ai_analysis
-            if ai_data.get("orthographe_grammaire", {}).get("score", 10) < 7:
-                warnings.append("Problèmes d'orthographe/grammaire détectés")
-            if ai_data.get("lisibilite", {}).get("score", 10) < 6:
-                warnings.append("Lisibilité à améliorer")
-        
-        result.report = {
-            "critical_issues": critical_issues,
-            "warnings": warnings,
-            "total_links": len(verified_links),
-            "broken_links": len(broken_links),
-            "analysis_timestamp": datetime.now().isoformat()
-        }
-        
-        return result
+        async with track_analysis("analyze"):
+            result = await run_analysis(request)
+            started = time.perf_counter()
+            response = ModelResponse(result)
+            stage_seconds.observe(time.perf_counter() - started, "serialization")
+            return response
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Erreur lors de l'analyse: {str(e)}")
+    finally:
+        release()
+
+@app.post("/api/analyze-newsletter/upload", response_model=AnalysisResult)
+async def analyze_newsletter_upload(http_request: Request, subject: Optional[str] = None, preheader: Optional[str] = None,
+                                    sender: Optional[str] = None, draft_id: Optional[str] = None,
+                                    timing_details: bool = False):
+    """Analyze an uploaded file: raw HTML, an .eml/MIME message, or multipart/form-data with a "file" part
+
+    The body is read as it arrives. Base64 data URIs and attachments are counted
+    and dropped on the way, so memory follows the size of the markup rather than
+    of the file. Options come from the query string or form fields (the API key
+    from the X-OpenAI-Api-Key header or form field); subject and sender default
+    to the message headers. The response is always lean, with report.upload.
+    The admission slot is taken before the body is read.
+    """
+    content_length = http_request.headers.get("content-length", "")
+    if content_length.isdigit() and int(content_length) > UPLOAD_MAX_BYTES:
+        raise HTTPException(status_code=413, detail=f"Fichier trop volumineux (maximum {UPLOAD_MAX_BYTES // (1024 * 1024)} Mo)")
+    # Rate-limited on the header's API key: form fields are only known once the body is read
+    release = await admit_analysis(admission_client(http_request.headers.get("x-openai-api-key"), http_request))
+    try:
+        try:
+            reader = UploadReader(http_request.headers.get("content-type", ""), UPLOAD_MAX_BYTES, UPLOAD_MAX_HTML_BYTES)
+            async for chunk in http_request.stream():
+                reader.feed(chunk)
+            upload = reader.finish()
+        except UploadTooLarge as e:
+            raise HTTPException(status_code=413, detail=str(e))
+        except UploadError as e:
+            raise HTTPException(status_code=400, detail=str(e))
         
+        fields = upload.fields
+        request = NewsletterAnalysisRequest(
+            html_content=upload.html,
+            openai_api_key=fields.get("openai_api_key") or http_request.headers.get("x-openai-api-key"),
+            subject=fields.get("subject") or subject or upload.subject,
+            preheader=fields.get("preheader") or preheader,
+            sender=fields.get("sender") or sender or upload.sender,
+            response_mode="lean",
+            draft_id=fields.get("draft_id") or draft_id,
+            timing_details=timing_details or fields.get("timing_details", "").lower() in ("1", "true"),
+        )
+        try:
+            async with track_analysis("upload"):
+                result = await run_analysis(request, html_bytes=upload.original_html_bytes())
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Erreur lors de l'analyse: {str(e)}")
+        result.report["upload"] = upload.summary()
+        return ModelResponse(result)
+    finally:
+        release()
+
+def encode_stream_event(event: str, data: Dict[str, Any], sse: bool) -> str:
+    """One event of the progressive analysis, as an SSE message or an NDJSON line"""
+    if sse:
+        return f"event: {event}\ndata: {dumps(data).decode()}\n\n"
+    return dumps({"event": event, **data}).decode() + "\n"
+
+@app.post("/api/analyze-newsletter/stream")
+async def analyze_newsletter_stream(request: NewsletterAnalysisRequest, http_request: Request):
+    """Progressive variant of /api/analyze-newsletter
+
+    Events, in order: "result" (AnalysisResult with HTML issues, previews and
+    pending links), one "link" per verified link with its index, then
+    "ai_analysis" and the final "report". NDJSON by default, Server-Sent Events
+    when the client accepts text/event-stream.
+    """
+    sse = "text/event-stream" in http_request.headers.get("accept", "")
+    release = await admit_analysis(admission_client(request.openai_api_key, http_request))
+    timeline = StageTimeline()
+    draft = DraftAnalysis(request)
+    try:
+        document = await parse_request(draft, timeline)
+        links = extract_links_from_html(document)
+        to_verify = cap_links(draft.reuse_links(links))
+        html_issues = await run_html_stage(draft, document, timeline)
+        critical_html, html_warnings = draft.html_issues_by_severity()
+        result = AnalysisResult(
+            links=links,
+            html_issues=html_issues,
+            responsive_preview=build_responsive_preview(request, draft.digest),
+            inbox_preview=build_inbox_preview(request),
+            report=build_report(links, critical_html, None, html_warnings=html_warnings),
+        )
     except Exception as e:
+        release()
         raise HTTPException(status_code=500, detail=f"Erreur lors de l'analyse: {str(e)}")
+    
+    async def events() -> AsyncIterator[str]:
+        async with track_analysis("stream"):
+            # The model works while the links are being streamed
+            ai_task = asyncio.ensure_future(run_ai_stage(draft, document, timeline))
+            asset_task = asyncio.ensure_future(run_asset_stage(document, timeline))
+            link_trace = [] if request.timing_details else None
+            try:
+                yield encode_stream_event("result", {"result": result.model_dump(mode="json")}, sse)
+                
+                positions = {id(link): index for index, link in enumerate(links)}
+                verified = iter_verified_links(to_verify, trace=link_trace)
+                async for group in timeline.iterate("links", verified, ANALYSIS_LINKS_TIMEOUT):
+                    for link in group:
+                        yield encode_stream_event("link", {"index": positions[id(link)], "link": link.model_dump(mode="json")}, sse)
+                
+                result.ai_analysis = await ai_task
+                if result.ai_analysis is not None:
+                    yield encode_stream_event("ai_analysis", {"ai_analysis": result.ai_analysis}, sse)
+                
+                draft.save(document, links, result.ai_analysis)
+                assets = await asset_task
+                result.report = build_report(links, critical_html, result.ai_analysis, timeline, link_trace, html_warnings)
+                add_asset_report(result.report, request, assets)
+                result.report["incremental"] = draft.report()
+                observe_stages(timeline)
+                yield encode_stream_event("report", {"report": result.report}, sse)
+            except Exception as e:
+                yield encode_stream_event("error", {"detail": f"Erreur lors de l'analyse: {str(e)}"}, sse)
+            finally:
+                # The client may have gone away: don't keep the AI call and asset probes running for nobody
+                ai_task.cancel()
+                asset_task.cancel()
+                release()
+    
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream" if sse else "application/x-ndjson",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        # Also frees the slot if the client left before the first event (release is idempotent)
+        background=BackgroundTask(release),
+    )
+
+def batch_job_status(job: BatchJob) -> BatchJobStatus:
+    """Job progress plus how much link verification the batch shared"""
+    status = BatchJobStatus(**job.progress())
+    batch_cache = job.context.get("link_cache")
+    stats = batch_cache.stats() if batch_cache is not None else job.context.get("link_stats", {})
+    status.links = {
+        "lookups": stats.get("hits", 0) + stats.get("misses", 0) + stats.get("coalesced", 0),
+        "unique_urls": stats.get("misses", 0),
+        "shared": stats.get("hits", 0) + stats.get("coalesced", 0),
+    }
+    return status
+
+@app.post("/api/batch-analyze", response_model=BatchJobStatus, status_code=202)
+async def submit_batch_analysis(request: BatchAnalysisRequest):
+    """Queue a batch of newsletters and return the job to poll"""
+    if len(request.newsletters) > BATCH_MAX_NEWSLETTERS:
+        raise HTTPException(status_code=413, detail=f"Trop de newsletters dans le lot (maximum {BATCH_MAX_NEWSLETTERS})")
+    
+    # Unbounded and without expiry: it only lives as long as the job
+    batch_cache = LinkCache(ttl=float("inf"), error_ttl=float("inf"), max_entries=10 ** 9)
+    job = job_queue.submit(request.newsletters, context={"link_cache": batch_cache})
+    return batch_job_status(job)
+
+@app.get("/api/batch-analyze/{job_id}", response_model=BatchJobStatus)
+async def get_batch_analysis(job_id: str):
+    """Progress and throughput of a batch job"""
+    job = job_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Lot introuvable")
+    return batch_job_status(job)
+
+@app.get("/api/batch-analyze/{job_id}/results", response_model=BatchJobResults)
+async def get_batch_analysis_results(job_id: str):
+    """Results of a batch job, in submission order (null for items not analysed yet)"""
+    job = job_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Lot introuvable")
+    return ModelResponse(BatchJobResults(job_id=job.id, status=job.status, results=job.results, errors=job.errors))
 
 @app.get("/api/health")
 async def health_check():
-    """Health check endpoint"""
-    return {"status": "ok", "message": "Newsletter analyzer API is running"}
+    """Health check endpoint, with the admission controller's state"""
+    return {"status": "ok", "message": "Newsletter analyzer API is running", "admission": admission.stats()}
+
+@app.get("/api/ready")
+async def readiness_check():
+    """Readiness for traffic: 503 until the app has started and, with STARTUP_WARMUP, warmed up"""
+    ready = readiness["started"] and readiness["warm"]
+    return JSONResponse(status_code=200 if ready else 503, content={
+        "status": "ready" if ready else "starting",
+        **readiness,
+        "loaded_modules": {name: name in sys.modules for name in LAZY_MODULES},
+    })
+
+@app.get("/api/link-cache/stats")
+async def link_cache_stats():
+    """Link verification cache counters (hops: single requests of redirect chains; assets: image and stylesheet probes), to size LINK_CACHE_MAX_ENTRIES and TTLs"""
+    stats = link_cache.stats()
+    stats["hops"] = hop_cache.stats()
+    stats["assets"] = asset_cache.stats()
+    if link_store is not None:
+        stats["store"] = await asyncio.to_thread(link_store.stats)
+    return stats
+
+# Gauges read the components' own counters when /api/metrics is scraped
+metrics.gauge("newsletter_analyses_in_flight", "Analyses currently running", lambda: analyses_in_flight)
+metrics.gauge("admission_in_flight", "Analyses admitted and running", lambda: admission.in_flight)
+metrics.gauge("admission_waiting", "Analyses waiting for an admission slot", lambda: admission.waiting)
+metrics.gauge("link_checks_in_flight", "Outbound link checks holding a slot", lambda: host_limiter.in_flight)
+metrics.gauge("link_checks_waiting", "Outbound link checks waiting for a global or per-host slot", lambda: host_limiter.waiting)
+metrics.gauge("ai_requests_in_flight", "AI calls holding a slot", lambda: ai_clients.in_flight)
+metrics.gauge("ai_requests_waiting", "AI calls waiting for a slot", lambda: ai_clients.waiting)
+metrics.gauge("cpu_pool_tasks_in_flight", "Parsing and HTML checks running in the worker pool", lambda: cpu_pool.in_flight)
+metrics.gauge("batch_items_queued", "Batch newsletters waiting for a worker", lambda: job_queue.stats()["queued_items"])
+metrics.gauge("result_cache_entries", "Entries held by the in-memory result caches", lambda: {
+    ("links",): link_cache.stats()["size"], ("hops",): hop_cache.stats()["size"], ("assets",): asset_cache.stats()["size"], ("ai",): ai_cache.stats()["size"],
+    ("drafts",): drafts.stats()["size"],
+}, labels=["cache"])
+metrics.gauge("result_cache_hit_rate", "Hit rate (hits and coalesced lookups) of the in-memory result caches", lambda: {
+    ("links",): link_cache.stats()["hit_rate"], ("hops",): hop_cache.stats()["hit_rate"], ("assets",): asset_cache.stats()["hit_rate"],
+    ("ai",): ai_cache.stats()["hit_rate"],
+}, labels=["cache"])
+
+@app.get("/api/metrics", response_class=PlainTextResponse)
+async def metrics_endpoint():
+    """Counters, histograms and gauges in the Prometheus text format"""
+    if not metrics.enabled:
+        raise HTTPException(status_code=404, detail="Métriques désactivées")
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
 
 if __name__ == "__main__":
     import uvicorn
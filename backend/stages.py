@@ -0,0 +1,87 @@
+import asyncio
+import time
+from typing import Any, AsyncIterator, Awaitable, Dict, Optional
+
+# How each stage is named in the report warnings
+STAGE_LABELS = {
+    "parse": "Analyse du HTML",
+    "links": "Vérification des liens",
+    "assets": "Vérification des images et feuilles de style",
+    "html_issues": "Analyse des problèmes HTML",
+    "ai_analysis": "Analyse IA",
+}
+
+
+class StageTimeline:
+    """Duration and outcome of each stage of one analysis
+
+    A stage that times out or fails is recorded and replaced by a default value,
+    so the other stages still make it into the result.
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.stages: Dict[str, Dict[str, Any]] = {}
+
+    def _record(self, name: str, started: float, status: str, error: Optional[str] = None):
+        entry = {"status": status, "duration_ms": round((time.perf_counter() - started) * 1000, 1)}
+        if error:
+            entry["error"] = error
+        self.stages[name] = entry
+
+    async def run(self, name: str, awaitable: Awaitable[Any], timeout: Optional[float], default: Any = None) -> Any:
+        """Await one stage within its timeout; return default if it times out or fails"""
+        started = time.perf_counter()
+        try:
+            value = await asyncio.wait_for(awaitable, timeout)
+        except asyncio.TimeoutError:
+            self._record(name, started, "timeout")
+            return default
+        except Exception as e:
+            self._record(name, started, "error", str(e))
+            return default
+        self._record(name, started, "ok")
+        return value
+
+    async def iterate(self, name: str, iterator: AsyncIterator[Any], timeout: Optional[float]) -> AsyncIterator[Any]:
+        """Relay a streaming stage until it ends, fails or runs out of time"""
+        started = time.perf_counter()
+        deadline = None if timeout is None else started + timeout
+        try:
+            while True:
+                remaining = None if deadline is None else max(0.0, deadline - time.perf_counter())
+                try:
+                    item = await asyncio.wait_for(iterator.__anext__(), remaining)
+                except StopAsyncIteration:
+                    break
+                except asyncio.TimeoutError:
+                    self._record(name, started, "timeout")
+                    return
+                except Exception as e:
+                    self._record(name, started, "error", str(e))
+                    return
+                yield item
+            self._record(name, started, "ok")
+        finally:
+            await iterator.aclose()
+
+    def skip(self, name: str):
+        self.stages[name] = {"status": "skipped", "duration_ms": 0.0}
+
+    def reuse(self, name: str):
+        """The stage's result was taken from a previous analysis"""
+        self.stages[name] = {"status": "reused", "duration_ms": 0.0}
+
+    def warnings(self):
+        """Report warnings for the stages that did not complete"""
+        reasons = {"timeout": "délai dépassé", "error": "erreur"}
+        return [
+            f"{STAGE_LABELS.get(name, name)} incomplète ({reasons[entry['status']]})"
+            for name, entry in self.stages.items() if entry["status"] in reasons
+        ]
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "total_ms": round((time.perf_counter() - self.started) * 1000, 1),
+            "stages": dict(self.stages),
+        }
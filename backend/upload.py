@@ -0,0 +1,523 @@
+import binascii
+import codecs
+import re
+from dataclasses import asdict, dataclass, field
+from email.message import EmailMessage
+from email.parser import BytesHeaderParser
+from email.policy import default as default_policy
+from typing import Any, Callable, Dict, List, Optional
+
+# data:image/png;base64, (parameters such as ;name=logo.png allowed before ;base64)
+DATA_URI_PREFIX = re.compile(r"data:[\w.+-]*/?[\w.+-]*(?:;[\w.+-]+(?:=[\w.+%-]+)?)*;base64,", re.IGNORECASE)
+BASE64_RUN = re.compile(r"[A-Za-z0-9+/=]*")
+# Longest prefix kept back when a chunk ends in what may be the start of a data URI
+MAX_PREFIX = 256
+MAX_HEADER_BYTES = 256 * 1024
+MAX_FIELD_BYTES = 64 * 1024
+
+
+class UploadError(ValueError):
+    """The upload is malformed or has no HTML to analyse"""
+
+
+class UploadTooLarge(UploadError):
+    """A size limit was hit while reading the upload"""
+
+
+@dataclass
+class NewsletterUpload:
+    """Newsletter HTML read from an upload, with base64 data URIs emptied out"""
+    html: str = ""
+    source: str = "html"  # html or eml
+    subject: Optional[str] = None
+    sender: Optional[str] = None
+    fields: Dict[str, str] = field(default_factory=dict)  # multipart form fields
+    upload_bytes: int = 0
+    data_uris: int = 0
+    data_uri_bytes: int = 0  # decoded size of the images that were dropped
+    data_uri_chars: int = 0  # base64 characters removed from the markup
+    skipped_parts: int = 0  # attachments, text/plain alternatives, later HTML parts
+    skipped_bytes: int = 0
+
+    def summary(self) -> Dict[str, Any]:
+        summary = asdict(self)
+        del summary["html"], summary["fields"]
+        summary["scrubbed_html_bytes"] = len(self.html.encode("utf-8"))
+        summary["original_html_bytes"] = self.original_html_bytes()
+        return summary
+
+    def original_html_bytes(self) -> int:
+        """Size of the HTML as sent, data URI payloads included: what Gmail's clipping applies to"""
+        # Base64 is ASCII: one byte per character removed
+        return len(self.html.encode("utf-8")) + self.data_uri_chars
+
+
+class DataURIScrubber:
+    """Removes base64 data URI payloads from HTML text fed in chunks, counting what it drops
+
+    The payload is never held: "data:image/png;base64,iVBOR..." comes out as
+    "data:image/png;base64," whatever the chunk boundaries.
+    """
+
+    def __init__(self, upload: NewsletterUpload):
+        self.upload = upload
+        self.pending = ""
+        self.in_payload = False
+        self.payload_chars = 0
+
+    def feed(self, text: str) -> str:
+        buffer = self.pending + text
+        self.pending = ""
+        output = []
+        position = 0
+        while position < len(buffer):
+            if self.in_payload:
+                end = BASE64_RUN.match(buffer, position).end()
+                self.payload_chars += end - position
+                if end == len(buffer):
+                    break  # the payload goes on in the next chunk
+                self._end_payload()
+                position = end
+                continue
+            match = DATA_URI_PREFIX.search(buffer, position)
+            if match is None:
+                # Keep back a data URI prefix that may be cut by the chunk boundary
+                tail_start = max(position, len(buffer) - MAX_PREFIX)
+                start = buffer.lower().rfind("data:", tail_start)
+                keep = start if start >= 0 else max(position, len(buffer) - 4)
+                output.append(buffer[position:keep])
+                self.pending = buffer[keep:]
+                break
+            output.append(buffer[position:match.end()])
+            self.upload.data_uris += 1
+            self.in_payload = True
+            position = match.end()
+        return "".join(output)
+
+    def _end_payload(self):
+        self.upload.data_uri_chars += self.payload_chars
+        self.upload.data_uri_bytes += self.payload_chars * 3 // 4
+        self.payload_chars = 0
+        self.in_payload = False
+
+    def close(self) -> str:
+        if self.in_payload:
+            self._end_payload()
+        pending, self.pending = self.pending, ""
+        return pending
+
+
+class HTMLSink:
+    """Collects the scrubbed HTML of the first HTML part, up to max_html_bytes"""
+
+    def __init__(self, upload: NewsletterUpload, max_html_bytes: int):
+        self.upload = upload
+        self.max_html_bytes = max_html_bytes
+        self.scrubber = DataURIScrubber(upload)
+        self.parts: List[str] = []
+        self.size = 0
+        self.claimed = False
+
+    def claim(self) -> bool:
+        """Only the first HTML part is the newsletter; later ones are treated as attachments"""
+        if self.claimed:
+            return False
+        self.claimed = True
+        return True
+
+    def write(self, text: str):
+        self._append(self.scrubber.feed(text))
+
+    def _append(self, text: str):
+        if not text:
+            return
+        # Characters, not bytes: a close enough bound that avoids encoding every chunk
+        self.size += len(text)
+        if self.size > self.max_html_bytes:
+            raise UploadTooLarge(
+                f"HTML trop volumineux, même sans les images intégrées (maximum {self.max_html_bytes // 1024} Ko)"
+            )
+        self.parts.append(text)
+
+    def close(self):
+        self._append(self.scrubber.close())
+        self.upload.html = "".join(self.parts)
+        self.parts = []
+
+
+class TextDecoder:
+    """Charset decoding of a byte stream into the HTML sink"""
+
+    def __init__(self, charset: Optional[str], sink: HTMLSink):
+        try:
+            self.decoder = codecs.getincrementaldecoder(charset or "utf-8")(errors="replace")
+        except LookupError:
+            self.decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        self.sink = sink
+
+    def write(self, data: bytes):
+        self.sink.write(self.decoder.decode(data))
+
+    def close(self):
+        self.sink.write(self.decoder.decode(b"", final=True))
+        self.sink.close()
+
+
+class Base64Decoder:
+    """Content-Transfer-Encoding: base64, decoded as it arrives"""
+
+    def __init__(self, target):
+        self.target = target
+        self.remainder = b""
+
+    def write(self, data: bytes):
+        data = self.remainder + data.translate(None, b" \t\r\n")
+        usable = len(data) - len(data) % 4
+        self.remainder = data[usable:]
+        if usable:
+            try:
+                self.target.write(binascii.a2b_base64(data[:usable]))
+            except binascii.Error as e:
+                raise UploadError(f"Encodage base64 invalide: {e}")
+
+    def close(self):
+        self.target.close()
+
+
+class QuotedPrintableDecoder:
+    """Content-Transfer-Encoding: quoted-printable, decoded line by line"""
+
+    def __init__(self, target):
+        self.target = target
+        self.buffer = b""
+
+    def write(self, data: bytes):
+        self.buffer += data
+        cut = self.buffer.rfind(b"\n") + 1
+        if not cut and len(self.buffer) > MAX_FIELD_BYTES:
+            # Over-long line: decode all but an escape sequence cut in half
+            cut = len(self.buffer)
+            while b"=" in self.buffer[cut - 2:cut]:
+                cut -= 1
+        if cut:
+            self.target.write(binascii.a2b_qp(self.buffer[:cut]))
+            self.buffer = self.buffer[cut:]
+
+    def close(self):
+        self.target.write(binascii.a2b_qp(self.buffer))
+        self.target.close()
+
+
+class SkippedPart:
+    """A part that is not the newsletter HTML: only its size is kept"""
+
+    def __init__(self, upload: NewsletterUpload):
+        self.upload = upload
+        upload.skipped_parts += 1
+
+    def write(self, data: bytes):
+        self.upload.skipped_bytes += len(data)
+
+    def close(self):
+        pass
+
+
+class FieldPart:
+    """A small multipart form field, such as subject or draft_id"""
+
+    def __init__(self, upload: NewsletterUpload, name: str):
+        self.upload = upload
+        self.name = name
+        self.data = b""
+
+    def write(self, data: bytes):
+        self.data += data
+        if len(self.data) > MAX_FIELD_BYTES:
+            raise UploadTooLarge(f"Champ de formulaire trop long: {self.name}")
+
+    def close(self):
+        self.upload.fields[self.name] = self.data.decode("utf-8", errors="replace")
+
+
+def parse_headers(raw: bytes) -> EmailMessage:
+    return BytesHeaderParser(policy=default_policy).parsebytes(raw)
+
+
+def html_part(headers: EmailMessage, sink: HTMLSink):
+    """Decoder chain from a part's transfer encoding and charset to the HTML sink"""
+    target = TextDecoder(headers.get_content_charset(), sink)
+    encoding = str(headers.get("Content-Transfer-Encoding", "")).strip().lower()
+    if encoding == "base64":
+        return Base64Decoder(target)
+    if encoding == "quoted-printable":
+        return QuotedPrintableDecoder(target)
+    return target
+
+
+def entity_handler(headers: EmailMessage, upload: NewsletterUpload, sink: HTMLSink):
+    """Handler for the body of a MIME entity (a whole message or one part of it)"""
+    content_type = headers.get_content_type()
+    if content_type.startswith("multipart/"):
+        boundary = headers.get_param("boundary")
+        if not boundary:
+            raise UploadError("Message multipart sans délimiteur")
+        return MultipartStream(str(boundary), lambda part: entity_handler(part, upload, sink))
+    if content_type == "message/rfc822":
+        return MessageStream(upload, sink)
+    if content_type == "text/html" and headers.get_content_disposition() != "attachment" and sink.claim():
+        return html_part(headers, sink)
+    return SkippedPart(upload)
+
+
+class FormDataStream:
+    """A multipart/form-data request body split into parts by python-multipart's streaming parser
+
+    on_part gets each part's headers and returns the handler its data is written to.
+    """
+
+    def __init__(self, boundary: str, on_part: Callable[[EmailMessage], Any]):
+        # Imported on first use, like the other optional heavy modules (FastAPI imports it lazily too)
+        from multipart.multipart import MultipartParser
+
+        self.on_part = on_part
+        self.part = None
+        self.headers: List[bytes] = []
+        self.header_field = b""
+        self.header_value = b""
+        self.parser = MultipartParser(boundary, {
+            "on_header_field": self._on_header_field,
+            "on_header_value": self._on_header_value,
+            "on_header_end": self._on_header_end,
+            "on_headers_finished": self._on_headers_finished,
+            "on_part_data": self._on_part_data,
+            "on_part_end": self._on_part_end,
+        })
+
+    def _on_header_field(self, data: bytes, start: int, end: int):
+        self.header_field += data[start:end]
+        if len(self.header_field) > MAX_HEADER_BYTES:
+            raise UploadError("En-têtes MIME trop longs")
+
+    def _on_header_value(self, data: bytes, start: int, end: int):
+        self.header_value += data[start:end]
+        if len(self.header_value) > MAX_HEADER_BYTES:
+            raise UploadError("En-têtes MIME trop longs")
+
+    def _on_header_end(self):
+        self.headers.append(self.header_field + b": " + self.header_value + b"\r\n")
+        self.header_field = self.header_value = b""
+
+    def _on_headers_finished(self):
+        self.part = self.on_part(parse_headers(b"".join(self.headers)))
+        self.headers = []
+
+    def _on_part_data(self, data: bytes, start: int, end: int):
+        self.part.write(bytes(data[start:end]))
+
+    def _on_part_end(self):
+        self.part.close()
+        self.part = None
+
+    def write(self, data: bytes):
+        from multipart.exceptions import MultipartParseError
+
+        try:
+            self.parser.write(data)
+        except MultipartParseError as e:
+            raise UploadError(f"Requête multipart invalide: {e}")
+
+    def close(self):
+        self.parser.finalize()
+        if self.part is not None:
+            # Truncated body: keep what arrived of the last part
+            self.part.close()
+            self.part = None
+
+
+class MultipartStream:
+    """Splits a MIME multipart body into parts as it arrives; on_part gets each part's headers and returns its handler
+
+    For the parts of an .eml: unlike form-data, MIME bodies often open with a
+    preamble ("This is a multi-part message in MIME format."), which
+    python-multipart's parser rejects.
+    """
+
+    def __init__(self, boundary: str, on_part: Callable[[EmailMessage], Any]):
+        self.delimiter = b"\r\n--" + boundary.encode("latin-1")
+        self.on_part = on_part
+        # The first delimiter may open the body without a preceding line break
+        self.buffer = b"\r\n"
+        self.state = "preamble"
+        self.part = None
+
+    def write(self, data: bytes):
+        self.buffer += data
+        while True:
+            if self.state == "preamble":
+                index = self.buffer.find(self.delimiter)
+                if index < 0:
+                    self.buffer = self.buffer[-len(self.delimiter):]
+                    return
+                self.buffer = self.buffer[index + len(self.delimiter):]
+                self.state = "delimiter"
+            elif self.state == "delimiter":
+                # "--" after the delimiter closes the multipart; otherwise skip to the end of the line
+                if len(self.buffer) < 2:
+                    return
+                if self.buffer.startswith(b"--"):
+                    self.state = "epilogue"
+                    continue
+                line_end = self.buffer.find(b"\r\n")
+                if line_end < 0:
+                    return
+                self.buffer = self.buffer[line_end + 2:]
+                self.state = "headers"
+            elif self.state == "headers":
+                if self.buffer.startswith(b"\r\n"):
+                    end, raw = 2, b""
+                else:
+                    index = self.buffer.find(b"\r\n\r\n")
+                    if index < 0:
+                        if len(self.buffer) > MAX_HEADER_BYTES:
+                            raise UploadError("En-têtes MIME trop longs")
+                        return
+                    end, raw = index + 4, self.buffer[:index + 2]
+                self.part = self.on_part(parse_headers(raw))
+                self.buffer = self.buffer[end:]
+                self.state = "body"
+            elif self.state == "body":
+                index = self.buffer.find(self.delimiter)
+                if index < 0:
+                    # Hand over everything that cannot be the start of a delimiter
+                    keep = len(self.delimiter) - 1
+                    if len(self.buffer) > keep:
+                        self.part.write(self.buffer[:-keep])
+                        self.buffer = self.buffer[-keep:]
+                    return
+                self.part.write(self.buffer[:index])
+                self.part.close()
+                self.part = None
+                self.buffer = self.buffer[index + len(self.delimiter):]
+                self.state = "delimiter"
+            else:  # epilogue
+                self.buffer = b""
+                return
+
+    def close(self):
+        if self.part is not None:
+            # Truncated message: keep what arrived of the last part
+            self.part.write(self.buffer)
+            self.part.close()
+            self.part = None
+        self.buffer = b""
+
+
+class MessageStream:
+    """An RFC 822 message (.eml): headers, then a body routed by its Content-Type"""
+
+    def __init__(self, upload: NewsletterUpload, sink: HTMLSink):
+        self.upload = upload
+        self.sink = sink
+        self.buffer = b""
+        self.body = None
+
+    def write(self, data: bytes):
+        if self.body is not None:
+            self.body.write(data)
+            return
+        self.buffer += data
+        index = self.buffer.find(b"\r\n\r\n")
+        if index < 0:
+            if len(self.buffer) > MAX_HEADER_BYTES:
+                raise UploadError("En-têtes du message trop longs")
+            return
+        headers = parse_headers(self.buffer[:index + 2])
+        if self.upload.subject is None and headers.get("Subject"):
+            self.upload.subject = str(headers["Subject"])
+        if self.upload.sender is None and headers.get("From"):
+            self.upload.sender = str(headers["From"])
+        rest, self.buffer = self.buffer[index + 4:], b""
+        self.body = entity_handler(headers, self.upload, self.sink)
+        self.body.write(rest)
+
+    def close(self):
+        if self.body is None:
+            raise UploadError("Message sans corps")
+        self.body.close()
+
+
+class CRLFNormalizer:
+    """Rewrites bare LF line endings as CRLF: .eml files saved on Unix often use LF only"""
+
+    def __init__(self, target):
+        self.target = target
+        self.last_cr = False
+
+    def write(self, data: bytes):
+        if not data:
+            return
+        head = b""
+        if self.last_cr and data.startswith(b"\n"):
+            head, data = b"\n", data[1:]
+        self.last_cr = data.endswith(b"\r") if data else self.last_cr
+        self.target.write(head + re.sub(rb"(?<!\r)\n", b"\r\n", data))
+
+    def close(self):
+        self.target.close()
+
+
+def is_eml(content_type: str, filename: Optional[str] = None) -> bool:
+    return content_type == "message/rfc822" or bool(filename and filename.lower().endswith(".eml"))
+
+
+class UploadReader:
+    """Reads a newsletter upload chunk by chunk with bounded memory
+
+    Accepts raw HTML, an .eml/MIME message, or a multipart/form-data body whose
+    "file" part is either of those (other form parts become fields). Only the
+    scrubbed HTML of the newsletter is kept: attachments and base64 data URIs
+    are counted and dropped as they stream past.
+    """
+
+    def __init__(self, content_type: str, max_bytes: int, max_html_bytes: int):
+        self.upload = NewsletterUpload()
+        self.max_bytes = max_bytes
+        self.sink = HTMLSink(self.upload, max_html_bytes)
+        headers = parse_headers(f"Content-Type: {content_type or 'text/html'}\r\n".encode("latin-1", "replace"))
+        kind = headers.get_content_type()
+        if kind == "multipart/form-data":
+            boundary = headers.get_param("boundary")
+            if not boundary:
+                raise UploadError("Requête multipart sans délimiteur")
+            self.target = FormDataStream(str(boundary), self.form_part)
+        elif is_eml(kind) or kind.startswith("multipart/"):
+            self.upload.source = "eml"
+            self.target = CRLFNormalizer(entity_handler(headers, self.upload, self.sink) if kind.startswith("multipart/")
+                                         else MessageStream(self.upload, self.sink))
+        else:
+            self.sink.claim()
+            self.target = TextDecoder(headers.get_content_charset(), self.sink)
+
+    def form_part(self, headers: EmailMessage):
+        name = headers.get_param("name", header="content-disposition")
+        filename = headers.get_filename()
+        if name != "file" and filename is None:
+            return FieldPart(self.upload, str(name or ""))
+        if is_eml(headers.get_content_type(), filename):
+            self.upload.source = "eml"
+            return CRLFNormalizer(MessageStream(self.upload, self.sink))
+        if self.sink.claim():
+            return html_part(headers, self.sink)
+        return SkippedPart(self.upload)
+
+    def feed(self, data: bytes):
+        self.upload.upload_bytes += len(data)
+        if self.upload.upload_bytes > self.max_bytes:
+            raise UploadTooLarge(f"Fichier trop volumineux (maximum {self.max_bytes // (1024 * 1024)} Mo)")
+        self.target.write(data)
+
+    def finish(self) -> NewsletterUpload:
+        self.target.close()
+        if not self.sink.claimed:
+            raise UploadError("Aucune partie HTML trouvée dans le fichier")
+        return self.upload
@@ -0,0 +1,1586 @@
+import asyncio
+import base64
+import glob
+import hashlib
+import os
+import socket
+import sqlite3
+import sys
+import json
+import subprocess
+import tempfile
+import time
+import unittest
+from concurrent.futures.process import BrokenProcessPool
+
+import httpx
+import aiohttp
+from aiohttp import web
+
+# In-process tests for the backend helpers (no running server needed)
+ROOT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(ROOT_DIR, 'backend'))
+
+import compression
+import server
+from admission import AdmissionController, Rejected
+from ai_client import AIClientPool
+from ai_text import chunk_text, estimate_tokens, merge_chunk_analyses, split_for_analysis
+from assets import asset_report, image_dimensions
+from cpu_pool import CPUPool
+from benchmarks.corpus import generate_newsletter
+from benchmarks import run_suite
+from benchmarks.fake_llm import FakeLLM
+from benchmarks.stub_farm import StubFarm
+from host_limiter import HostLimiter, parse_retry_after
+from jobs import JobQueue
+from html_checks import HTML_RULES, analyze_html_issues, flatten_issues, run_html_rules
+from html_document import ParserBackend, available_parser_backends, parse_compact, parse_newsletter
+from json_response import ModelResponse
+from link_cache import LinkCache
+from link_store import LinkStore
+from metrics import MetricsRegistry
+from rules import CRITICAL, WARNING, Rule, RuleEngine
+from stages import StageTimeline
+from upload import UploadError, UploadReader
+
+EMAIL_FIXTURES = sorted(glob.glob(os.path.join(ROOT_DIR, 'fixtures', 'emails', '*.html')))
+
+# A 600x300 PNG header padded to 300 KB
+PNG_IMAGE = b"\x89PNG\r\n\x1a\n" + (13).to_bytes(4, "big") + b"IHDR" + (600).to_bytes(4, "big") + (300).to_bytes(4, "big")
+PNG_IMAGE += b"\0" * (300 * 1024 - len(PNG_IMAGE))
+
+
+class TestParsedNewsletter(unittest.TestCase):
+
+    def test_single_parse_feeds_every_stage(self):
+        """Test that links, issues and text all come from one parsed document"""
+        html_content = """
+        <html><head><style>.x { color: red; }</style></head>
+        <body>
+            <p>Bonjour <script>var tracking = 1;</script>à tous</p>
+            <img src="https://example.com/a.jpg">
+            <img src="https://example.com/b.jpg" alt="B">
+            <a href="https://example.com"> Visit <b>our</b> site </a>
+            <a href="https://example.com/unsub">Se <span>désabonner</span></a>
+        </body></html>
+        """
+        document = parse_newsletter(html_content)
+
+        links = server.extract_links_from_html(document)
+        self.assertEqual([(link.url, link.text) for link in links], [
+            ("https://example.com", "Visitoursite"),
+            ("https://example.com/unsub", "Sedésabonner"),
+        ])
+
+        issues = analyze_html_issues(document)
+        self.assertIn("Image manque l'attribut alt: https://example.com/a.jpg", issues)
+        self.assertNotIn("Lien de désabonnement manquant", issues)
+        self.assertIn("Aucune table détectée - vérifiez la compatibilité email", issues)
+
+        self.assertIn("Bonjour à tous", document.text)
+        self.assertNotIn("tracking", document.text)
+        self.assertNotIn("color", document.text)
+
+    def test_nested_links_keep_document_order(self):
+        """Test that nested anchors are returned outer first, like find_all"""
+        # HTML5 parsers close the outer anchor instead, only html.parser keeps the nesting
+        document = parse_newsletter('<a href="/outer">a<a href="/inner">b</a>c</a><a>no href</a>', 'html.parser')
+        self.assertEqual(document.links, [("/outer", "abc"), ("/inner", "b")])
+
+    def test_raw_html_still_accepted(self):
+        """Test that the stage functions still accept a raw HTML string"""
+        html_content = '<table><tr><td><a href="https://example.com/u">Unsubscribe</a></td></tr></table>'
+        self.assertEqual(len(server.extract_links_from_html(html_content)), 1)
+        self.assertEqual(analyze_html_issues(html_content), [])
+
+
+class TestParserBackendConformance(unittest.TestCase):
+
+    def test_backends_agree_on_email_corpus(self):
+        """Test that every installed parser backend yields the same links and issues"""
+        backends = available_parser_backends()
+        self.assertIn('html.parser', backends)
+        self.assertTrue(EMAIL_FIXTURES, "No email fixtures found")
+
+        for path in EMAIL_FIXTURES:
+            with open(path, encoding='utf-8') as f:
+                html_content = f.read()
+            reference = parse_newsletter(html_content, 'html.parser')
+            expected_links = [link.model_dump() for link in server.extract_links_from_html(reference)]
+            expected_issues = analyze_html_issues(reference)
+            self.assertTrue(expected_links)
+
+            for backend in backends:
+                with self.subTest(fixture=os.path.basename(path), backend=backend):
+                    document = parse_newsletter(html_content, backend)
+                    self.assertEqual(document.parser, backend)
+                    links = [link.model_dump() for link in server.extract_links_from_html(document)]
+                    self.assertEqual(links, expected_links)
+                    self.assertEqual(analyze_html_issues(document), expected_issues)
+                    self.assertEqual(document.visible_text, reference.visible_text)
+
+    def test_unknown_backend_rejected(self):
+        """Test that a misconfigured backend name fails loudly"""
+        with self.assertRaises(ValueError):
+            parse_newsletter("<p></p>", 'html5lib-turbo')
+
+    def test_incomplete_backend_rejected(self):
+        """Test that a backend without parse fails when created, not on the first request"""
+        class Incomplete(ParserBackend):
+            name = 'incomplete'
+
+        with self.assertRaises(TypeError):
+            Incomplete()
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestLinkCache(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+        self.cache = LinkCache(ttl=100, error_ttl=10, max_entries=2, clock=self.clock)
+        self.fetches = []
+
+    def fetcher(self, url, status="success", delay=0):
+        async def fetch():
+            self.fetches.append(url)
+            await asyncio.sleep(delay)
+            return {"status": status, "status_code": 200 if status == "success" else 404}
+        return fetch
+
+    def test_ttl_and_negative_ttl(self):
+        """Test that failures expire sooner than successes"""
+        async def scenario():
+            await self.cache.get_or_fetch("https://ok", self.fetcher("https://ok"))
+            await self.cache.get_or_fetch("https://ko", self.fetcher("https://ko", "error"))
+            self.clock.now = 50
+            await self.cache.get_or_fetch("https://ok", self.fetcher("https://ok"))
+            await self.cache.get_or_fetch("https://ko", self.fetcher("https://ko", "error"))
+            self.clock.now = 200
+            await self.cache.get_or_fetch("https://ok", self.fetcher("https://ok"))
+
+        asyncio.run(scenario())
+        self.assertEqual(self.fetches, ["https://ok", "https://ko", "https://ko", "https://ok"])
+        self.assertEqual(self.cache.stats()["hits"], 1)
+        self.assertEqual(self.cache.stats()["misses"], 4)
+
+    def test_lru_bound(self):
+        """Test that the least recently used URL is evicted first"""
+        async def scenario():
+            for url in ("https://a", "https://b", "https://a", "https://c", "https://a", "https://b"):
+                await self.cache.get_or_fetch(url, self.fetcher(url))
+
+        asyncio.run(scenario())
+        self.assertEqual(self.fetches, ["https://a", "https://b", "https://c", "https://b"])
+        self.assertEqual(self.cache.stats()["size"], 2)
+        self.assertEqual(self.cache.stats()["evictions"], 2)
+
+    def test_concurrent_lookups_share_one_fetch(self):
+        """Test that simultaneous lookups of a URL wait on the same fetch"""
+        async def scenario():
+            return await asyncio.gather(*[
+                self.cache.get_or_fetch("https://slow", self.fetcher("https://slow", delay=0.01))
+                for _ in range(5)
+            ])
+
+        results = asyncio.run(scenario())
+        self.assertEqual(self.fetches, ["https://slow"])
+        self.assertTrue(all(result["status"] == "success" for result in results))
+        self.assertEqual(self.cache.stats()["coalesced"], 4)
+
+
+# Run in separate processes, like several uvicorn workers
+STORE_WRITER = """
+import sys
+from link_store import LinkStore
+store = LinkStore(sys.argv[1])
+for index in range(400):
+    store.put_many({f"https://{sys.argv[2]}.example.com/{index}": {"status": "success", "status_code": 200}})
+"""
+
+
+class TestLinkStore(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "links.sqlite3")
+        self.clock = FakeClock()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_results_shared_and_expired(self):
+        """Test that another connection sees the results until they expire"""
+        writer = LinkStore(self.path, ttl=60, error_ttl=10, clock=self.clock)
+        reader = LinkStore(self.path, clock=self.clock)
+        writer.put_many({
+            "https://ok.example.com/": {"status": "success", "status_code": 200, "title": "Accueil"},
+            "https://ko.example.com/": {"status": "error", "status_code": 404},
+        })
+        found = reader.get_many(["https://ok.example.com/", "https://ko.example.com/", "https://new.example.com/"])
+        self.assertEqual(found["https://ok.example.com/"][1]["title"], "Accueil")
+        self.assertEqual(found["https://ko.example.com/"][0], self.clock.now + 10)
+        self.assertNotIn("https://new.example.com/", found)
+
+        self.clock.now += 30
+        self.assertEqual(list(reader.get_many(["https://ok.example.com/", "https://ko.example.com/"])), ["https://ok.example.com/"])
+        self.assertEqual(writer.expire(), 1)
+        self.assertEqual(reader.stats()["rows"], 1)
+        writer.close()
+        reader.close()
+
+    def test_bulk_lookup_and_concurrent_workers(self):
+        """Test that several processes write safely and one query returns a whole newsletter's links"""
+        writers = [
+            subprocess.Popen([sys.executable, "-c", STORE_WRITER, self.path, prefix], cwd=os.path.join(ROOT_DIR, "backend"))
+            for prefix in "abc"
+        ]
+        self.assertEqual([writer.wait(timeout=60) for writer in writers], [0, 0, 0])
+        store = LinkStore(self.path)
+        urls = [f"https://{prefix}.example.com/{index}" for prefix in "abc" for index in range(400)]
+        self.assertEqual(len(store.get_many(urls + ["https://d.example.com/0"])), 1200)
+        self.assertEqual(store.stats()["misses"], 1)
+        store.close()
+
+    def test_restarted_worker_does_not_probe_again(self):
+        """Test that results survive an empty in-memory cache, as after a deploy"""
+        original_store = server.link_store
+        server.link_store = LinkStore(self.path)
+        try:
+            async def scenario():
+                async with StubSite() as site:
+                    for _ in range(2):
+                        server.link_cache.clear()
+                        server.hop_cache.clear()
+                        links = [server.LinkInfo(url=f"{site.base_url}/page", text="Page")]
+                        await server.verify_all_links(links)
+                    return site, links
+
+            site, links = asyncio.run(scenario())
+        finally:
+            server.link_store.close()
+            server.link_store = original_store
+        self.assertEqual(site.requests, [("GET", "/page")])
+        self.assertEqual((links[0].status, links[0].title), ("success", "Stub page"))
+
+    def test_every_result_field_round_trips(self):
+        """Test that redirect chains, final URLs and error classes come back from the store"""
+        original_store = server.link_store
+        server.link_store = LinkStore(self.path)
+        closed_port = run_suite.free_port()
+        try:
+            async def scenario():
+                async with StubSite() as site:
+                    urls = [f"{site.base_url}/track/1", f"http://127.0.0.1:{closed_port}/"]
+                    checked = [server.LinkInfo(url=url, text="Lien") for url in urls]
+                    await server.verify_all_links(checked)
+                    server.link_cache.clear()
+                    server.hop_cache.clear()
+                    await server.load_stored_links(urls)
+                    return site, checked, [server.link_cache.get(url) for url in urls]
+
+            site, checked, stored = asyncio.run(scenario())
+        finally:
+            server.link_store.close()
+            server.link_store = original_store
+        expected = [link.model_dump(include=set(server.LINK_RESULT_FIELDS)) for link in checked]
+        self.assertEqual(stored, expected)
+        self.assertEqual(stored[0]["final_url"], f"{site.base_url}/landing")
+        self.assertEqual(len(stored[0]["redirect_chain"]), 2)
+        self.assertEqual(stored[1]["error"], "connect")
+
+    def test_version_1_store_migrated(self):
+        """Test that rows written with one column per field survive the upgrade"""
+        connection = sqlite3.connect(self.path)
+        connection.executescript("""
+            CREATE TABLE links (url TEXT PRIMARY KEY, status TEXT, status_code INTEGER, favicon TEXT, title TEXT,
+                                preview_image TEXT, description TEXT, checked_at REAL NOT NULL, expires_at REAL NOT NULL) WITHOUT ROWID;
+            INSERT INTO links VALUES ('https://old.example.com/', 'success', 200, NULL, 'Ancien', NULL, NULL, 0, 1e12);
+        """)
+        connection.close()
+        store = LinkStore(self.path)
+        found = store.get_many(["https://old.example.com/"])
+        self.assertEqual(found["https://old.example.com/"][1]["title"], "Ancien")
+        store.put_many({"https://new.example.com/": {"status": "error", "status_code": None, "error": "dns"}})
+        self.assertEqual(store.get_many(["https://new.example.com/"])["https://new.example.com/"][1]["error"], "dns")
+        store.close()
+
+
+class StubSite:
+    """Local aiohttp server that counts the requests it receives"""
+
+    def __init__(self):
+        self.requests = []
+        self.ranges = []
+        self.runner = None
+        self.base_url = None
+
+    async def handle(self, request):
+        self.requests.append((request.method, request.path))
+        if request.path == "/throttled" and len(self.requests) == 1:
+            return web.Response(status=429, headers={"Retry-After": "0"})
+        if request.path == "/slow":
+            await asyncio.sleep(0.3)
+        if request.path == "/no-head" and request.method == "HEAD":
+            return web.Response(status=405)
+        if request.path == "/missing":
+            return web.Response(status=404)
+        if request.path.startswith("/track/"):
+            # Click tracking: every tracked link lands on the same page
+            return web.Response(status=302, headers={"Location": "/landing"})
+        if request.path.startswith("/loop/"):
+            return web.Response(status=301, headers={"Location": "/loop/b" if request.path == "/loop/a" else "/loop/a"})
+        if request.path.startswith("/hops/"):
+            hops = int(request.path.split("/")[2])
+            return web.Response(status=307, headers={"Location": f"/hops/{hops - 1}" if hops > 1 else "/landing"})
+        if request.path == "/image.png":
+            self.ranges.append(request.headers.get("Range"))
+            start, end = (int(bound) for bound in request.headers["Range"][len("bytes="):].split("-"))
+            body = PNG_IMAGE[start:end + 1]
+            return web.Response(body=body, status=206, content_type="image/png", headers={
+                "Content-Range": f"bytes {start}-{start + len(body) - 1}/{len(PNG_IMAGE)}",
+            })
+        if request.path == "/style.css":
+            # Streamed without Content-Length, ignoring the Range header
+            response = web.StreamResponse(headers={"Content-Type": "text/css"})
+            response.enable_chunked_encoding()
+            await response.prepare(request)
+            for _ in range(10):
+                await response.write(b"td { color: red; }\n" * 100)
+            await response.write_eof()
+            return response
+        return web.Response(text="<html><head><title>Stub page</title></head></html>", content_type="text/html")
+
+    async def __aenter__(self):
+        app = web.Application()
+        app.router.add_route("*", "/{tail:.*}", self.handle)
+        self.runner = web.AppRunner(app)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, "127.0.0.1", 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        self.base_url = f"http://127.0.0.1:{port}"
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.runner.cleanup()
+
+
+class TestLinkVerification(unittest.TestCase):
+
+    def setUp(self):
+        server.link_cache.clear()
+        server.hop_cache.clear()
+
+    def test_normalize_url(self):
+        """Test that equivalent spellings of a URL normalize to the same key"""
+        self.assertEqual(server.normalize_url(" HTTPS://Example.COM:443#top "), "https://example.com/")
+        self.assertEqual(server.normalize_url("https://example.com/a?b=1#c"), "https://example.com/a?b=1")
+        self.assertEqual(server.normalize_url("mailto:Team@Example.com"), "mailto:Team@Example.com")
+
+    def test_duplicate_urls_verified_once(self):
+        """Test that repeated URLs are probed once and fanned back out in order"""
+        async def scenario():
+            async with StubSite() as site:
+                html_content = "".join([
+                    f'<a href="{site.base_url}/logo">Logo</a>',
+                    f'<a href="{site.base_url}/missing">Broken</a>',
+                    f'<a href="{site.base_url.upper()}/logo#footer">Logo footer</a>',
+                    f'<a href="{site.base_url}/logo">Logo again</a>',
+                ])
+                links = await server.verify_all_links(server.extract_links_from_html(html_content))
+                return site, links
+
+        site, links = asyncio.run(scenario())
+        self.assertEqual([link.text for link in links], ["Logo", "Broken", "Logo footer", "Logo again"])
+        self.assertEqual([link.status for link in links], ["success", "error", "success", "success"])
+        self.assertEqual({link.title for link in links if link.status == "success"}, {"Stub page"})
+        self.assertEqual(site.requests.count(("GET", "/logo")), 1)
+        self.assertNotIn("HEAD", {method for method, _ in site.requests})
+
+    def test_server_rejecting_head_is_not_misclassified(self):
+        """Test that a page answering 405 to HEAD is verified with its GET status"""
+        async def scenario():
+            async with StubSite() as site:
+                links = [server.LinkInfo(url=f"{site.base_url}/no-head", text="Shop")]
+                return await server.verify_all_links(links)
+
+        links = asyncio.run(scenario())
+        self.assertEqual((links[0].status, links[0].status_code, links[0].title), ("success", 200, "Stub page"))
+
+    def test_head_prefix_stops_at_head_end(self):
+        """Test that a landing page is read only up to </head>, whatever its size"""
+        class FakeContent:
+            def __init__(self, chunks):
+                self.chunks = list(chunks)
+                self.reads = 0
+
+            async def read(self, size):
+                self.reads += 1
+                return self.chunks.pop(0)[:size] if self.chunks else b""
+
+        class FakeResponse:
+            def __init__(self, chunks):
+                self.content = FakeContent(chunks)
+
+        body = [b"<html><head><title>Big</title></HE", b"AD><body>"] + [b"x" * 16384] * 200
+        response = FakeResponse(body)
+        prefix = asyncio.run(server.read_head_prefix(response, 1 << 20))
+        self.assertTrue(prefix.endswith(b"</HEAD><body>"))
+        self.assertEqual(response.content.reads, 2)
+
+        response = FakeResponse([b"<html><head>" + b"x" * 16384] * 200)
+        prefix = asyncio.run(server.read_head_prefix(response, 65536))
+        self.assertEqual(len(prefix), 65536)
+
+
+class TestOutboundLimits(unittest.TestCase):
+
+    def setUp(self):
+        server.link_cache.clear()
+        server.hop_cache.clear()
+        self.original_limiter = server.host_limiter
+
+    def tearDown(self):
+        server.host_limiter = self.original_limiter
+
+    def test_parse_retry_after(self):
+        """Test both Retry-After formats"""
+        self.assertEqual(parse_retry_after("3"), 3.0)
+        self.assertEqual(parse_retry_after("Wed, 21 Oct 2015 07:28:00 GMT"), 0.0)
+        self.assertIsNone(parse_retry_after("soon"))
+
+    def test_per_host_cap(self):
+        """Test that a host never sees more concurrent probes than the per-host cap"""
+        server.host_limiter = HostLimiter(max_concurrency=50, per_host=2)
+
+        async def scenario():
+            async with StubFarm(hosts=2, latency=0.02) as farm:
+                links = [server.LinkInfo(url=url, text="") for url in farm.urls(12)]
+                await server.verify_all_links(links)
+                return farm, links
+
+        farm, links = asyncio.run(scenario())
+        self.assertTrue(all(link.status == "success" for link in links))
+        self.assertLessEqual(max(farm.max_concurrent.values()), 2)
+
+    def test_throttled_link_is_retried(self):
+        """Test that a 429 with Retry-After is retried instead of reported as a warning"""
+        server.host_limiter = HostLimiter()
+
+        async def scenario():
+            async with StubSite() as site:
+                links = [server.LinkInfo(url=f"{site.base_url}/throttled", text="Promo")]
+                return await server.verify_all_links(links)
+
+        links = asyncio.run(scenario())
+        self.assertEqual(links[0].status, "success")
+        self.assertEqual(server.host_limiter.stats()["backoffs"], 1)
+
+    def test_asset_retry_after_zero_not_held(self):
+        """Test that an asset answered with Retry-After: 0 doesn't hold its host for the default backoff"""
+        server.host_limiter = HostLimiter()
+
+        async def scenario():
+            async with StubSite() as site, aiohttp.ClientSession() as session:
+                url = f"{site.base_url}/throttled"
+                throttled = await server.probe_asset(session, url, "image")
+                started = time.perf_counter()
+                await server.probe_asset(session, url, "image")
+                return throttled, time.perf_counter() - started
+
+        throttled, elapsed = asyncio.run(scenario())
+        self.assertEqual((throttled["status_code"], throttled["status"]), (429, "warning"))
+        self.assertLess(elapsed, server.LINK_CHECK_BACKOFF / 2)
+
+
+class TestRedirects(unittest.TestCase):
+
+    def setUp(self):
+        server.link_cache.clear()
+        server.hop_cache.clear()
+        self.original_max_redirects = server.LINK_CHECK_MAX_REDIRECTS
+
+    def tearDown(self):
+        server.LINK_CHECK_MAX_REDIRECTS = self.original_max_redirects
+
+    def verify(self, paths):
+        async def scenario():
+            async with StubSite() as site:
+                links = [server.LinkInfo(url=f"{site.base_url}{path}", text="") for path in paths]
+                await server.verify_all_links(links)
+                return site, links
+
+        return asyncio.run(scenario())
+
+    def test_tracking_links_share_landing_page(self):
+        """Test that tracked links resolve to their destination, fetched once for all of them"""
+        site, links = self.verify(["/track/1", "/track/2", "/track/3", "/landing"])
+        self.assertEqual([link.status for link in links], ["success"] * 4)
+        self.assertEqual({link.title for link in links}, {"Stub page"})
+        for link in links[:3]:
+            self.assertTrue(link.final_url.endswith("/landing"))
+            self.assertEqual([hop["status_code"] for hop in link.redirect_chain], [302, 200])
+            self.assertTrue(all(hop["duration_ms"] >= 0 for hop in link.redirect_chain))
+        self.assertIsNone(links[3].final_url)
+        self.assertEqual(site.requests.count(("GET", "/landing")), 1)
+        # Fetched by one of the tracked links, or by the direct link
+        self.assertLessEqual([link.redirect_chain[1]["shared"] for link in links[:3]].count(False), 1)
+
+    def test_redirect_loop_and_cap(self):
+        """Test that a loop is detected and that a chain longer than the cap is cut"""
+        server.LINK_CHECK_MAX_REDIRECTS = 3
+        site, links = self.verify(["/loop/a", "/hops/5", "/hops/3"])
+        self.assertEqual((links[0].status, links[0].error), ("error", "redirect_loop"))
+        self.assertEqual(len(links[0].redirect_chain), 2)
+        self.assertEqual((links[1].status, links[1].error), ("error", "redirects"))
+        self.assertEqual(len(links[1].redirect_chain), 4)
+        self.assertEqual((links[2].status, len(links[2].redirect_chain)), ("success", 4))
+
+
+class TestAssets(unittest.TestCase):
+
+    def setUp(self):
+        server.link_cache.clear()
+        server.hop_cache.clear()
+        server.asset_cache.clear()
+
+    def test_image_dimensions(self):
+        """Test that dimensions are read from the first bytes of each image format"""
+        gif = b"GIF89a" + (120).to_bytes(2, "little") + (60).to_bytes(2, "little")
+        jpeg = (b"\xff\xd8\xff\xe0" + (16).to_bytes(2, "big") + b"JFIF\0" + b"\0" * 9
+                + b"\xff\xc0" + (17).to_bytes(2, "big") + b"\x08" + (480).to_bytes(2, "big") + (640).to_bytes(2, "big"))
+        webp = b"RIFF\0\0\0\0WEBPVP8X" + b"\0" * 8 + (799).to_bytes(3, "little") + (399).to_bytes(3, "little")
+        self.assertEqual(image_dimensions(PNG_IMAGE[:64]), (600, 300))
+        self.assertEqual(image_dimensions(gif), (120, 60))
+        self.assertEqual(image_dimensions(jpeg + b"\0" * 16), (640, 480))
+        self.assertEqual(image_dimensions(webp), (800, 400))
+        self.assertIsNone(image_dimensions(b"<svg xmlns='http://www.w3.org/2000/svg'/>"))
+
+    def test_budgets(self):
+        """Test the Gmail clipping, total weight and heavy image findings"""
+        assets = [
+            {"url": "https://cdn/hero.jpg", "kind": "image", "status": "success", "bytes": 400_000},
+            {"url": "https://cdn/logo.png", "kind": "image", "status": "success", "bytes": 5_000},
+            {"url": "https://cdn/gone.png", "kind": "image", "status": "error", "status_code": 404, "bytes": None},
+            {"url": "https://cdn/slow.png", "kind": "image", "status": "pending", "bytes": None},
+        ]
+        section, critical_issues, warnings = asset_report(120_000, assets, 102 * 1024, 500_000, 200 * 1024)
+        self.assertTrue(section["clipped"])
+        self.assertEqual((section["asset_bytes"], section["total_bytes"]), (405_000, 525_000))
+        self.assertEqual(section["unknown_sizes"], 1)
+        self.assertTrue(section["over_budget"])
+        self.assertEqual(critical_issues, ["Image inaccessible (404) : https://cdn/gone.png"])
+        self.assertEqual(len(warnings), 3)
+        self.assertIn("Image lourde (391 Ko) : https://cdn/hero.jpg", warnings)
+
+    def test_assets_probed_once_with_ranges(self):
+        """Test that each distinct asset is probed once, reading only its first bytes"""
+        async def scenario():
+            async with StubSite() as site:
+                html_content = (
+                    f'<html><head><link rel="stylesheet" href="{site.base_url}/style.css"></head><body><table><tr><td>'
+                    f'<img src="{site.base_url}/image.png" alt="Hero"><img src="{site.base_url}/image.png#2" alt="Hero">'
+                    f'<img src="{site.base_url}/missing" alt="Gone"><img src="data:image/png;base64,AAAA" alt="Inline">'
+                    f'<a href="{site.base_url}/unsubscribe">Se désabonner</a></td></tr></table></body></html>'
+                )
+                first = await server.run_analysis(server.NewsletterAnalysisRequest(html_content=html_content))
+                second = await server.run_analysis(server.NewsletterAnalysisRequest(html_content=html_content))
+                return site, first.report, second.report
+
+        site, report, second = asyncio.run(scenario())
+        assets = {asset["url"].rsplit("/", 1)[1]: asset for asset in report["assets"]["assets"]}
+        self.assertEqual(list(assets), ["style.css", "image.png", "missing"])
+        image = assets["image.png"]
+        self.assertEqual((image["bytes"], image["width"], image["height"]), (len(PNG_IMAGE), 600, 300))
+        self.assertEqual(image["content_type"], "image/png")
+        self.assertEqual(site.ranges, [f"bytes=0-{64 * 1024 - 1}"])
+        self.assertEqual(assets["style.css"]["bytes"], 10 * 1900)
+        self.assertEqual(assets["missing"]["status"], "error")
+        self.assertIn(f"Image inaccessible (404) : {site.base_url}/missing", report["critical_issues"])
+        self.assertTrue(any(warning.startswith("Image lourde (300 Ko)") for warning in report["warnings"]))
+        self.assertEqual(report["timings"]["stages"]["assets"]["status"], "ok")
+        # The second analysis is answered from the asset cache
+        self.assertEqual(second["assets"]["asset_bytes"], report["assets"]["asset_bytes"])
+        self.assertEqual(site.requests.count(("GET", "/image.png")), 1)
+
+
+class TestAdmission(unittest.TestCase):
+
+    def setUp(self):
+        server.link_cache.clear()
+        server.hop_cache.clear()
+        self.original_admission = server.admission
+        self.original_link_cap = server.LINK_CHECK_MAX_PER_NEWSLETTER
+
+    def tearDown(self):
+        server.admission = self.original_admission
+        server.LINK_CHECK_MAX_PER_NEWSLETTER = self.original_link_cap
+
+    def test_token_bucket_per_client(self):
+        """Test that each client gets its burst, then one analysis per 1/rate seconds"""
+        clock = FakeClock()
+        controller = AdmissionController(rate=0.5, burst=2, clock=clock)
+
+        async def scenario():
+            for _ in range(2):
+                (await controller.acquire("key:a"))()
+            with self.assertRaises(Rejected) as rejected:
+                await controller.acquire("key:a")
+            (await controller.acquire("key:b"))()
+            clock.now += 2
+            (await controller.acquire("key:a"))()
+            return rejected.exception
+
+        rejected = asyncio.run(scenario())
+        self.assertEqual((rejected.status_code, rejected.reason, rejected.retry_after_header()), (429, "rate_limited", "2"))
+        self.assertEqual(controller.stats()["admitted"], 4)
+
+    def test_bounded_queue_with_timeout(self):
+        """Test that analyses wait for a slot, up to the queue size and timeout"""
+        controller = AdmissionController(max_in_flight=1, max_queue=1, queue_timeout=0.05)
+
+        async def scenario():
+            release = await controller.acquire("a")
+            waiting = asyncio.ensure_future(controller.acquire("b"))
+            await asyncio.sleep(0)
+            with self.assertRaises(Rejected) as full:
+                await controller.acquire("c")
+            with self.assertRaises(Rejected) as timed_out:
+                await waiting
+            queued = asyncio.ensure_future(controller.acquire("d"))
+            await asyncio.sleep(0)
+            release()
+            (await queued)()
+            return full.exception, timed_out.exception
+
+        full, timed_out = asyncio.run(scenario())
+        self.assertEqual((full.status_code, full.reason), (503, "queue_full"))
+        self.assertEqual((timed_out.status_code, timed_out.reason), (503, "queue_timeout"))
+        self.assertEqual(controller.stats()["rejected"], {"rate_limited": 0, "queue_full": 1, "queue_timeout": 1})
+        self.assertEqual((controller.in_flight, controller.waiting), (0, 0))
+
+    def test_overloaded_endpoint_answers_fast(self):
+        """Test that a full worker answers 503 with Retry-After and shows it in /api/health"""
+        server.admission = AdmissionController(max_in_flight=1, max_queue=0)
+
+        async def scenario():
+            release = await server.admission.acquire("someone else")
+            transport = httpx.ASGITransport(app=server.app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+                rejected = await client.post("/api/analyze-newsletter", json={"html_content": "<p>Bonjour</p>"})
+                health = await client.get("/api/health")
+            release()
+            return rejected, health
+
+        rejected, health = asyncio.run(scenario())
+        self.assertEqual(rejected.status_code, 503)
+        self.assertEqual(rejected.headers["Retry-After"], "1")
+        self.assertEqual(health.json()["admission"]["rejected"]["queue_full"], 1)
+
+    def test_benchmark_traffic_admitted(self):
+        """Test that one client's back-to-back analyses are not rate limited by default, nor in the benchmark suite"""
+        self.assertEqual(server.admission.rate, 0)
+        self.assertEqual(run_suite.SERVER_ENV["ADMISSION_RATE"], "0")
+
+        async def scenario():
+            transport = httpx.ASGITransport(app=server.app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+                return await asyncio.gather(*[
+                    client.post("/api/analyze-newsletter", json={"html_content": f"<p>Newsletter {index}</p>"})
+                    for index in range(40)
+                ])
+
+        responses = asyncio.run(scenario())
+        self.assertEqual({response.status_code for response in responses}, {200})
+
+    def test_links_capped_per_newsletter(self):
+        """Test that only the first distinct URLs are verified and the others reported as skipped"""
+        server.LINK_CHECK_MAX_PER_NEWSLETTER = 2
+
+        async def scenario():
+            async with StubSite() as site:
+                html_content = "".join(f'<a href="{site.base_url}/page{index}">Lien {index}</a>' for index in (1, 2, 1, 3, 4))
+                result = await server.run_analysis(server.NewsletterAnalysisRequest(html_content=html_content))
+                return site, result
+
+        site, result = asyncio.run(scenario())
+        self.assertEqual([link.status for link in result.links], ["success", "success", "success", "skipped", "skipped"])
+        self.assertEqual(len(site.requests), 2)
+        self.assertEqual(result.report["skipped_links"], 2)
+        self.assertIn("2 URL non vérifiée(s) : limite de 2 URL par newsletter", result.report["warnings"])
+
+
+class TestStreamingEndpoint(unittest.TestCase):
+
+    def setUp(self):
+        server.link_cache.clear()
+        server.hop_cache.clear()
+
+    def test_events_arrive_progressively(self):
+        """Test that HTML issues come first and fast links are streamed before slow ones"""
+        async def scenario():
+            async with StubSite() as site:
+                html_content = (
+                    f'<table><tr><td><a href="{site.base_url}/slow">Slow</a>'
+                    f'<a href="{site.base_url}/fast">Fast</a><img src="x.png"></td></tr></table>'
+                )
+                transport = httpx.ASGITransport(app=server.app)
+                async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+                    async with client.stream("POST", "/api/analyze-newsletter/stream", json={"html_content": html_content}) as response:
+                        self.assertEqual(response.headers["content-type"], "application/x-ndjson")
+                        return [json.loads(line) async for line in response.aiter_lines() if line]
+
+        events = asyncio.run(scenario())
+        self.assertEqual([event["event"] for event in events], ["result", "link", "link", "report"])
+        first = events[0]["result"]
+        self.assertIn("Image manque l'attribut alt: x.png", first["html_issues"])
+        self.assertEqual([link["status"] for link in first["links"]], ["pending", "pending"])
+        self.assertEqual([(event["index"], event["link"]["text"]) for event in events[1:3]], [(1, "Fast"), (0, "Slow")])
+        self.assertEqual(events[-1]["report"]["total_links"], 2)
+
+
+class TestBatchAnalysis(unittest.TestCase):
+
+    def setUp(self):
+        server.link_cache.clear()
+        server.hop_cache.clear()
+
+    def test_batch_shares_link_verification(self):
+        """Test that a batch job reports progress and fetches a shared URL only once"""
+        async def scenario():
+            async with StubSite() as site:
+                newsletters = [
+                    {"html_content": (
+                        f'<table><tr><td><a href="{site.base_url}/logo">Logo</a>'
+                        f'<a href="{site.base_url}/article/{i}">Article {i}</a>'
+                        f'<a href="{site.base_url}/unsubscribe">Unsubscribe</a></td></tr></table>'
+                    )}
+                    for i in range(12)
+                ]
+                transport = httpx.ASGITransport(app=server.app)
+                async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+                    response = await client.post("/api/batch-analyze", json={"newsletters": newsletters})
+                    self.assertEqual(response.status_code, 202)
+                    job_id = response.json()["job_id"]
+
+                    for _ in range(200):
+                        status = (await client.get(f"/api/batch-analyze/{job_id}")).json()
+                        if status["status"] in ("completed", "failed"):
+                            break
+                        await asyncio.sleep(0.01)
+                    results = (await client.get(f"/api/batch-analyze/{job_id}/results")).json()
+                    missing = await client.get("/api/batch-analyze/unknown")
+                return site, status, results, missing
+
+        site, status, results, missing = asyncio.run(scenario())
+        self.assertEqual(status["status"], "completed")
+        self.assertEqual((status["total"], status["completed"], status["progress"]), (12, 12, 1.0))
+        self.assertEqual(status["links"]["unique_urls"], 14)
+        self.assertEqual(status["links"]["shared"], 22)
+        self.assertEqual(site.requests.count(("GET", "/logo")), 1)
+        self.assertEqual([result["links"][1]["text"] for result in results["results"]], [f"Article {i}" for i in range(12)])
+        self.assertNotIn("html_content", results["results"][0]["responsive_preview"])
+        self.assertEqual(missing.status_code, 404)
+
+    def test_small_job_not_stuck_behind_large_one(self):
+        """Test that jobs are served in turn, so a later small batch finishes before an earlier large one"""
+        async def handler(job, index, item):
+            await asyncio.sleep(0.005)
+            return item
+
+        async def scenario():
+            queue = JobQueue(handler, workers=2)
+            large = queue.submit(list(range(200)))
+            await asyncio.sleep(0.02)
+            small = queue.submit(list(range(5)))
+            stats = queue.stats()
+            while not small.done:
+                await asyncio.sleep(0.005)
+            progress = large.completed
+            while not large.done:
+                await asyncio.sleep(0.005)
+            await queue.stop()
+            return large, small, stats, progress
+
+        large, small, stats, progress = asyncio.run(scenario())
+        self.assertGreater(stats["queued_items"], 150)
+        self.assertEqual((small.status, small.results), ("completed", list(range(5))))
+        self.assertLess(progress, 50)
+        self.assertEqual((large.status, large.results), ("completed", list(range(200))))
+
+
+class TestAIAnalysis(unittest.TestCase):
+
+    def setUp(self):
+        server.ai_cache.clear()
+        self.original_clients = server.ai_clients
+
+    def tearDown(self):
+        server.ai_clients = self.original_clients
+
+    def test_cached_and_bounded_against_fake_server(self):
+        """Test that identical drafts hit the cache and LLM calls respect the concurrency cap"""
+        async def scenario():
+            async with FakeLLM(latency=0.05) as llm:
+                server.ai_clients = AIClientPool(base_url=llm.base_url, max_concurrency=2)
+                drafts = [f"<p>Brouillon {i}</p>" for i in range(6)]
+                first = await asyncio.gather(*[server.analyze_with_ai(html, "sk-test", "Sujet") for html in drafts])
+                again = await server.analyze_with_ai(drafts[0], "sk-other", "Sujet")
+                changed = await server.analyze_with_ai(drafts[0], "sk-test", "Autre sujet")
+                invalid = await server.analyze_with_ai("<p>Nouveau</p>", "invalid", "Sujet")
+                return llm, first, again, changed, invalid
+
+        llm, first, again, changed, invalid = asyncio.run(scenario())
+        self.assertTrue(all(result["lisibilite"]["score"] == 7 for result in first))
+        self.assertEqual(again, first[0])
+        self.assertNotIn("error", changed)
+        self.assertIn("error", invalid)
+        self.assertEqual(llm.calls, 7)
+        self.assertLessEqual(llm.max_concurrent, 2)
+        self.assertEqual(server.ai_cache.stats()["hits"], 1)
+        self.assertEqual(server.ai_cache.stats()["size"], 7)
+
+    def test_failure_of_one_key_not_shared(self):
+        """Test that a call in flight with a rejected key doesn't answer a caller with a valid key"""
+        async def scenario():
+            async with FakeLLM(latency=0.05) as llm:
+                server.ai_clients = AIClientPool(base_url=llm.base_url)
+                rejected, accepted = await asyncio.gather(
+                    server.analyze_with_ai("<p>Même texte</p>", "invalid", "Sujet"),
+                    server.analyze_with_ai("<p>Même texte</p>", "sk-test", "Sujet"),
+                )
+                same_key = await asyncio.gather(*[
+                    server.analyze_with_ai("<p>Autre texte</p>", "sk-test", "Sujet") for _ in range(3)
+                ])
+                return llm, rejected, accepted, same_key
+
+        llm, rejected, accepted, same_key = asyncio.run(scenario())
+        self.assertIn("error", rejected)
+        self.assertEqual(accepted["lisibilite"]["score"], 7)
+        self.assertTrue(all("error" not in result for result in same_key))
+        self.assertEqual(llm.calls, 2)
+        self.assertEqual(server.ai_cache.stats()["coalesced"], 2)
+
+    def test_event_loop_not_blocked(self):
+        """Test that other coroutines keep running while the model answers"""
+        async def scenario():
+            async with FakeLLM(latency=0.2) as llm:
+                server.ai_clients = AIClientPool(base_url=llm.base_url)
+                ticks = 0
+
+                async def ticker():
+                    nonlocal ticks
+                    while True:
+                        await asyncio.sleep(0.01)
+                        ticks += 1
+
+                task = asyncio.ensure_future(ticker())
+                await server.analyze_with_ai("<p>Bonjour</p>", "sk-test")
+                task.cancel()
+                return ticks
+
+        self.assertGreater(asyncio.run(scenario()), 10)
+
+
+
+class TestChunkedAIAnalysis(unittest.TestCase):
+
+    def setUp(self):
+        server.ai_cache.clear()
+        self.original_clients = server.ai_clients
+        self.original_chunking = (server.AI_CHUNK_TOKENS, server.AI_MAX_CHUNKS, server.AI_CHUNK_CONCURRENCY)
+
+    def tearDown(self):
+        server.ai_clients = self.original_clients
+        server.AI_CHUNK_TOKENS, server.AI_MAX_CHUNKS, server.AI_CHUNK_CONCURRENCY = self.original_chunking
+
+    def test_visible_text_skips_hidden_content_and_boilerplate(self):
+        """Test that the AI text has no hidden preheader, padding, styles or footer chrome, whatever the backend"""
+        html_content = """
+        <html><head><title>Soldes</title><style>p { color: red; }</style></head><body>
+            <div style="display: none; max-height: 0">Aperçu caché &zwnj;&nbsp;&#847;&zwnj;&nbsp;&#847;</div>
+            <p>Im Browser ansehen</p>
+            <table><tr><td>Bonjour&nbsp;&nbsp;à   tous</td><td>Les <b>soldes</b>​ commencent</td></tr></table>
+            <p>日本語のお知らせ。<script>var x = 1;</script></p>
+            <p hidden>Texte masqué</p>
+            <p>© 2024 Acme SAS</p>
+            <p><a href="https://example.com/unsub">Se désabonner</a> | Tous droits réservés</p>
+        </body></html>
+        """
+        for backend in available_parser_backends():
+            with self.subTest(backend=backend):
+                document = parse_newsletter(html_content, backend)
+                self.assertEqual(document.visible_text, "Bonjour à tous\nLes soldes commencent\n日本語のお知らせ。")
+                self.assertIn("Aperçu caché", document.text)
+
+    def test_chunks_cover_the_text_within_budget(self):
+        """Test that chunks respect the token budget, split long lines, and fit in the chunk cap"""
+        text = "\n".join([
+            "Première phrase du paragraphe. " * 20,
+            "短い文。" * 200,
+            "Un paragraphe court.",
+            "x" * 500,
+        ])
+        chunks = chunk_text(text, 100)
+        self.assertGreater(len(chunks), 5)
+        self.assertTrue(all(estimate_tokens(chunk) <= 100 for chunk in chunks))
+        self.assertEqual("".join("".join(chunks).split()), "".join(text.split()))
+
+        capped = split_for_analysis(text, 100, 3)
+        self.assertLessEqual(len(capped), 3)
+        self.assertEqual("".join("".join(capped).split()), "".join(text.split()))
+        self.assertEqual(split_for_analysis("Court.", 100, 3), ["Court."])
+        self.assertEqual(split_for_analysis("", 100, 3), [])
+
+    def test_merge_chunk_analyses(self):
+        """Test that scores are averaged by chunk size, lists merged without duplicates and failures left out"""
+        first = {
+            "lisibilite": {"score": 8, "niveau": "facile", "suggestions": ["Raccourcir les phrases"]},
+            "cta_evaluation": {"ctas_detectes": ["Découvrir"], "efficacite": 6, "suggestions": []},
+        }
+        second = {
+            "lisibilite": {"score": 5, "niveau": "difficile", "suggestions": ["raccourcir les  phrases", "Ajouter des intertitres"]},
+            "cta_evaluation": {"ctas_detectes": ["Découvrir", "Acheter"], "efficacite": 6, "suggestions": []},
+        }
+        merged = merge_chunk_analyses([first, {"error": "Erreur lors de l'analyse IA: timeout"}, second], [200, 100, 100])
+        self.assertEqual(merged["lisibilite"], {
+            "score": 7,
+            "niveau": "facile",
+            "suggestions": ["Raccourcir les phrases", "Ajouter des intertitres"],
+        })
+        self.assertEqual(merged["cta_evaluation"]["ctas_detectes"], ["Découvrir", "Acheter"])
+        self.assertEqual(merged["cta_evaluation"]["efficacite"], 6)
+        self.assertEqual(merged["couverture"], {"parties": 3, "parties_analysees": 2})
+
+        failed = merge_chunk_analyses([{"error": "a"}, {"error": "b"}], [1, 1])
+        self.assertEqual(failed, {"error": "a"})
+
+    def test_long_newsletter_analysed_in_concurrent_chunks(self):
+        """Test that every paragraph reaches the model, chunks run concurrently and only edited chunks are re-analysed"""
+        server.AI_CHUNK_TOKENS = 60
+        server.AI_MAX_CHUNKS = 8
+        server.AI_CHUNK_CONCURRENCY = 4
+        paragraphs = [f"Paragraphe {i} : " + "une phrase assez longue pour remplir le budget. " * 4 for i in range(8)]
+        html_content = "".join(f"<p>{paragraph}</p>" for paragraph in paragraphs)
+        edited = html_content.replace("Paragraphe 7 :", "Paragraphe 7 modifié :")
+
+        async def scenario():
+            async with FakeLLM(latency=0.2) as llm:
+                server.ai_clients = AIClientPool(base_url=llm.base_url)
+                started = time.perf_counter()
+                result = await server.analyze_with_ai(html_content, "sk-test", "Sujet")
+                elapsed = time.perf_counter() - started
+                calls = llm.calls
+                again = await server.analyze_with_ai(html_content, "sk-test", "Sujet")
+                calls_again = llm.calls
+                await server.analyze_with_ai(edited, "sk-test", "Sujet")
+                return llm, result, elapsed, calls, again, calls_again
+
+        llm, result, elapsed, calls, again, calls_again = asyncio.run(scenario())
+        self.assertEqual(calls, 8)
+        self.assertEqual(result["couverture"], {"parties": 8, "parties_analysees": 8})
+        self.assertEqual(result["lisibilite"]["score"], 7)
+        self.assertEqual(result["cta_evaluation"]["ctas_detectes"], ["Découvrir"])
+        for i in range(8):
+            self.assertTrue(any(f"Paragraphe {i} :" in prompt for prompt in llm.prompts[:8]))
+        self.assertTrue(all("extrait" in prompt for prompt in llm.prompts))
+        self.assertLessEqual(llm.max_concurrent, 4)
+        # Two waves of 0.2 s, not eight
+        self.assertLess(elapsed, 0.2 * 8 * 0.6)
+        self.assertEqual(again, result)
+        self.assertEqual(calls_again, 8)
+        self.assertEqual(llm.calls, 9)
+
+class TestConcurrentStages(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        # The first OpenAI client of the process pays for lazy imports; keep that out of the timings
+        async def warm_up():
+            pool = AIClientPool()
+            pool.client("sk-warm-up")
+            await pool.close()
+
+        asyncio.run(warm_up())
+
+    def setUp(self):
+        server.link_cache.clear()
+        server.hop_cache.clear()
+        server.ai_cache.clear()
+        self.original_clients = server.ai_clients
+        self.original_links_timeout = server.ANALYSIS_LINKS_TIMEOUT
+
+    def tearDown(self):
+        server.ai_clients = self.original_clients
+        server.ANALYSIS_LINKS_TIMEOUT = self.original_links_timeout
+
+    def analyze(self, html_content, **options):
+        async def scenario():
+            async with StubSite() as site, FakeLLM(latency=0.3) as llm:
+                server.ai_clients = AIClientPool(base_url=llm.base_url)
+                request = server.NewsletterAnalysisRequest(
+                    html_content=html_content.format(base_url=site.base_url), openai_api_key="sk-test", **options
+                )
+                started = time.perf_counter()
+                result = await server.run_analysis(request)
+                return result, time.perf_counter() - started
+
+        return asyncio.run(scenario())
+
+    def test_links_and_ai_overlap(self):
+        """Test that latency is the slowest stage rather than the sum of stages"""
+        result, elapsed = self.analyze('<table><tr><td><a href="{base_url}/slow">Slow</a></td></tr></table>')
+        self.assertEqual(result.links[0].status, "success")
+        self.assertNotIn("error", result.ai_analysis)
+        self.assertLess(elapsed, 0.55)
+        stages = result.report["timings"]["stages"]
+        self.assertEqual(set(stages), {"parse", "html_issues", "links", "assets", "ai_analysis"})
+        self.assertTrue(all(stage["status"] == "ok" for stage in stages.values()))
+        self.assertGreaterEqual(stages["ai_analysis"]["duration_ms"], 300)
+
+    def test_stage_timeout_keeps_other_results(self):
+        """Test that a link stage running out of time leaves pending links and a warning"""
+        server.ANALYSIS_LINKS_TIMEOUT = 0.1
+        result, _ = self.analyze('<a href="{base_url}/slow">Slow</a><a href="{base_url}/fast">Fast</a>')
+        self.assertEqual([link.status for link in result.links], ["pending", "success"])
+        self.assertNotIn("error", result.ai_analysis)
+        self.assertIn("Aucune table détectée - vérifiez la compatibilité email", result.html_issues)
+        self.assertEqual(result.report["timings"]["stages"]["links"]["status"], "timeout")
+        self.assertIn("Vérification des liens incomplète (délai dépassé)", result.report["warnings"])
+
+
+class TestRuleEngine(unittest.TestCase):
+
+    def test_rules_dispatched_during_single_traversal(self):
+        """Test that tag, attribute, keyword and pattern rules agree on every backend"""
+        visits = []
+
+        def visit_cell(tag, attributes):
+            visits.append(tag)
+            return attributes.get("class")
+
+        engine = RuleEngine([
+            Rule("cells", WARNING, lambda findings: findings, tags=("td",), attributes=("bgcolor",), visit=visit_cell),
+            Rule("widths", WARNING, lambda findings: findings, attributes=("width",),
+                 visit=lambda tag, attributes: f"{tag}={attributes['width']}"),
+            Rule("words", CRITICAL, lambda findings: findings, keywords=("Gratuit", "argent facile")),
+            Rule("shouting", WARNING, lambda findings: findings, pattern=r"[!?]{3,}"),
+        ])
+        html_content = (
+            '<table width="600"><tr><td class="hero big" bgcolor="#fff">Argent  facile, 100% gratuit!!!</td>'
+            '<td>argent</td></tr></table><img src="a.png" width="20"><p>facile?</p>'
+            '<div style="display: none">Gratuit !!!</div>'
+        )
+        for backend in available_parser_backends():
+            with self.subTest(backend=backend):
+                visits.clear()
+                document = parse_newsletter(html_content, backend, engine)
+                self.assertEqual(document.rule_findings, {
+                    "widths": ["table=600", "img=20"],
+                    "cells": ["hero big"],
+                    "words": ["argent facile", "Gratuit"],
+                    "shouting": ["!!!"],
+                })
+                self.assertEqual(visits, ["td", "td"])
+
+    def test_unknown_severity_rejected(self):
+        with self.assertRaises(ValueError):
+            RuleEngine([Rule("typo", "critcal", lambda findings: findings, tags=("p",), visit=lambda *_: None)])
+
+    def test_html_checks_reported_as_critical(self):
+        """Test that the HTML checks keep their issues and severity on the rule engine"""
+        html_content = '<div style="color: red"><img src="a.png"><p>Gagnez !!!</p><script>track()</script></div>'
+        result = asyncio.run(server.run_analysis(server.NewsletterAnalysisRequest(html_content=html_content)))
+        expected = [
+            "Image manque l'attribut alt: a.png",
+            "Styles inline détectés - peuvent causer des problèmes de responsivité",
+            "Lien de désabonnement manquant",
+            "Aucune table détectée - vérifiez la compatibilité email",
+        ]
+        self.assertEqual(result.html_issues, expected)
+        self.assertEqual(result.report["critical_issues"], expected)
+        self.assertEqual(result.report["warnings"], [])
+
+
+class TestIncrementalAnalysis(unittest.TestCase):
+
+    def setUp(self):
+        server.link_cache.clear()
+        server.hop_cache.clear()
+        server.ai_cache.clear()
+        server.drafts.clear()
+        self.original_clients = server.ai_clients
+
+    def tearDown(self):
+        server.ai_clients = self.original_clients
+
+    def test_resubmitted_draft_reuses_unchanged_parts(self):
+        """Test that only changed URLs, affected rules and changed text are analysed again"""
+        template = (
+            '<table><tr><td><p>{paragraph}</p><img src="logo.png"{alt}>'
+            '<a href="{base_url}/a">A</a><a href="{base_url}/{second}">Second</a></td></tr></table>'
+        )
+
+        async def scenario():
+            async with StubSite() as site, FakeLLM() as llm:
+                server.ai_clients = AIClientPool(base_url=llm.base_url)
+
+                async def submit(**parts):
+                    # The shared link cache is emptied so only the draft can explain reused links
+                    server.link_cache.clear()
+                    server.hop_cache.clear()
+                    values = {"paragraph": "Bonjour", "alt": "", "second": "b", "base_url": site.base_url, **parts}
+                    request = server.NewsletterAnalysisRequest(
+                        html_content=template.format(**values), openai_api_key="sk-test", draft_id="draft-1"
+                    )
+                    return await server.run_analysis(request)
+
+                first = await submit()
+                edited = await submit(paragraph="Bonsoir", second="c")
+                alt_added = await submit(paragraph="Bonsoir", second="c", alt=' alt="Logo"')
+                unchanged = await submit(paragraph="Bonsoir", second="c", alt=' alt="Logo"')
+                return site, llm, first, edited, alt_added, unchanged
+
+        site, llm, first, edited, alt_added, unchanged = asyncio.run(scenario())
+        self.assertIsNone(first.report["incremental"]["previous_analysis_at"])
+        self.assertEqual(first.report["incremental"]["urls_verified"], 2)
+
+        incremental = edited.report["incremental"]
+        self.assertEqual((incremental["links_reused"], incremental["urls_verified"]), (1, 1))
+        self.assertFalse(incremental["ai_reused"])
+        self.assertEqual(incremental["html_rules_rerun"], [])
+        self.assertEqual([link.status for link in edited.links], ["success", "success"])
+        self.assertEqual(edited.links[0].title, "Stub page")
+
+        incremental = alt_added.report["incremental"]
+        self.assertTrue(incremental["ai_reused"])
+        self.assertEqual(incremental["html_rules_rerun"], ["images_alt"])
+        self.assertEqual(incremental["urls_verified"], 0)
+        self.assertNotIn("Image manque l'attribut alt: logo.png", alt_added.html_issues)
+        self.assertEqual(alt_added.report["timings"]["stages"]["ai_analysis"]["status"], "reused")
+
+        self.assertTrue(unchanged.report["incremental"]["parse_reused"])
+        self.assertEqual(unchanged.html_issues, alt_added.html_issues)
+        self.assertEqual(llm.calls, 2)
+        self.assertEqual(sorted(path for _, path in site.requests), ["/a", "/b", "/c"])
+
+    def test_rules_rerun_only_when_inputs_change(self):
+        before = parse_newsletter('<table><tr><td><img src="a.png"></td></tr></table>')
+        after = parse_newsletter('<table><tr><td><img src="a.png"><a href="#">Unsubscribe</a></td></tr></table>')
+        issues, rerun = run_html_rules(before)
+        self.assertEqual(rerun, [rule.name for rule in HTML_RULES])
+        issues, rerun = run_html_rules(after, before, issues)
+        self.assertEqual(rerun, ["unsubscribe"])
+        self.assertEqual(flatten_issues(issues), analyze_html_issues(after))
+
+
+class TestBenchmarkHarness(unittest.TestCase):
+
+    def setUp(self):
+        server.link_cache.clear()
+        server.hop_cache.clear()
+
+    def test_corpus_link_count_and_duplicates(self):
+        html_content = generate_newsletter(50_000, duplicate_ratio=0.5, seed=3, link_count=40,
+                                           link_url=lambda index: f"https://bench.example.com/{index}")
+        hrefs = [href for href, _ in parse_newsletter(html_content).links]
+        self.assertEqual(len(hrefs), 41)  # plus the unsubscribe link
+        self.assertLess(len(set(hrefs)), 35)
+        self.assertLess(abs(len(html_content) - 50_000), 5_000)
+
+    def test_stub_farm_behaviours(self):
+        """Test that redirects, error statuses, huge and slow-loris pages behave as documented"""
+        async def scenario():
+            async with StubFarm(hosts=2, latency=0, huge_size=2_000_000, slowloris_seconds=0.3) as farm:
+                links = [
+                    server.LinkInfo(url=farm.url(index, behaviour), text=behaviour)
+                    for index, behaviour in enumerate(["page", "redirect/3", "missing", "status/500", "huge", "slowloris"])
+                ]
+                await server.verify_all_links(links)
+                return farm, links
+
+        farm, links = asyncio.run(scenario())
+        self.assertEqual(
+            [(link.status, link.status_code) for link in links],
+            [("success", 200), ("success", 200), ("error", 404), ("warning", 500), ("success", 200), ("success", 200)],
+        )
+        # The slow-loris page trickles too slowly to reach its <title>; the status is kept
+        self.assertEqual([link.title for link in links[4:]], ["Huge", None])
+        self.assertEqual(farm.requests["GET"], 9)
+
+
+class TestProcessPool(unittest.TestCase):
+
+    def test_analysis_in_worker_processes(self):
+        """Test that parsing and checks run in other processes and only compact data comes back"""
+        html_content = open(EMAIL_FIXTURES[0], encoding='utf-8').read()
+        original_pool = server.cpu_pool
+
+        async def scenario():
+            server.cpu_pool = CPUPool(mode="process", workers=2)
+            try:
+                await server.cpu_pool.start()
+                compact = await server.cpu_pool.run(parse_compact, html_content)
+                request = server.NewsletterAnalysisRequest(html_content=html_content)
+                document = await server.parse_request(server.DraftAnalysis(request, remember=False), StageTimeline())
+                issues = await server.cpu_pool.run(analyze_html_issues, document.compact())
+                return compact, document, issues, server.cpu_pool.stats()
+            finally:
+                server.cpu_pool.shutdown()
+                server.cpu_pool = original_pool
+
+        compact, document, issues, stats = asyncio.run(scenario())
+        expected = parse_newsletter(html_content)
+        self.assertEqual(compact.html_content, "")
+        self.assertEqual(compact.links, expected.links)
+        self.assertEqual(compact.text, expected.text)
+        self.assertIs(document.html_content, html_content)
+        self.assertEqual(issues, analyze_html_issues(expected))
+        self.assertEqual((stats["mode"], stats["tasks"]), ("process", 3))
+
+    def test_dead_worker_replaced(self):
+        """Test that a crashed worker process fails its task and the pool recovers"""
+        async def scenario():
+            pool = CPUPool(mode="process", workers=1)
+            try:
+                with self.assertRaises(BrokenProcessPool):
+                    await pool.run(os._exit, 1)
+                document = await pool.run(parse_compact, "<a href='https://example.com'>Lien</a>")
+                return document, pool.stats()
+            finally:
+                pool.shutdown()
+
+        document, stats = asyncio.run(scenario())
+        self.assertEqual(document.links, [("https://example.com", "Lien")])
+        self.assertEqual(stats["restarts"], 1)
+
+    def test_unknown_mode_rejected(self):
+        with self.assertRaises(ValueError):
+            CPUPool(mode="gpu")
+
+
+class TestLeanResponses(unittest.TestCase):
+
+    def setUp(self):
+        server.link_cache.clear()
+        server.hop_cache.clear()
+
+    def post(self, payload, headers=None, path="/api/analyze-newsletter"):
+        async def scenario():
+            transport = httpx.ASGITransport(app=server.app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+                return await client.post(path, json=payload, headers=headers or {})
+
+        return asyncio.run(scenario())
+
+    def test_lean_mode_returns_hash_instead_of_html(self):
+        """Test that lean responses identify the HTML by hash and stay much smaller"""
+        html_content = "<table><tr><td>" + "<p>Bonjour à tous</p>" * 2000 + "</td></tr></table>"
+        full = self.post({"html_content": html_content})
+        lean = self.post({"html_content": html_content, "response_mode": "lean"})
+        invalid = self.post({"html_content": html_content, "response_mode": "tiny"})
+
+        self.assertEqual(full.json()["responsive_preview"]["html_content"], html_content)
+        preview = lean.json()["responsive_preview"]
+        self.assertNotIn("html_content", preview)
+        self.assertEqual(preview["html_sha256"], hashlib.sha256(html_content.encode("utf-8")).hexdigest())
+        self.assertEqual(preview["html_bytes"], len(html_content.encode("utf-8")))
+        self.assertLess(len(lean.content), len(html_content) / 10)
+        self.assertEqual(lean.json()["html_issues"], full.json()["html_issues"])
+        self.assertEqual(invalid.status_code, 422)
+
+    def test_responses_compressed_but_stream_untouched(self):
+        """Test that complete responses are gzip/brotli encoded and the event stream is not"""
+        payload = {"html_content": "<p>" + "Contenu répété. " * 500 + "</p>"}
+        gzipped = self.post(payload, {"Accept-Encoding": "gzip"})
+        brotli_encoded = self.post(payload, {"Accept-Encoding": "gzip, br"})
+        plain = self.post(payload, {"Accept-Encoding": "identity"})
+        stream = self.post(payload, {"Accept-Encoding": "gzip, br"}, path="/api/analyze-newsletter/stream")
+
+        self.assertEqual(gzipped.headers["content-encoding"], "gzip")
+        self.assertEqual(brotli_encoded.headers["content-encoding"], "br" if compression.brotli else "gzip")
+        self.assertNotIn("content-encoding", plain.headers)
+        self.assertNotIn("content-encoding", stream.headers)
+        self.assertLess(int(gzipped.headers["content-length"]), len(plain.content) / 5)
+        for response in (gzipped, brotli_encoded):
+            self.assertEqual(response.json()["html_issues"], plain.json()["html_issues"])
+
+    def test_fast_serializer_matches_pydantic(self):
+        result = server.AnalysisResult(
+            links=[server.LinkInfo(url="https://example.com/é", text="Lien", status_code=200, status="success")],
+            html_issues=["Lien de désabonnement manquant"],
+            report={"timings": {"total_ms": 1.5}},
+        )
+        self.assertEqual(json.loads(ModelResponse(result).body), json.loads(result.model_dump_json()))
+        errors = server.BatchJobResults(job_id="x", status="failed", errors={0: "boom"})
+        self.assertEqual(json.loads(ModelResponse(errors).body)["errors"], {"0": "boom"})
+
+
+
+class TestMetrics(unittest.TestCase):
+
+    def setUp(self):
+        server.link_cache.clear()
+        server.hop_cache.clear()
+        server.metrics.reset()
+
+    def test_prometheus_text_format(self):
+        registry = MetricsRegistry()
+        probes = registry.counter("probes_total", "Probes", ["outcome"])
+        seconds = registry.histogram("probe_seconds", "Probe duration", buckets=(0.1, 1))
+        registry.gauge("queued", "Queued items", lambda: 3)
+        probes.inc("http_2xx")
+        probes.inc("http_2xx")
+        probes.inc('dns"')
+        seconds.observe(0.05)
+        seconds.observe(2)
+
+        lines = registry.render().splitlines()
+        self.assertIn("# TYPE probes_total counter", lines)
+        self.assertIn('probes_total{outcome="http_2xx"} 2', lines)
+        self.assertIn('probes_total{outcome="dns\\""} 1', lines)
+        self.assertIn('probe_seconds_bucket{le="0.1"} 1', lines)
+        self.assertIn('probe_seconds_bucket{le="1"} 1', lines)
+        self.assertIn('probe_seconds_bucket{le="+Inf"} 2', lines)
+        self.assertIn("probe_seconds_count 2", lines)
+        self.assertIn("queued 3", lines)
+
+    def test_disabled_registry_records_nothing(self):
+        registry = MetricsRegistry(enabled=False)
+        probes = registry.counter("probes_total", "Probes", ["outcome"])
+        probes.inc("http_2xx")
+        registry.histogram("probe_seconds", "Probe duration").observe(1.0)
+        self.assertEqual(probes.values, {})
+        self.assertNotIn("probe_seconds_count", registry.render())
+
+    def test_failures_classified_and_scraped(self):
+        """Test that link outcomes, stage durations and per-URL timings show up after one analysis"""
+        with socket.socket() as sock:
+            sock.bind(("127.0.0.1", 0))
+            closed_port = sock.getsockname()[1]
+
+        async def scenario():
+            async with StubSite() as site:
+                html_content = "".join([
+                    f'<a href="{site.base_url}/logo">Logo</a>',
+                    f'<a href="{site.base_url}/missing">Broken</a>',
+                    f'<a href="http://127.0.0.1:{closed_port}/">Down</a>',
+                ])
+                transport = httpx.ASGITransport(app=server.app)
+                async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+                    analysis = await client.post("/api/analyze-newsletter", json={
+                        "html_content": html_content, "timing_details": True,
+                    })
+                    scrape = await client.get("/api/metrics")
+                return analysis, scrape
+
+        analysis, scrape = asyncio.run(scenario())
+        links = analysis.json()["links"]
+        self.assertEqual([link["error"] for link in links], [None, None, "connect"])
+        detail = analysis.json()["report"]["timings"]["links_detail"]
+        self.assertEqual(len(detail), 3)
+        self.assertEqual({entry["error"] for entry in detail}, {None, "connect"})
+
+        lines = scrape.text.splitlines()
+        self.assertTrue(scrape.headers["content-type"].startswith("text/plain"))
+        for expected in (
+            'link_probes_total{outcome="http_2xx"} 1',
+            'link_probes_total{outcome="http_4xx"} 1',
+            'link_probes_total{outcome="connect"} 1',
+            'newsletter_stage_outcomes_total{stage="ai_analysis",status="skipped"} 1',
+            'newsletter_stage_seconds_count{stage="serialization"} 1',
+            'newsletter_analysis_seconds_count{endpoint="analyze"} 1',
+            "link_probe_seconds_count 3",
+            "newsletter_analyses_in_flight 0",
+        ):
+            self.assertIn(expected, lines)
+
+    def test_classify_link_error(self):
+        self.assertEqual(server.classify_link_error(asyncio.TimeoutError()), "timeout")
+        self.assertEqual(server.classify_link_error(ValueError("bad url")), "invalid_url")
+        self.assertEqual(server.classify_link_error(RuntimeError()), "other")
+
+
+
+class TestUpload(unittest.TestCase):
+
+    def setUp(self):
+        server.link_cache.clear()
+        server.hop_cache.clear()
+
+    @staticmethod
+    def eml(html_content, attachment=b""):
+        """A multipart/alternative message saved with Unix line endings, HTML in quoted-printable"""
+        return (
+            "Subject: =?utf-8?q?Soldes_d=27=C3=A9t=C3=A9?=\nFrom: Boutique <shop@example.com>\n"
+            "MIME-Version: 1.0\nContent-Type: multipart/mixed; boundary=\"outer\"\n\n"
+            "This is a multi-part message in MIME format.\n--outer\n"
+            "Content-Type: multipart/alternative; boundary=\"inner\"\n\n--inner\n"
+            "Content-Type: text/plain; charset=utf-8\n\nVersion texte\n--inner\n"
+            "Content-Type: text/html; charset=utf-8\nContent-Transfer-Encoding: quoted-printable\n\n"
+            + html_content.encode("utf-8").decode("latin-1").replace("=", "=3D").replace("\xc3", "=C3").replace("\xa9", "=A9")
+            + "\n--inner--\n--outer\nContent-Type: image/png\nContent-Transfer-Encoding: base64\n"
+            "Content-Disposition: attachment; filename=\"logo.png\"\n\n"
+            + base64.encodebytes(attachment).decode() + "--outer--\n"
+        ).encode("latin-1")
+
+    def read(self, content_type, body, chunk_size, max_html_bytes=10 ** 6):
+        reader = UploadReader(content_type, 10 ** 8, max_html_bytes)
+        for start in range(0, len(body), chunk_size):
+            reader.feed(body[start:start + chunk_size])
+        return reader.finish()
+
+    def test_data_uris_dropped_whatever_the_chunking(self):
+        """Test that base64 images are emptied out and measured across any chunk boundary"""
+        payload = base64.b64encode(bytes(range(256)) * 300).decode()
+        html_content = (f'<p>Été</p><img src="data:image/png;base64,{payload}" alt="Logo">'
+                        f'<td style="background:url(DATA:image/gif;name=x.gif;base64,{payload[:400]})">Texte</td>')
+        for chunk_size in (1, 7, 4096, 10 ** 6):
+            with self.subTest(chunk_size=chunk_size):
+                upload = self.read("text/html; charset=utf-8", html_content.encode("utf-8"), chunk_size)
+                self.assertEqual(upload.html, '<p>Été</p><img src="data:image/png;base64," alt="Logo">'
+                                              '<td style="background:url(DATA:image/gif;name=x.gif;base64,)">Texte</td>')
+                self.assertEqual(upload.data_uris, 2)
+                self.assertEqual(upload.data_uri_bytes, 256 * 300 + 300)
+                self.assertEqual(upload.original_html_bytes(), len(html_content.encode("utf-8")))
+
+    def test_eml_with_unix_line_endings(self):
+        html_content = '<p>Offre d\'été</p><a href="https://example.com/soldes">Voir</a>'
+        body = self.eml(html_content, attachment=b"\x89PNG" * 1000)
+        for chunk_size in (1, 13, 10 ** 6):
+            with self.subTest(chunk_size=chunk_size):
+                upload = self.read("message/rfc822", body, chunk_size)
+                self.assertEqual(upload.html.strip(), html_content)
+                self.assertEqual((upload.source, upload.subject), ("eml", "Soldes d'été"))
+                self.assertEqual(upload.sender, "Boutique <shop@example.com>")
+                self.assertEqual(upload.skipped_parts, 2)  # text/plain alternative and the attachment
+
+    def test_eml_headers_read_independently(self):
+        """Test that the sender is read without a subject, and the subject without a sender"""
+        upload = self.read("message/rfc822", b"From: A <a@b.c>\nContent-Type: text/html\n\n<p>x</p>", 10 ** 6)
+        self.assertEqual((upload.subject, upload.sender, upload.html), (None, "A <a@b.c>", "<p>x</p>"))
+        upload = self.read("message/rfc822", b"Subject: Seul\nContent-Type: text/html\n\n<p>x</p>", 10 ** 6)
+        self.assertEqual((upload.subject, upload.sender), ("Seul", None))
+
+    def test_form_data_whatever_the_chunking(self):
+        """Test that form fields and the file part are split correctly across any chunk boundary"""
+        html_content = '<p>Été</p><img src="data:image/png;base64,iVBORw0KGgo=" alt="">'
+        request = httpx.Request("POST", "http://test/upload", data={"subject": "Soldes", "draft_id": "d1"},
+                                files={"file": ("campagne.html", html_content.encode("utf-8"), "text/html; charset=utf-8")})
+        body = request.read()
+        for chunk_size in (1, 5, 10 ** 6):
+            with self.subTest(chunk_size=chunk_size):
+                upload = self.read(request.headers["Content-Type"], body, chunk_size)
+                self.assertEqual(upload.fields, {"subject": "Soldes", "draft_id": "d1"})
+                self.assertEqual(upload.html, '<p>Été</p><img src="data:image/png;base64," alt="">')
+                self.assertEqual(upload.data_uris, 1)
+        with self.assertRaises(UploadError):
+            self.read("multipart/form-data; boundary=b", b"pas un corps multipart", 10 ** 6)
+
+    def test_upload_endpoint(self):
+        """Test that a multipart upload of an .eml is analysed and oversized HTML is refused"""
+        async def scenario():
+            async with StubSite() as site:
+                html_content = f'<table><tr><td><a href="{site.base_url}/page">Voir</a></td></tr></table>'
+                transport = httpx.ASGITransport(app=server.app)
+                async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+                    analysed = await client.post(
+                        "/api/analyze-newsletter/upload",
+                        files={"file": ("campagne.eml", self.eml(html_content), "application/octet-stream")},
+                        data={"preheader": "Jusqu'à -50%"},
+                    )
+                    raw = await client.post("/api/analyze-newsletter/upload?subject=Brut", content=html_content,
+                                            headers={"Content-Type": "text/html"})
+                    no_html = await client.post("/api/analyze-newsletter/upload", content=b"Subject: x\n\ntexte",
+                                                headers={"Content-Type": "message/rfc822"})
+                    original_limit = server.UPLOAD_MAX_HTML_BYTES
+                    server.UPLOAD_MAX_HTML_BYTES = 100
+                    try:
+                        too_large = await client.post("/api/analyze-newsletter/upload", content="<p>x</p>" * 50,
+                                                      headers={"Content-Type": "text/html"})
+                    finally:
+                        server.UPLOAD_MAX_HTML_BYTES = original_limit
+                return analysed, raw, no_html, too_large
+
+        analysed, raw, no_html, too_large = asyncio.run(scenario())
+        self.assertEqual(analysed.status_code, 200, analysed.text)
+        result = analysed.json()
+        self.assertEqual(result["links"][0]["status"], "success")
+        self.assertEqual(result["inbox_preview"]["gmail"]["subject"], "Soldes d'été")
+        self.assertEqual(result["inbox_preview"]["gmail"]["preheader"], "Jusqu'à -50%")
+        self.assertNotIn("html_content", result["responsive_preview"])
+        self.assertEqual(result["report"]["upload"]["source"], "eml")
+        self.assertEqual(raw.json()["inbox_preview"]["gmail"]["subject"], "Brut")
+        self.assertEqual(raw.json()["report"]["upload"]["source"], "html")
+        self.assertEqual(no_html.status_code, 400)
+        self.assertEqual(too_large.status_code, 413)
+
+    def test_upload_clipped_like_json_analysis(self):
+        """Test that inlined images count towards Gmail clipping through the upload endpoint too"""
+        payload = base64.b64encode(os.urandom(150 * 1024)).decode()
+        html_content = f'<table><tr><td><img src="data:image/png;base64,{payload}" alt="Logo"></td></tr></table>'
+
+        async def scenario():
+            transport = httpx.ASGITransport(app=server.app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+                analysed = await client.post("/api/analyze-newsletter", json={"html_content": html_content})
+                uploaded = await client.post("/api/analyze-newsletter/upload", content=html_content,
+                                             headers={"Content-Type": "text/html"})
+                return analysed.json(), uploaded.json()
+
+        analysed, uploaded = asyncio.run(scenario())
+        self.assertTrue(analysed["report"]["assets"]["clipped"])
+        self.assertEqual(uploaded["report"]["assets"], analysed["report"]["assets"])
+        clipping = [warning for warning in analysed["report"]["warnings"] if "Gmail" in warning]
+        self.assertEqual(len(clipping), 1)
+        self.assertIn(clipping[0], uploaded["report"]["warnings"])
+        self.assertEqual(uploaded["report"]["upload"]["original_html_bytes"], len(html_content))
+        self.assertLess(uploaded["report"]["upload"]["scrubbed_html_bytes"], 200)
+        self.assertEqual(uploaded["responsive_preview"]["html_bytes"], uploaded["report"]["upload"]["scrubbed_html_bytes"])
+
+
+
+class TestStartup(unittest.TestCase):
+
+    def test_heavy_modules_load_lazily(self):
+        """Test that importing the server loads neither the OpenAI client, BeautifulSoup nor lxml"""
+        output = subprocess.run(
+            [sys.executable, "-c", "import sys, server; print([name for name in ('openai', 'bs4', 'requests', 'lxml') if name in sys.modules])"],
+            cwd=os.path.join(ROOT_DIR, "backend"), capture_output=True, text=True, check=True,
+        ).stdout
+        self.assertEqual(output.strip(), "[]")
+
+    def test_ready_after_warm_up(self):
+        """Test that /api/ready answers 503 outside the lifespan and 200 once warmed up"""
+        async def scenario():
+            transport = httpx.ASGITransport(app=server.app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+                before = await client.get("/api/ready")
+                async with server.app.router.lifespan_context(server.app):
+                    for _ in range(500):
+                        ready = await client.get("/api/ready")
+                        if ready.status_code == 200:
+                            break
+                        await asyncio.sleep(0.01)
+                    health = await client.get("/api/health")
+                return before, ready, health
+
+        before, ready, health = asyncio.run(scenario())
+        self.assertEqual(before.status_code, 503)
+        self.assertEqual(ready.status_code, 200)
+        self.assertTrue(ready.json()["warm"])
+        self.assertEqual(ready.json()["loaded_modules"], {"openai": True, "bs4": True})
+        self.assertIsNotNone(ready.json()["warm_up_ms"])
+        self.assertEqual(health.json()["status"], "ok")
+
+if __name__ == "__main__":
+    unittest.main()
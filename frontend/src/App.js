@@ -42,6 +42,8 @@ function App() {
   });
   const [darkMode, setDarkMode] = useState(false);
   const [language, setLanguage] = useState('fr');
+  // Identifies this editing session so the backend only re-analyses what changed between runs
+  const [draftId] = useState(() => `draft-${Date.now()}-${Math.random().toString(36).slice(2)}`);
 
   // Translation function
   const t = (key) => {
@@ -69,6 +71,32 @@ function App() {
     }
   }, [darkMode]);
 
+  const applyAnalysisEvent = (event) => {
+    switch (event.event) {
+      case 'result':
+        console.log('Résultat initial reçu:', event.result);
+        setAnalysisResult(event.result);
+        break;
+      case 'link':
+        setAnalysisResult((previous) => {
+          const links = [...previous.links];
+          links[event.index] = event.link;
+          return { ...previous, links };
+        });
+        break;
+      case 'ai_analysis':
+        setAnalysisResult((previous) => ({ ...previous, ai_analysis: event.ai_analysis }));
+        break;
+      case 'report':
+        setAnalysisResult((previous) => ({ ...previous, report: event.report }));
+        break;
+      case 'error':
+        throw new Error(event.detail);
+      default:
+        break;
+    }
+  };
+
   const analyzeNewsletter = async () => {
     if (!htmlContent.trim()) return;
 
@@ -78,7 +106,7 @@ function App() {
 
     setIsAnalyzing(true);
     try {
-      const response = await fetch(`${process.env.REACT_APP_BACKEND_URL}/api/analyze-newsletter`, {
+      const response = await fetch(`${process.env.REACT_APP_BACKEND_URL}/api/analyze-newsletter/stream`, {
         method: 'POST',
         headers: {
           'Content-Type': 'application/json',
@@ -88,7 +116,10 @@ function App() {
           openai_api_key: settings.openaiApiKey || null,
           subject: settings.subject || null,
           preheader: settings.preheader || null,
-          sender: settings.sender || null
+          sender: settings.sender || null,
+          // The preview renders htmlContent from state, no need to receive it back
+          response_mode: 'lean',
+          draft_id: draftId
         }),
       });
 
@@ -98,9 +129,18 @@ function App() {
         throw new Error('Erreur lors de l\'analyse');
       }
 
-      const result = await response.json();
-      console.log('Résultat reçu:', result);
-      setAnalysisResult(result);
+      // Results arrive progressively, one JSON event per line
+      const reader = response.body.getReader();
+      const decoder = new TextDecoder();
+      let buffer = '';
+      while (true) {
+        const { done, value } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+        const lines = buffer.split('\n');
+        buffer = lines.pop();
+        lines.filter((line) => line.trim()).forEach((line) => applyAnalysisEvent(JSON.parse(line)));
+      }
     } catch (error) {
       console.error('Erreur:', error);
       alert('Erreur lors de l\'analyse de la newsletter: ' + error.message);